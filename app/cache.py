@@ -0,0 +1,144 @@
+# app/cache.py
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional, Set, Tuple
+
+from app import metrics
+
+
+class CacheBackend:
+    """
+    Interfaz de almacenamiento de la caché. MemoryCache es la implementación en proceso;
+    un backend compartido (Redis, Memcached...) solo necesita implementar estos tres métodos.
+    """
+
+    async def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any, ttl: float):
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+
+class MemoryCache(CacheBackend):
+    """LRU acotado en memoria con expiración por entrada."""
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: float):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    async def delete(self, key: str):
+        self._entries.pop(key, None)
+
+
+class ReadThroughCache:
+    """
+    Caché read-through sobre un CacheBackend.
+
+    Las lecturas concurrentes de una misma clave que no está en caché comparten una sola
+    llamada al loader. Si la clave se invalida mientras hay una carga en curso, el resultado
+    de esa carga no se guarda: puede haberse leído antes de la escritura.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._stale: Set[str] = set()
+        self.hits = metrics.counter("cache_hits_total", "Lecturas servidas desde la caché")
+        self.misses = metrics.counter("cache_misses_total", "Lecturas que fueron a Firestore")
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Optional[Any]]]) -> Optional[Any]:
+        value = await self.backend.get(key)
+        if value is not None:
+            self.hits.inc()
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.hits.inc()
+            return await asyncio.shield(inflight)
+
+        self.misses.inc()
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await loader()
+        except BaseException as e:
+            future.set_exception(e)
+            # Evita "Future exception was never retrieved" cuando nadie más esperaba
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+        finally:
+            self._inflight.pop(key, None)
+            stale = key in self._stale
+            self._stale.discard(key)
+
+        # Los documentos inexistentes no se guardan: el 404 no debe sobrevivir a un create
+        if value is not None and not stale:
+            await self.backend.set(key, value, self.ttl)
+        return value
+
+    async def peek(self, key: str) -> Optional[Any]:
+        """El valor en caché, sin cargarlo si no está."""
+        value = await self.backend.get(key)
+        if value is not None:
+            self.hits.inc()
+        return value
+
+    def _mark_stale(self, key: str):
+        if key in self._inflight:
+            self._stale.add(key)
+
+    async def set(self, key: str, value: Any):
+        self._mark_stale(key)
+        await self.backend.set(key, value, self.ttl)
+
+    async def invalidate(self, key: str):
+        self._mark_stale(key)
+        await self.backend.delete(key)
+
+
+class Versioned(NamedTuple):
+    """Documento en caché junto con su update_time de Firestore (para ETags)."""
+
+    data: dict
+    update_time: datetime
+
+
+def match_key(match_id: str) -> str:
+    return f"match:{match_id}"
+
+
+def stats_key(username: str) -> str:
+    return f"stats:{username}"
+
+
+cache = ReadThroughCache(
+    MemoryCache(maxsize=int(os.getenv("CACHE_MAX_ENTRIES", "4096"))),
+    ttl=float(os.getenv("CACHE_TTL_SECONDS", "10")),
+)
@@ -0,0 +1,96 @@
+# app/compression.py
+import gzip
+import os
+from typing import Optional
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él solo se ofrece gzip
+    brotli = None
+
+MIN_SIZE = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4  # calidad baja: en respuestas dinámicas importa más la CPU que el último byte
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """Elige br o gzip según Accept-Encoding (respeta q=0); None si no hay ninguno aceptable."""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+
+    options = (["br"] if brotli is not None else []) + ["gzip"]
+    best = None
+    for encoding in options:
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > 0 and (best is None or q > best[1]):
+            best = (encoding, q)
+    return best[0] if best else None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    """
+    Middleware ASGI que comprime con br/gzip las respuestas de un solo cuerpo. Las respuestas en
+    streaming (NDJSON, Server-Sent Events) pasan tal cual para no retener eventos.
+    """
+
+    def __init__(self, app, minimum_size: int = MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        accept = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1")
+        encoding = negotiate(accept) if accept else None
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                return await send(message)
+
+            headers = [(k, v) for k, v in start.get("headers", [])]
+            body = message.get("body", b"")
+            already_encoded = any(k.lower() == b"content-encoding" for k, _ in headers)
+            if message.get("more_body") or already_encoded or len(body) < self.minimum_size:
+                passthrough = True
+                await send(start)
+                return await send(message)
+
+            body = compress(body, encoding)
+            headers = [(k, v) for k, v in headers if k.lower() != b"content-length"]
+            headers += [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(body)).encode()),
+                (b"vary", b"Accept-Encoding"),
+            ]
+            await send({**start, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
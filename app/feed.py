@@ -0,0 +1,151 @@
+# app/feed.py
+import asyncio
+import heapq
+import os
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from app import metrics
+from app import social
+from app.logger import log_debug, log_info
+from app.repository import Repository
+
+# Con más seguidores que esto no se copia el evento a cada feed: sus amigos lo leen de Activity
+FANOUT_MAX = int(os.getenv("FEED_FANOUT_MAX", "1000"))
+# Eventos esperando fan-out; con la cola llena se descartan (el feed es best-effort)
+QUEUE_MAX = int(os.getenv("FEED_QUEUE_MAX", "10000"))
+# Vencimiento de los eventos: política de TTL de Firestore sobre expires_at (Feeds/*/Events y Activity)
+TTL_DAYS = int(os.getenv("FEED_TTL_DAYS", "30"))
+BATCH_MAX_WRITES = 500
+IN_QUERY_MAX = 30  # máximo de valores de un filtro "in"
+
+EVENTS = "Events"
+
+events_total = metrics.counter("feed_events_total", "Eventos publicados en el feed", ("type",))
+dropped_total = metrics.counter("feed_events_dropped_total", "Eventos descartados con la cola llena")
+fanout_writes = metrics.counter("feed_fanout_writes_total", "Copias de eventos escritas en feeds de amigos")
+queue_depth = metrics.gauge("feed_queue_depth", "Eventos pendientes de fan-out")
+
+
+def inbox(repo: Repository, user_id: str):
+    return repo.feeds.document(user_id).collection(EVENTS)
+
+
+def is_celebrity(user_id: str) -> bool:
+    return social.graph.follower_count(user_id) > FANOUT_MAX
+
+
+class FeedWorker:
+    """
+    Fan-out on write: cada evento se escribe una vez en Activity (el outbox del autor) y una copia
+    en Feeds/{amigo}/Events por cada usuario que lo tiene de amigo, así el feed de un usuario es una
+    sola consulta ya ordenada. Los seguidores salen del grafo en memoria (app.social).
+
+    Las escrituras las hace un worker en segundo plano con cola acotada: el request no espera el
+    fan-out. Los autores con más de FANOUT_MAX seguidores no se copian; se leen al armar el feed.
+    """
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def publish(
+        self, repo: Repository, type: str, actor_id: str, actor_name: str, match_id: str, status: Optional[str] = None,
+    ):
+        now = datetime.now(timezone.utc)
+        ref = repo.activity.document()
+        event = {
+            "id": ref.id,
+            "type": type,
+            "actor_id": actor_id,
+            "actor_name": actor_name,
+            "match_id": match_id,
+            "created_at": now,
+            "expires_at": now + timedelta(days=TTL_DAYS),
+        }
+        if status is not None:
+            event["status"] = status
+        events_total.inc(type=type)
+        if self._queue is None:
+            # Sin worker (scripts, tests): se escribe en segundo plano igual
+            asyncio.get_running_loop().create_task(self._fanout(repo, [event]))
+            return
+        try:
+            self._queue.put_nowait((repo, event))
+        except asyncio.QueueFull:
+            dropped_total.inc()
+            log_info("feed_dropped", type=type, match_id=match_id)
+            return
+        queue_depth.set(self._queue.qsize())
+
+    async def _fanout(self, repo: Repository, events: List[dict]):
+        """Escribe los eventos y sus copias en batches de hasta BATCH_MAX_WRITES."""
+        try:
+            batch, pending, copies = repo.batch(), 0, 0
+            for event in events:
+                followers = [] if is_celebrity(event["actor_id"]) else social.graph.followers(event["actor_id"])
+                refs = [repo.activity.document(event["id"])] + [inbox(repo, uid).document(event["id"]) for uid in followers]
+                for ref in refs:
+                    if pending == BATCH_MAX_WRITES:
+                        await batch.commit()
+                        batch, pending = repo.batch(), 0
+                    batch.set(ref, event)
+                    pending += 1
+                copies += len(followers)
+            if pending:
+                await batch.commit()
+            fanout_writes.inc(copies)
+            log_debug("feed_fanout", events=len(events), copies=copies)
+        except Exception as e:
+            log_info("feed_error", events=len(events), error=str(e))
+
+    async def _run(self):
+        while True:
+            repo, event = await self._queue.get()
+            # Lo que se acumuló mientras se escribía el anterior va en los mismos batches
+            events = [event]
+            while not self._queue.empty() and len(events) < BATCH_MAX_WRITES:
+                events.append(self._queue.get_nowait()[1])
+            queue_depth.set(self._queue.qsize())
+            await self._fanout(repo, events)
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=QUEUE_MAX)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._queue = None
+
+
+worker = FeedWorker()
+
+
+def _sort_key(event: dict) -> Tuple[datetime, str]:
+    return event["created_at"], event["id"]
+
+
+def _page_query(query, limit: int, cursor: Optional[Tuple[datetime, str]]):
+    query = query.order_by("created_at", direction="DESCENDING").order_by("id", direction="DESCENDING")
+    if cursor:
+        query = query.start_after({"created_at": cursor[0], "id": cursor[1]})
+    return query.limit(limit)
+
+
+async def page(repo: Repository, user_id: str, limit: int, cursor: Optional[Tuple[datetime, str]] = None) -> List[dict]:
+    """
+    Una página del feed, del más nuevo al más viejo: el inbox del usuario más lo de sus amigos
+    con demasiados seguidores para el fan-out (fan-out on read), mezclados por fecha.
+    """
+    celebrities = [uid for uid in social.graph.friends(user_id) if is_celebrity(uid)]
+    queries = [_page_query(inbox(repo, user_id), limit, cursor)]
+    for i in range(0, len(celebrities), IN_QUERY_MAX):
+        query = repo.activity.where("actor_id", "in", celebrities[i:i + IN_QUERY_MAX])
+        queries.append(_page_query(query, limit, cursor))
+    pages = await asyncio.gather(*[query.get() for query in queries])
+
+    # Un autor que pasó el umbral puede tener eventos en ambos lados
+    events = {doc.id: doc.to_dict() for docs in pages for doc in docs}
+    return heapq.nlargest(limit, events.values(), key=_sort_key)
@@ -1,21 +1,114 @@
 # app/firebase_admin.py
 
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
 import firebase_admin
 from firebase_admin import credentials, auth
 
+from app import metrics
+
+
+CREDENTIALS_PATH = os.getenv("FIREBASE_CREDENTIALS", "app/credentials.json")
+
+
+def init_firebase():
+    """Inicializa Firebase Admin solo una vez. Se llama desde el lifespan, no al importar."""
+    if not firebase_admin._apps:
+        cred = credentials.Certificate(CREDENTIALS_PATH)  # asegúrate de tener este archivo
+        options = {}
+        if os.getenv("FIREBASE_HTTP_TIMEOUT"):
+            options["httpTimeout"] = float(os.getenv("FIREBASE_HTTP_TIMEOUT"))
+        firebase_admin.initialize_app(cred, options)
+    return firebase_admin.get_app()
+
+
+def prefetch_certificates():
+    """
+    Descarga las claves públicas con las que se firman los ID tokens. Quedan en la caché HTTP
+    del verificador, así que el primer login no paga esa descarga.
+    """
+    verifier = auth._get_client(init_firebase())._token_verifier
+    response = verifier.request(url=verifier.id_token_verifier.cert_url)
+    if response.status != 200:
+        raise ValueError(f"No se pudieron descargar los certificados: {response.status}")
+
+# La verificación hace I/O (descarga de claves públicas) y criptografía: no debe correr en el event loop
+_verify_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("TOKEN_VERIFY_WORKERS", "4")),
+    thread_name_prefix="verify-token",
+)
+
+
+class TokenCache:
+    """
+    LRU acotado de tokens ya verificados. Cada entrada expira en el claim `exp` del token.
+    Solo se usa desde el event loop, así que no necesita locks.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self.hits = metrics.counter("token_cache_hits_total", "Tokens resueltos desde la caché")
+        self.misses = metrics.counter("token_cache_misses_total", "Tokens que requirieron verificación")
+
+    def get(self, id_token: str) -> Optional[dict]:
+        decoded = self._entries.get(id_token)
+        if decoded is None:
+            self.misses.inc()
+            return None
+        if decoded.get("exp", 0) <= time.time():
+            del self._entries[id_token]
+            self.misses.inc()
+            return None
+        self._entries.move_to_end(id_token)
+        self.hits.inc()
+        return decoded
+
+    def put(self, id_token: str, decoded: dict):
+        self._entries[id_token] = decoded
+        self._entries.move_to_end(id_token)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits.value, "misses": self.misses.value}
+
+
+token_cache = TokenCache(maxsize=int(os.getenv("TOKEN_CACHE_SIZE", "1024")))
 
-# Inicializar Firebase Admin solo una vez
-if not firebase_admin._apps:
-    cred = credentials.Certificate("app/credentials.json")  # asegúrate de tener este archivo
-    firebase_admin.initialize_app(cred)
 
 def verify_token(id_token: str):
     """
     Verifica un Firebase ID Token y devuelve la información del usuario.
     Lanza un error si es inválido o expirado.
     """
+    app = init_firebase()
     try:
-        decoded_token = auth.verify_id_token(id_token)
+        decoded_token = auth.verify_id_token(id_token, app=app)
         return decoded_token  # contiene: uid, email, name, etc.
     except Exception as e:
         raise ValueError(f"Token inválido: {e}")
+
+
+async def verify_token_async(id_token: str) -> dict:
+    """
+    Igual que verify_token, pero sin bloquear el event loop y reutilizando
+    tokens ya verificados mientras no expiren.
+    """
+    decoded_token = token_cache.get(id_token)
+    if decoded_token is not None:
+        return decoded_token
+    loop = asyncio.get_running_loop()
+    decoded_token = await loop.run_in_executor(_verify_executor, verify_token, id_token)
+    token_cache.put(id_token, decoded_token)
+    return decoded_token
+
+
+async def prefetch_certificates_async():
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(_verify_executor, prefetch_certificates)
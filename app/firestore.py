@@ -1,7 +1,78 @@
+import json
+import os
+from typing import Any, List, Optional, Tuple
+
 from dotenv import load_dotenv
+from google.cloud import firestore_v1
 from google.cloud.firestore_v1 import AsyncClient
+from google.cloud.firestore_v1.services.firestore import async_client as firestore_client
+from google.cloud.firestore_v1.services.firestore.transports import grpc_asyncio as firestore_grpc_transport
 
 load_dotenv()
 
-# db = firestore.Client()
-db = AsyncClient()
\ No newline at end of file
+# Versiones de google-cloud-firestore [desde, hasta) con las que se probó create_client
+TESTED_VERSIONS = ((2, 11), (3, 0))
+
+_db: Optional[AsyncClient] = None
+
+
+def channel_options() -> List[Tuple[str, Any]]:
+    """
+    Opciones del canal gRPC. Las de la librería más keepalive configurable;
+    FIRESTORE_CHANNEL_OPTIONS (JSON, p. ej. {"grpc.keepalive_time_ms": 20000}) las sobreescribe.
+    """
+    options = {
+        "grpc.max_send_message_length": -1,
+        "grpc.max_receive_message_length": -1,
+        "grpc.keepalive_time_ms": int(os.getenv("FIRESTORE_KEEPALIVE_MS", "30000")),
+        "grpc.keepalive_timeout_ms": int(os.getenv("FIRESTORE_KEEPALIVE_TIMEOUT_MS", "10000")),
+    }
+    options.update(json.loads(os.getenv("FIRESTORE_CHANNEL_OPTIONS", "{}")))
+    return list(options.items())
+
+
+class _ChannelOptionsTransport(firestore_grpc_transport.FirestoreGrpcAsyncIOTransport):
+    """El transport de la librería, pero creando el canal con channel_options()."""
+
+    options: List[Tuple[str, Any]] = []
+
+    @classmethod
+    def create_channel(cls, *args, **kwargs):
+        kwargs["options"] = cls.options
+        return super().create_channel(*args, **kwargs)
+
+
+def _check_client_internals(client: AsyncClient):
+    """
+    El cliente no acepta opciones del canal: se usa su helper privado que arma el cliente GAPIC,
+    solo con versiones probadas y fallando al arrancar si cambió, no con el primer request.
+    """
+    version = tuple(int(part) for part in firestore_v1.__version__.split(".")[:2])
+    if not TESTED_VERSIONS[0] <= version < TESTED_VERSIONS[1]:
+        raise RuntimeError(f"google-cloud-firestore {firestore_v1.__version__} no probado con las opciones del canal")
+    if not callable(getattr(client, "_firestore_api_helper", None)):
+        raise RuntimeError("AsyncClient._firestore_api_helper no existe: revisar create_client")
+
+
+def create_client(options: Optional[List[Tuple[str, Any]]] = None) -> AsyncClient:
+    client = AsyncClient()
+    _check_client_internals(client)
+    transport = type("FirestoreTransport", (_ChannelOptionsTransport,), {"options": options or channel_options()})
+    # Crea el cliente GAPIC ahora y no al primer uso; con el emulador el canal no pasa por create_channel
+    client._firestore_api_helper(transport, firestore_client.FirestoreAsyncClient, firestore_client)
+    return client
+
+
+def get_db() -> AsyncClient:
+    """Cliente creado al primer uso (en el lifespan de la app), no al importar el módulo."""
+    global _db
+    if _db is None:
+        _db = create_client()
+    return _db
+
+
+def __getattr__(name):
+    # Compatibilidad con `from app.firestore import db`
+    if name == "db":
+        return get_db()
+    raise AttributeError(name)
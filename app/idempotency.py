@@ -0,0 +1,280 @@
+# app/idempotency.py
+import asyncio
+import hashlib
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition
+
+from app import metrics
+from app.cache import MemoryCache
+from app.logger import log_info
+from app.repository import get_repository
+from app.responses import FastJSONResponse
+
+HEADER = b"idempotency-key"
+REPLAYED_HEADER = b"idempotent-replayed"
+METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+PREFIXES = ("/matches", "/users")
+KEY_MAX_LENGTH = 255
+
+# memory (por proceso) o firestore (compartido entre procesos, colección IdempotencyKeys)
+BACKEND = os.getenv("IDEMPOTENCY_BACKEND", "memory")
+TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+# Con Firestore: cuánto espera un request a que otro proceso termine el mismo key antes del 409
+WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+# Una clave tomada por un proceso que se cayó se libera pasado este tiempo
+LOCK_SECONDS = float(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "30"))
+POLL_SECONDS = 0.1
+MAX_BODY_BYTES = 512 * 1024  # margen bajo el límite de 1 MiB por documento
+
+requests_total = metrics.counter(
+    "idempotency_requests_total", "Requests con Idempotency-Key por resultado", ("outcome",),
+)
+
+
+class Record(NamedTuple):
+    """Respuesta guardada para un Idempotency-Key, junto con el hash del cuerpo del request."""
+
+    fingerprint: str
+    status: int
+    headers: List[Tuple[str, str]]
+    body: bytes
+
+
+class InProgress(Exception):
+    """Otro proceso está ejecutando el mismo Idempotency-Key."""
+
+
+class IdempotencyStore:
+    """
+    Dónde se guardan las respuestas. begin() devuelve la respuesta guardada o None si el request
+    debe ejecutarse (y entonces se llama a complete() o release()).
+    """
+
+    async def begin(self, key: str, fingerprint: str) -> Optional[Record]:
+        raise NotImplementedError
+
+    async def complete(self, key: str, record: Record):
+        raise NotImplementedError
+
+    async def release(self, key: str):
+        raise NotImplementedError
+
+
+class MemoryIdempotencyStore(IdempotencyStore):
+    """En proceso: un MemoryCache con TTL. La espera entre requests concurrentes la hace el middleware."""
+
+    def __init__(self, maxsize: int = MAX_ENTRIES, ttl: float = TTL_SECONDS):
+        self.ttl = ttl
+        self.cache = MemoryCache(maxsize=maxsize)
+
+    async def begin(self, key: str, fingerprint: str) -> Optional[Record]:
+        return await self.cache.get(key)
+
+    async def complete(self, key: str, record: Record):
+        await self.cache.set(key, record, self.ttl)
+
+    async def release(self, key: str):
+        await self.cache.delete(key)
+
+
+class FirestoreIdempotencyStore(IdempotencyStore):
+    """
+    IdempotencyKeys/{key}: begin() crea el documento en estado "pending" (create falla si ya
+    existe, así que un solo proceso lo ejecuta) y complete() guarda la respuesta. Los vencidos los
+    borra la política de TTL sobre expires_at; mientras tanto se ignoran al leer.
+    """
+
+    def __init__(self, ttl: float = TTL_SECONDS):
+        self.ttl = ttl
+
+    def _ref(self, key: str):
+        return get_repository().collection("IdempotencyKeys").document(key)
+
+    def _pending(self, fingerprint: str, now: datetime) -> dict:
+        return {
+            "state": "pending",
+            "fingerprint": fingerprint,
+            "locked_until": now + timedelta(seconds=LOCK_SECONDS),
+            "expires_at": now + timedelta(seconds=self.ttl),
+        }
+
+    async def begin(self, key: str, fingerprint: str) -> Optional[Record]:
+        ref = self._ref(key)
+        deadline = time.monotonic() + WAIT_SECONDS
+        while True:
+            now = datetime.now(timezone.utc)
+            try:
+                await ref.create(self._pending(fingerprint, now))
+                return None
+            except AlreadyExists:
+                pass
+
+            doc = await ref.get()
+            if not doc.exists:
+                continue
+            data = doc.to_dict()
+            if data["expires_at"] <= now or (data["state"] == "pending" and data["locked_until"] <= now):
+                # Vencido o abandonado: se toma solo si nadie lo cambió desde la lectura
+                try:
+                    option = get_repository().write_option(last_update_time=doc.update_time)
+                    await ref.update(self._pending(fingerprint, now), option=option)
+                    return None
+                except FailedPrecondition:
+                    continue
+            if data["state"] == "done":
+                headers = [(h["name"], h["value"]) for h in data["headers"]]
+                return Record(data["fingerprint"], data["status"], headers, data["body"])
+            if time.monotonic() >= deadline:
+                raise InProgress()
+            await asyncio.sleep(POLL_SECONDS)
+
+    async def complete(self, key: str, record: Record):
+        await self._ref(key).set({
+            "state": "done",
+            "fingerprint": record.fingerprint,
+            "status": record.status,
+            # Firestore no admite arreglos dentro de arreglos
+            "headers": [{"name": name, "value": value} for name, value in record.headers],
+            "body": record.body,
+            "expires_at": datetime.now(timezone.utc) + timedelta(seconds=self.ttl),
+        })
+
+    async def release(self, key: str):
+        await self._ref(key).delete()
+
+
+def create_store() -> IdempotencyStore:
+    if BACKEND == "firestore":
+        return FirestoreIdempotencyStore()
+    return MemoryIdempotencyStore()
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+class IdempotencyMiddleware:
+    """
+    Middleware ASGI para `Idempotency-Key` en las rutas que escriben (POST/PUT/PATCH/DELETE de
+    /matches y /users). La primera respuesta (salvo 5xx, que se pueden reintentar) se guarda por
+    TTL_SECONDS y los reintentos con la misma clave la reciben tal cual, sin volver a ejecutar la
+    ruta. Los requests con la misma clave que llegan mientras el primero corre lo esperan.
+
+    La clave vale para un método y una ruta; reusarla con otro cuerpo es un 422.
+    """
+
+    def __init__(self, app, store: Optional[IdempotencyStore] = None):
+        self.app = app
+        self.store = store or create_store()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in METHODS or not scope["path"].startswith(PREFIXES):
+            return await self.app(scope, receive, send)
+        key = _header(scope, HEADER)
+        if key is None:
+            return await self.app(scope, receive, send)
+        if not key or len(key) > KEY_MAX_LENGTH:
+            return await self._error(scope, receive, send, 400, "Idempotency-Key inválida")
+
+        body = await _read_body(receive)
+        fingerprint = hashlib.sha256(body).hexdigest()
+        scoped = hashlib.sha256(f"{scope['method']} {scope['path']} {key}".encode()).hexdigest()
+
+        # Mismo proceso: se espera al request en curso en vez de consultar el store
+        while scoped in self._inflight:
+            record = await asyncio.shield(self._inflight[scoped])
+            if record is not None:
+                requests_total.inc(outcome="waited")
+                return await self._replay(scope, receive, send, record, fingerprint)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[scoped] = future
+        record = None
+        try:
+            try:
+                record = await self.store.begin(scoped, fingerprint)
+            except InProgress:
+                requests_total.inc(outcome="in_progress")
+                return await self._error(scope, receive, send, 409, "Hay una solicitud en curso con la misma Idempotency-Key")
+            if record is not None:
+                requests_total.inc(outcome="replayed")
+                return await self._replay(scope, receive, send, record, fingerprint)
+
+            requests_total.inc(outcome="executed")
+            record = await self._execute(scope, body, receive, send, fingerprint)
+            if record is None:
+                await self.store.release(scoped)
+            else:
+                await self.store.complete(scoped, record)
+        except BaseException:
+            record = None
+            try:
+                await self.store.release(scoped)
+            except Exception as e:
+                log_info("idempotency_release_error", error=str(e))
+            raise
+        finally:
+            self._inflight.pop(scoped, None)
+            future.set_result(record)
+
+    async def _execute(self, scope, body: bytes, receive, send, fingerprint: str) -> Optional[Record]:
+        """Corre la ruta reenviando la respuesta y la devuelve como Record si se puede guardar."""
+        sent_body = False
+        status = 500
+        headers: List[Tuple[str, str]] = []
+        chunks = []
+
+        async def receive_body():
+            nonlocal sent_body
+            if not sent_body:
+                sent_body = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            # El cuerpo ya se leyó: lo que sigue es la desconexión del cliente
+            return await receive()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers.extend((k.decode("latin-1"), v.decode("latin-1")) for k, v in message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        await self.app(scope, receive_body, send_wrapper)
+        content = b"".join(chunks)
+        if status >= 500 or len(content) > MAX_BODY_BYTES:
+            return None
+        return Record(fingerprint, status, headers, content)
+
+    async def _replay(self, scope, receive, send, record: Record, fingerprint: str):
+        if record.fingerprint != fingerprint:
+            requests_total.inc(outcome="mismatch")
+            return await self._error(scope, receive, send, 422, "Idempotency-Key reutilizada con otro cuerpo")
+        headers = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in record.headers]
+        await send({"type": "http.response.start", "status": record.status, "headers": headers + [(REPLAYED_HEADER, b"true")]})
+        await send({"type": "http.response.body", "body": record.body})
+
+    async def _error(self, scope, receive, send, status_code: int, detail: str):
+        await FastJSONResponse({"detail": detail}, status_code=status_code)(scope, receive, send)
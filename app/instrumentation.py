@@ -0,0 +1,227 @@
+# app/instrumentation.py
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from app import metrics
+from app.logger import log_debug
+
+request_latency = metrics.histogram(
+    "http_request_duration_seconds", "Latencia por ruta", ("method", "route", "status"),
+)
+requests_total = metrics.counter("http_requests_total", "Requests por ruta y código", ("method", "route", "status"))
+in_flight = metrics.gauge("http_requests_in_flight", "Requests en curso", ("method",))
+firestore_ops = metrics.counter("firestore_operations_total", "Operaciones de Firestore por tipo", ("op",))
+firestore_ops_per_request = metrics.histogram(
+    "firestore_operations_per_request", "Operaciones de Firestore por request", ("route", "op"),
+    buckets=metrics.COUNT_BUCKETS,
+)
+
+
+class RequestStats:
+    __slots__ = ("reads", "writes", "streamed")
+
+    def __init__(self):
+        self.reads = 0
+        self.writes = 0
+        self.streamed = 0
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+
+def _count(op: str, amount: int = 1):
+    if not amount:
+        return
+    firestore_ops.inc(amount, op=op)
+    stats = _request_stats.get()
+    if stats is not None:
+        setattr(stats, op, getattr(stats, op) + amount)
+
+
+class _Proxy:
+    """
+    Envoltorio transparente: reenvía atributos (también asignaciones) al objeto real y se hace
+    pasar por su clase para que los isinstance del cliente sigan funcionando.
+    """
+
+    __slots__ = ("_target",)
+
+    def __init__(self, target):
+        object.__setattr__(self, "_target", target)
+
+    @property
+    def __class__(self):
+        return type(self._target)
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._target, name, value)
+
+    def __eq__(self, other):
+        return self._target == (other._target if isinstance(other, _Proxy) else other)
+
+    def __hash__(self):
+        return hash(self._target)
+
+
+_QUERY_METHODS = ("where", "order_by", "limit", "offset", "select", "start_after", "start_at", "end_before", "end_at")
+
+
+class _Query(_Proxy):
+    __slots__ = ()
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if name in _QUERY_METHODS:
+            return lambda *args, **kwargs: _Query(attr(*args, **kwargs))
+        return attr
+
+    def document(self, *args, **kwargs):
+        return _Document(self._target.document(*args, **kwargs))
+
+    async def stream(self, *args, **kwargs):
+        async for snapshot in self._target.stream(*args, **kwargs):
+            _count("streamed")
+            yield _Snapshot(snapshot)
+
+    async def get(self, *args, **kwargs):
+        snapshots = await self._target.get(*args, **kwargs)
+        _count("streamed", len(snapshots))
+        return [_Snapshot(snapshot) for snapshot in snapshots]
+
+
+class _Document(_Proxy):
+    __slots__ = ()
+
+    def collection(self, *args, **kwargs):
+        return _Query(self._target.collection(*args, **kwargs))
+
+    async def get(self, *args, **kwargs):
+        _count("reads")
+        return _Snapshot(await self._target.get(*args, **kwargs))
+
+    async def set(self, *args, **kwargs):
+        _count("writes")
+        return await self._target.set(*args, **kwargs)
+
+    async def create(self, *args, **kwargs):
+        _count("writes")
+        return await self._target.create(*args, **kwargs)
+
+    async def update(self, *args, **kwargs):
+        _count("writes")
+        return await self._target.update(*args, **kwargs)
+
+    async def delete(self, *args, **kwargs):
+        _count("writes")
+        return await self._target.delete(*args, **kwargs)
+
+
+class _Snapshot(_Proxy):
+    __slots__ = ()
+
+    @property
+    def reference(self):
+        return _Document(self._target.reference)
+
+
+class _Batch(_Proxy):
+    """Batch o transacción: cuenta una escritura por operación."""
+
+    __slots__ = ()
+
+    def _write(self, method, *args, **kwargs):
+        _count("writes")
+        return getattr(self._target, method)(*args, **kwargs)
+
+    def set(self, *args, **kwargs):
+        return self._write("set", *args, **kwargs)
+
+    def create(self, *args, **kwargs):
+        return self._write("create", *args, **kwargs)
+
+    def update(self, *args, **kwargs):
+        return self._write("update", *args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        return self._write("delete", *args, **kwargs)
+
+    async def get(self, *args, **kwargs):
+        _count("reads")
+        return await self._target.get(*args, **kwargs)
+
+
+class InstrumentedClient(_Proxy):
+    """Cuenta lecturas, escrituras y documentos de consultas del cliente envuelto."""
+
+    __slots__ = ()
+
+    def collection(self, *args, **kwargs):
+        return _Query(self._target.collection(*args, **kwargs))
+
+    def document(self, *args, **kwargs):
+        return _Document(self._target.document(*args, **kwargs))
+
+    async def get_all(self, references, *args, **kwargs):
+        async for snapshot in self._target.get_all(references, *args, **kwargs):
+            _count("reads")
+            yield _Snapshot(snapshot)
+
+    def batch(self, *args, **kwargs):
+        return _Batch(self._target.batch(*args, **kwargs))
+
+    def transaction(self, *args, **kwargs):
+        return _Batch(self._target.transaction(*args, **kwargs))
+
+
+def _route_template(scope) -> str:
+    """Plantilla de la ruta que atendió el request (/matches/{match_id}) para acotar los labels."""
+    route = scope.get("route")
+    return route.path if route is not None else "unmatched"
+
+
+class MetricsMiddleware:
+    """Middleware ASGI: latencia, códigos de estado, requests en curso y operaciones de Firestore por ruta."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        status = 500
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        in_flight.inc(method=method)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_stats.reset(token)
+            in_flight.dec(method=method)
+            route = _route_template(scope)
+            request_latency.observe(elapsed, method=method, route=route, status=status)
+            requests_total.inc(method=method, route=route, status=status)
+            for op in RequestStats.__slots__:
+                firestore_ops_per_request.observe(getattr(stats, op), route=route, op=op)
+            log_debug(
+                "request", method=method, route=route, status=status, ms=round(elapsed * 1000, 2),
+                reads=stats.reads, writes=stats.writes, streamed=stats.streamed,
+            )
@@ -0,0 +1,137 @@
+# app/live.py
+import asyncio
+import os
+from typing import Dict, Optional, Set
+
+from app import metrics
+from app import roster
+from app.repository import Repository
+
+MAX_LISTENERS = int(os.getenv("LIVE_MAX_LISTENERS", "200"))
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("LIVE_QUEUE_SIZE", "32"))
+
+resyncs = metrics.counter("live_resyncs_total", "Suscriptores lentos a los que se les descartaron eventos")
+
+
+class TooManyListeners(Exception):
+    pass
+
+
+def diff_match(before: Optional[dict], after: Optional[dict]) -> Optional[dict]:
+    """Evento con los cambios de plantilla, estado y demás campos entre dos versiones del reto."""
+    if after is None:
+        return {"type": "deleted"}
+    if before is None:
+        return {"type": "snapshot", "match": after}
+
+    before_players = {p["user_id"]: p for p in before.get("players", [])}
+    after_players = {p["user_id"]: p for p in after.get("players", [])}
+    event = {"type": "diff"}
+    added = [p for uid, p in after_players.items() if uid not in before_players]
+    removed = [uid for uid in before_players if uid not in after_players]
+    changed = [p for uid, p in after_players.items() if uid in before_players and before_players[uid] != p]
+    if added:
+        event["added"] = added
+    if removed:
+        event["removed"] = removed
+    if changed:
+        event["changed"] = changed
+    if before.get("status") != after.get("status"):
+        event["status"] = after.get("status")
+    fields = {
+        k: v for k, v in after.items()
+        if k not in ("players", "player_ids", "status") and before.get(k) != v
+    }
+    if fields:
+        event["fields"] = fields
+    return event if len(event) > 1 else None
+
+
+class Subscriber:
+    def __init__(self, feed: "MatchFeed"):
+        self.feed = feed
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def offer(self, event: dict):
+        """
+        Encola sin bloquear al listener. Si el cliente no consume a tiempo se descartan sus
+        eventos pendientes y se le envía el estado completo para que se resincronice.
+        """
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            resyncs.inc()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "snapshot", "match": self.feed.last})
+
+
+class MatchFeed:
+    """Un listener de Firestore por reto, compartido por todos sus suscriptores."""
+
+    def __init__(self, repo: Repository, match_id: str, loop: asyncio.AbstractEventLoop):
+        self.repo = repo
+        self.match_id = match_id
+        self.loop = loop
+        self.subscribers: Set[Subscriber] = set()
+        self.last: Optional[dict] = None
+        self.received = False
+        self.watch = None
+
+    def _on_snapshot(self, docs, changes, read_time):
+        # Corre en el hilo del listener: se delega al event loop
+        doc = docs[0] if docs else None
+        data = roster.to_api(doc.to_dict()) if doc is not None and doc.exists else None
+        self.loop.call_soon_threadsafe(self.publish, data)
+
+    def publish(self, data: Optional[dict]):
+        event = diff_match(self.last if self.received else None, data)
+        self.last = data
+        self.received = True
+        if event is None:
+            return
+        for subscriber in list(self.subscribers):
+            subscriber.offer(event)
+
+    async def start(self):
+        doc_ref = self.repo.listener_client().collection("Matches").document(self.match_id)
+        self.watch = await self.loop.run_in_executor(None, doc_ref.on_snapshot, self._on_snapshot)
+
+    async def stop(self):
+        if self.watch is not None:
+            await self.loop.run_in_executor(None, self.watch.unsubscribe)
+            self.watch = None
+
+
+class LiveHub:
+    def __init__(self, max_listeners: int = MAX_LISTENERS):
+        self.max_listeners = max_listeners
+        self.feeds: Dict[str, MatchFeed] = {}
+
+    async def subscribe(self, repo: Repository, match_id: str) -> Subscriber:
+        feed = self.feeds.get(match_id)
+        if feed is None:
+            if len(self.feeds) >= self.max_listeners:
+                raise TooManyListeners()
+            feed = MatchFeed(repo, match_id, asyncio.get_running_loop())
+            self.feeds[match_id] = feed
+            try:
+                await feed.start()
+            except Exception:
+                self.feeds.pop(match_id, None)
+                raise
+        subscriber = Subscriber(feed)
+        feed.subscribers.add(subscriber)
+        if feed.received:
+            subscriber.offer({"type": "snapshot", "match": feed.last} if feed.last is not None else {"type": "deleted"})
+        return subscriber
+
+    async def unsubscribe(self, subscriber: Subscriber):
+        feed = subscriber.feed
+        feed.subscribers.discard(subscriber)
+        if not feed.subscribers and self.feeds.get(feed.match_id) is feed:
+            del self.feeds[feed.match_id]
+            await feed.stop()
+
+
+hub = LiveHub()
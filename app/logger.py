@@ -0,0 +1,30 @@
+# app/logger.py
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+
+DEBUG = os.getenv("DEBUG", "").lower() in ("1", "true", "yes")
+
+logger = logging.getLogger("tereto")
+logger.setLevel(logging.DEBUG if DEBUG else logging.INFO)
+logger.propagate = False
+
+# El handler del logger solo encola; la escritura a stderr ocurre en el hilo del QueueListener
+_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+logger.addHandler(logging.handlers.QueueHandler(_queue))
+_listener = logging.handlers.QueueListener(_queue, logging.StreamHandler())
+_listener.start()
+atexit.register(_listener.stop)
+
+
+def log_debug(event: str, **fields):
+    """Evento estructurado (una línea JSON) que solo se arma y se escribe con DEBUG=1."""
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(json.dumps({"event": event, **fields}, default=str, ensure_ascii=False))
+
+
+def log_info(event: str, **fields):
+    logger.info(json.dumps({"event": event, **fields}, default=str, ensure_ascii=False))
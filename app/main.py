@@ -1,10 +1,53 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from app import feed
+from app import metrics
+from app import ranking
+from app import recommendations
+from app import results
+from app import social
+from app import warmup
+from app.scheduler import scheduler
+from app.repository import get_repository
+from app.compression import CompressionMiddleware
+from app.firebase_admin import init_firebase
+from app.idempotency import IdempotencyMiddleware
+from app.instrumentation import MetricsMiddleware
+from app.responses import FastJSONResponse
 from app.routes import matches
 from app.routes import users
 from app.routes import auth
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Los clientes se crean acá y no al importar: el import queda barato y sin orden frágil
+    init_firebase()
+    repo = get_repository()
+    warmup_task = asyncio.create_task(warmup.run(repo))
+    await ranking.engine.start(repo)
+    await recommendations.index.start(repo)
+    await social.graph.start(repo)
+    await feed.worker.start()
+    await results.pipeline.start(repo)
+    scheduler.start(repo)
+    yield
+    warmup_task.cancel()
+    await scheduler.stop(repo)
+    await results.pipeline.stop()
+    await feed.worker.stop()
+    await social.graph.stop()
+    await recommendations.index.stop()
+    await ranking.engine.stop(repo)
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+
+# Adentro de CORS y de la compresión: las respuestas repetidas pasan por ambos como las originales
+app.add_middleware(IdempotencyMiddleware)
 
 # Permitir origenes
 origins = [
@@ -17,8 +60,29 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],             # Permite todos los métodos (GET, POST, etc.)
     allow_headers=["*"],             # Permite todos los headers
+    expose_headers=["X-Next-Cursor", "ETag", "Idempotent-Replayed"],
 )
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+app.include_router(matches.router, tags=["Retos"])
+app.include_router(users.router, tags=["Usuarios"])
+app.include_router(auth.router, tags=["Auth"])
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    """Liveness: el proceso responde. Incluye el estado del warm-up."""
+    return FastJSONResponse({"status": "ok", **warmup.state.report()})
+
 
-app.include_router(matches.router, prefix="/matches", tags=["Retos"])
-app.include_router(users.router, prefix="/users", tags=["Usuarios"])
-app.include_router(auth.router, prefix="/auth", tags=["Auth"])
\ No newline at end of file
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    """Readiness: 503 hasta que terminó el warm-up."""
+    report = warmup.state.report()
+    return FastJSONResponse(report, status_code=200 if report["ready"] else 503)
@@ -0,0 +1,610 @@
+# app/memory_store.py
+"""
+Réplica en memoria del subconjunto de AsyncClient de Firestore que usa la app.
+
+Sirve para correr la API sin un proyecto de Firestore (benchmarks, pruebas de carga,
+desarrollo local). Implementa documentos y subcolecciones, consultas con where/order_by/
+limit/offset/start_after/select, batches, transacciones optimistas, precondiciones de
+escritura, transforms (SERVER_TIMESTAMP, DELETE_FIELD, Increment, ArrayUnion, ArrayRemove)
+y listeners on_snapshot. Cada RPC espera `latency` segundos (+/- `jitter`) para simular la red.
+"""
+import asyncio
+import copy
+import heapq
+import random
+import string
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from google.api_core.exceptions import Aborted, AlreadyExists, FailedPrecondition, InvalidArgument, NotFound
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.field_path import FieldPath
+from google.cloud.firestore_v1.types import WriteResult
+
+_MISSING = object()
+
+
+def _auto_id() -> str:
+    return "".join(random.choices(string.ascii_letters + string.digits, k=20))
+
+
+def _parts(path: str) -> Tuple[str, ...]:
+    return FieldPath.from_api_repr(path).parts
+
+
+def _get_path(data: dict, parts: Iterable[str]) -> Any:
+    value = data
+    for part in parts:
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _set_path(data: dict, parts: Tuple[str, ...], value: Any):
+    for part in parts[:-1]:
+        child = data.get(part)
+        if not isinstance(child, dict):
+            child = data[part] = {}
+        data = child
+    data[parts[-1]] = value
+
+
+def _delete_path(data: dict, parts: Tuple[str, ...]):
+    for part in parts[:-1]:
+        data = data.get(part)
+        if not isinstance(data, dict):
+            return
+    data.pop(parts[-1], None)
+
+
+def _type_rank(value: Any) -> int:
+    # Orden de tipos de Firestore: null < bool < número < timestamp < string < bytes < array < map
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, datetime):
+        return 3
+    if isinstance(value, str):
+        return 4
+    if isinstance(value, bytes):
+        return 5
+    if isinstance(value, (list, tuple)):
+        return 8
+    return 9
+
+
+def _sort_key(value: Any):
+    rank = _type_rank(value)
+    if rank == 8:
+        return rank, tuple(_sort_key(v) for v in value)
+    if rank == 9:
+        return rank, tuple((k, _sort_key(v)) for k, v in sorted(value.items()))
+    return rank, value
+
+
+class _Descending:
+    __slots__ = ("key",)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __lt__(self, other):
+        return other.key < self.key
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+
+def _index_key(value: Any):
+    """Clave de un valor escalar en los índices de igualdad; None si no se puede indexar."""
+    if value is None or isinstance(value, (bool, int, float, str, bytes, datetime)):
+        return _type_rank(value), value
+    return None
+
+
+def _compare(op: str, value: Any, expected: Any) -> bool:
+    if value is _MISSING:
+        return False
+    if op == "==":
+        return value == expected and _type_rank(value) == _type_rank(expected)
+    if op == "!=":
+        return value is not None and value != expected
+    if op == "in":
+        return any(_compare("==", value, e) for e in expected)
+    if op == "not-in":
+        return value is not None and not any(_compare("==", value, e) for e in expected)
+    if op == "array_contains":
+        return isinstance(value, list) and any(_compare("==", v, expected) for v in value)
+    if op == "array_contains_any":
+        return isinstance(value, list) and any(_compare("==", v, e) for v in value for e in expected)
+    if _type_rank(value) != _type_rank(expected):
+        return False
+    key, other = _sort_key(value), _sort_key(expected)
+    if op == "<":
+        return key < other
+    if op == "<=":
+        return key <= other
+    if op == ">":
+        return key > other
+    if op == ">=":
+        return key >= other
+    raise InvalidArgument(f"Operador no soportado: {op}")
+
+
+def _resolve_transforms(value: Any, current: Any, now: datetime) -> Any:
+    if value is transforms.SERVER_TIMESTAMP:
+        return now
+    if isinstance(value, transforms.Increment):
+        base = current if isinstance(current, (int, float)) and not isinstance(current, bool) else 0
+        return base + value.value
+    if isinstance(value, transforms.ArrayUnion):
+        base = list(current) if isinstance(current, list) else []
+        return base + [v for v in value.values if v not in base]
+    if isinstance(value, transforms.ArrayRemove):
+        base = list(current) if isinstance(current, list) else []
+        return [v for v in base if v not in value.values]
+    if isinstance(value, dict):
+        current = current if isinstance(current, dict) else {}
+        return {k: _resolve_transforms(v, current.get(k), now) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return list(value)
+    return copy.deepcopy(value)
+
+
+class WriteOption:
+    def __init__(self, last_update_time: Optional[datetime] = None, exists: Optional[bool] = None):
+        self.last_update_time = last_update_time
+        self.exists = exists
+
+    def check(self, stored: Optional["_Stored"]):
+        if self.exists is not None and (stored is not None) != self.exists:
+            raise FailedPrecondition("La precondición exists no se cumple")
+        if self.last_update_time is not None:
+            if stored is None or stored.update_time != self.last_update_time:
+                raise FailedPrecondition("El documento cambió desde la última lectura")
+
+
+class _Stored:
+    __slots__ = ("data", "create_time", "update_time")
+
+    def __init__(self, data: dict, create_time: datetime, update_time: datetime):
+        self.data = data
+        self.create_time = create_time
+        self.update_time = update_time
+
+
+class MemoryDocumentSnapshot:
+    def __init__(self, reference: "MemoryDocumentReference", stored: Optional[_Stored],
+                 read_time: datetime, field_paths: Optional[List[str]] = None):
+        self.reference = reference
+        self.read_time = read_time
+        self._data = None
+        self.create_time = self.update_time = None
+        if stored is not None:
+            # Los documentos guardados nunca se modifican en sitio: basta con copiar en to_dict
+            self._data = stored.data
+            self.create_time = stored.create_time
+            self.update_time = stored.update_time
+            if field_paths is not None:
+                projected = {}
+                for path in field_paths:
+                    parts = _parts(path)
+                    value = _get_path(self._data, parts)
+                    if value is not _MISSING:
+                        _set_path(projected, parts, value)
+                self._data = projected
+
+    @property
+    def id(self) -> str:
+        return self.reference.id
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[dict]:
+        return copy.deepcopy(self._data)
+
+    def get(self, field_path: str) -> Any:
+        if self._data is None:
+            return None
+        value = _get_path(self._data, _parts(field_path))
+        if value is _MISSING:
+            raise KeyError(field_path)
+        return copy.deepcopy(value)
+
+
+class _Watch:
+    def __init__(self, client: "MemoryClient", path: str, callback: Callable):
+        self._client = client
+        self._path = path
+        self._callback = callback
+
+    def unsubscribe(self):
+        with self._client._listeners_lock:
+            listeners = self._client._listeners.get(self._path, [])
+            if self in listeners:
+                listeners.remove(self)
+
+
+class MemoryDocumentReference:
+    def __init__(self, client: "MemoryClient", collection_path: str, document_id: str):
+        self._client = client
+        self._collection_path = collection_path
+        self.id = document_id
+
+    @property
+    def path(self) -> str:
+        return f"{self._collection_path}/{self.id}"
+
+    @property
+    def parent(self) -> "MemoryCollectionReference":
+        return MemoryCollectionReference(self._client, self._collection_path)
+
+    def collection(self, collection_id: str) -> "MemoryCollectionReference":
+        return MemoryCollectionReference(self._client, f"{self.path}/{collection_id}")
+
+    def __eq__(self, other):
+        return isinstance(other, MemoryDocumentReference) and other.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+    async def get(self, field_paths: Optional[List[str]] = None, transaction=None) -> MemoryDocumentSnapshot:
+        if transaction is not None:
+            return await transaction.get(self)
+        await self._client._rpc()
+        return self._client._snapshot(self, field_paths)
+
+    async def set(self, document_data: dict, merge: bool = False):
+        await self._client._rpc()
+        return self._client._commit([("set", self, document_data, merge)])[0]
+
+    async def create(self, document_data: dict):
+        await self._client._rpc()
+        return self._client._commit([("create", self, document_data, None)])[0]
+
+    async def update(self, field_updates: dict, option: Optional[WriteOption] = None):
+        await self._client._rpc()
+        return self._client._commit([("update", self, field_updates, option)])[0]
+
+    async def delete(self, option: Optional[WriteOption] = None):
+        await self._client._rpc()
+        return self._client._commit([("delete", self, None, option)])[0]
+
+    def on_snapshot(self, callback: Callable) -> _Watch:
+        """Como en Firestore, el callback recibe ([snapshot], cambios, read_time) y se llama al registrarse."""
+        watch = _Watch(self._client, self.path, callback)
+        with self._client._listeners_lock:
+            self._client._listeners.setdefault(self.path, []).append(watch)
+        snapshot = self._client._snapshot(self)
+        callback([snapshot], [], snapshot.read_time)
+        return watch
+
+
+class MemoryQuery:
+    def __init__(self, client: "MemoryClient", collection_path: str, filters=(), orders=(),
+                 limit: Optional[int] = None, offset: int = 0, cursor=None, projection=None):
+        self._client = client
+        self._collection_path = collection_path
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit
+        self._offset = offset
+        self._cursor = cursor
+        self._projection = projection
+
+    def _copy(self, **changes) -> "MemoryQuery":
+        state = {
+            "filters": self._filters,
+            "orders": self._orders,
+            "limit": self._limit,
+            "offset": self._offset,
+            "cursor": self._cursor,
+            "projection": self._projection,
+        }
+        state.update(changes)
+        return MemoryQuery(self._client, self._collection_path, **state)
+
+    def where(self, field_path: str = None, op_string: str = None, value: Any = None, *, filter=None) -> "MemoryQuery":
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + ((_parts(field_path), op_string, value),))
+
+    def order_by(self, field_path: str, direction: str = "ASCENDING") -> "MemoryQuery":
+        return self._copy(orders=self._orders + ((_parts(field_path), direction == "DESCENDING"),))
+
+    def limit(self, count: int) -> "MemoryQuery":
+        return self._copy(limit=count)
+
+    def offset(self, num_to_skip: int) -> "MemoryQuery":
+        return self._copy(offset=num_to_skip)
+
+    def select(self, field_paths: Iterable[str]) -> "MemoryQuery":
+        return self._copy(projection=list(field_paths))
+
+    def start_after(self, document_fields_or_snapshot) -> "MemoryQuery":
+        return self._copy(cursor=document_fields_or_snapshot)
+
+    def _order_key(self, orders, stored: _Stored, doc_id: str):
+        key = []
+        for parts, descending in orders:
+            value = _sort_key(_get_path(stored.data, parts))
+            key.append(_Descending(value) if descending else value)
+        key.append(doc_id)
+        return key
+
+    def _cursor_key(self, orders):
+        cursor = self._cursor
+        if isinstance(cursor, MemoryDocumentSnapshot):
+            data, doc_id = cursor.to_dict() or {}, cursor.id
+        else:
+            data, doc_id = {}, None
+            for parts, _ in orders:
+                _set_path(data, parts, _get_path(cursor, parts))
+        key = []
+        for parts, descending in orders:
+            value = _sort_key(_get_path(data, parts))
+            key.append(_Descending(value) if descending else value)
+        return key, doc_id
+
+    def _run(self) -> List[MemoryDocumentSnapshot]:
+        collection = self._client._store.get(self._collection_path, {})
+        candidates = collection.items()
+        # Como los índices de Firestore: un filtro de igualdad reduce los candidatos sin recorrer la colección
+        for parts, op, value in self._filters:
+            key = _index_key(value) if op in ("==", "array_contains") else None
+            if key is not None:
+                ids = self._client._index(self._collection_path, op, parts).get(key, {})
+                candidates = [(doc_id, collection[doc_id]) for doc_id in ids]
+                break
+        orders = list(self._orders)
+        # Como Firestore, si hay un filtro de desigualdad sin order_by se ordena por ese campo
+        if not orders:
+            for parts, op, _ in self._filters:
+                if op in ("<", "<=", ">", ">=", "!=", "not-in"):
+                    orders.append((parts, False))
+                    break
+        rows = []
+        for doc_id, stored in candidates:
+            if any(_get_path(stored.data, parts) is _MISSING for parts, _ in orders):
+                continue
+            if all(_compare(op, _get_path(stored.data, parts), value) for parts, op, value in self._filters):
+                rows.append((self._order_key(orders, stored, doc_id), doc_id, stored))
+        if self._cursor is not None:
+            cursor_key, cursor_id = self._cursor_key(orders)
+            n = len(cursor_key)
+            rows = [
+                row for row in rows
+                if cursor_key < row[0][:n] or (cursor_key == row[0][:n] and cursor_id is not None and row[1] > cursor_id)
+            ]
+        if self._limit is not None:
+            rows = heapq.nsmallest(self._offset + self._limit, rows, key=lambda row: row[0])[self._offset:]
+        else:
+            rows = sorted(rows, key=lambda row: row[0])[self._offset:]
+        parent = MemoryCollectionReference(self._client, self._collection_path)
+        read_time = self._client._now()
+        return [
+            MemoryDocumentSnapshot(parent.document(doc_id), stored, read_time, self._projection)
+            for _, doc_id, stored in rows
+        ]
+
+    async def stream(self, transaction=None):
+        if transaction is not None:
+            for snapshot in await transaction.get(self):
+                yield snapshot
+            return
+        await self._client._rpc()
+        for snapshot in self._run():
+            yield snapshot
+
+    async def get(self, transaction=None) -> List[MemoryDocumentSnapshot]:
+        if transaction is not None:
+            return await transaction.get(self)
+        await self._client._rpc()
+        return self._run()
+
+
+class MemoryCollectionReference(MemoryQuery):
+    def __init__(self, client: "MemoryClient", path: str):
+        super().__init__(client, path)
+
+    @property
+    def id(self) -> str:
+        return self._collection_path.rsplit("/", 1)[-1]
+
+    def document(self, document_id: Optional[str] = None) -> MemoryDocumentReference:
+        return MemoryDocumentReference(self._client, self._collection_path, document_id or _auto_id())
+
+    async def add(self, document_data: dict):
+        ref = self.document()
+        result = await ref.set(document_data)
+        return result, ref
+
+
+class MemoryWriteBatch:
+    def __init__(self, client: "MemoryClient"):
+        self._client = client
+        self._writes: List[tuple] = []
+
+    def set(self, reference, document_data: dict, merge: bool = False):
+        self._writes.append(("set", reference, document_data, merge))
+
+    def create(self, reference, document_data: dict):
+        self._writes.append(("create", reference, document_data, None))
+
+    def update(self, reference, field_updates: dict, option: Optional[WriteOption] = None):
+        self._writes.append(("update", reference, field_updates, option))
+
+    def delete(self, reference, option: Optional[WriteOption] = None):
+        self._writes.append(("delete", reference, None, option))
+
+    def __len__(self):
+        return len(self._writes)
+
+    async def commit(self):
+        await self._client._rpc()
+        writes, self._writes = self._writes, []
+        return self._client._commit(writes)
+
+
+class MemoryTransaction(MemoryWriteBatch):
+    """Transacción optimista: al confirmar falla con Aborted si algún documento leído cambió."""
+
+    def __init__(self, client: "MemoryClient"):
+        super().__init__(client)
+        self._reads: Dict[str, Optional[datetime]] = {}
+
+    async def get(self, ref_or_query):
+        await self._client._rpc()
+        if isinstance(ref_or_query, MemoryDocumentReference):
+            snapshot = self._client._snapshot(ref_or_query)
+            self._reads.setdefault(ref_or_query.path, snapshot.update_time)
+            return snapshot
+        snapshots = ref_or_query._run()
+        for snapshot in snapshots:
+            self._reads.setdefault(snapshot.reference.path, snapshot.update_time)
+        return snapshots
+
+    async def commit(self):
+        await self._client._rpc()
+        for path, update_time in self._reads.items():
+            stored = self._client._stored(path)
+            if (stored.update_time if stored else None) != update_time:
+                raise Aborted("Conflicto de transacción")
+        writes, self._writes = self._writes, []
+        return self._client._commit(writes)
+
+
+class MemoryClient:
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self._store: Dict[str, Dict[str, _Stored]] = {}
+        # colección -> (op, campo) -> clave -> ids; se arman al consultar y se descartan al escribir
+        self._indexes: Dict[str, Dict[tuple, Dict[Any, Dict[str, None]]]] = {}
+        self._listeners: Dict[str, List[_Watch]] = {}
+        self._listeners_lock = threading.Lock()
+        self._last_time = datetime.now(timezone.utc)
+        self.rpcs = 0  # RPCs simuladas (los benchmarks reportan RPCs por request)
+
+    async def _rpc(self):
+        self.rpcs += 1
+        delay = self.latency + random.uniform(-self.jitter, self.jitter)
+        await asyncio.sleep(max(delay, 0))
+
+    def _now(self) -> datetime:
+        # update_time estrictamente creciente: las precondiciones comparan por igualdad
+        now = datetime.now(timezone.utc)
+        if now <= self._last_time:
+            now = self._last_time + timedelta(microseconds=1)
+        self._last_time = now
+        return now
+
+    def _stored(self, path: str) -> Optional[_Stored]:
+        collection_path, doc_id = path.rsplit("/", 1)
+        return self._store.get(collection_path, {}).get(doc_id)
+
+    def _index(self, collection_path: str, op: str, parts: Tuple[str, ...]) -> Dict[Any, Dict[str, None]]:
+        indexes = self._indexes.setdefault(collection_path, {})
+        index = indexes.get((op, parts))
+        if index is None:
+            index = indexes[(op, parts)] = {}
+            for doc_id, stored in self._store.get(collection_path, {}).items():
+                value = _get_path(stored.data, parts)
+                values = (value if isinstance(value, list) else ()) if op == "array_contains" else (value,)
+                for item in values:
+                    key = _index_key(item)
+                    if key is not None:
+                        index.setdefault(key, {})[doc_id] = None
+        return index
+
+    def _snapshot(self, ref: MemoryDocumentReference, field_paths=None) -> MemoryDocumentSnapshot:
+        return MemoryDocumentSnapshot(ref, self._stored(ref.path), self._now(), field_paths)
+
+    def _commit(self, writes: List[tuple]) -> List[WriteResult]:
+        """Valida y aplica todas las escrituras o ninguna."""
+        now = self._now()
+        staged: Dict[str, Optional[_Stored]] = {}
+        for kind, ref, data, extra in writes:
+            current = staged[ref.path] if ref.path in staged else self._stored(ref.path)
+            if kind == "create":
+                if current is not None:
+                    raise AlreadyExists(f"El documento ya existe: {ref.path}")
+                staged[ref.path] = _Stored(_resolve_transforms(data, {}, now), now, now)
+            elif kind == "set":
+                base = copy.deepcopy(current.data) if (current is not None and extra) else {}
+                for key, value in data.items():
+                    if value is transforms.DELETE_FIELD:
+                        base.pop(key, None)
+                    else:
+                        base[key] = _resolve_transforms(value, base.get(key), now)
+                staged[ref.path] = _Stored(base, current.create_time if current else now, now)
+            elif kind == "update":
+                if extra is not None:
+                    extra.check(current)
+                if current is None:
+                    raise NotFound(f"No existe el documento: {ref.path}")
+                base = copy.deepcopy(current.data)
+                for key, value in data.items():
+                    parts = _parts(key)
+                    if value is transforms.DELETE_FIELD:
+                        _delete_path(base, parts)
+                    else:
+                        existing = _get_path(base, parts)
+                        _set_path(base, parts, _resolve_transforms(value, None if existing is _MISSING else existing, now))
+                staged[ref.path] = _Stored(base, current.create_time, now)
+            elif kind == "delete":
+                if extra is not None:
+                    extra.check(current)
+                staged[ref.path] = None
+
+        for path, stored in staged.items():
+            collection_path, doc_id = path.rsplit("/", 1)
+            if stored is None:
+                self._store.get(collection_path, {}).pop(doc_id, None)
+            else:
+                self._store.setdefault(collection_path, {})[doc_id] = stored
+            self._indexes.pop(collection_path, None)
+        self._notify(staged)
+        return [WriteResult(update_time=now) for _ in writes]
+
+    def _notify(self, staged: Dict[str, Optional[_Stored]]):
+        with self._listeners_lock:
+            watches = [(path, list(self._listeners.get(path, []))) for path in staged]
+        for path, path_watches in watches:
+            if not path_watches:
+                continue
+            collection_path, doc_id = path.rsplit("/", 1)
+            snapshot = self._snapshot(MemoryDocumentReference(self, collection_path, doc_id))
+            for watch in path_watches:
+                watch._callback([snapshot], [], snapshot.read_time)
+
+    def collection(self, collection_id: str) -> MemoryCollectionReference:
+        return MemoryCollectionReference(self, collection_id)
+
+    def document(self, document_path: str) -> MemoryDocumentReference:
+        collection_path, doc_id = document_path.rsplit("/", 1)
+        return MemoryDocumentReference(self, collection_path, doc_id)
+
+    async def get_all(self, references, field_paths: Optional[List[str]] = None, transaction=None):
+        await self._rpc()
+        for ref in references:
+            snapshot = self._snapshot(ref, field_paths)
+            if transaction is not None:
+                transaction._reads.setdefault(ref.path, snapshot.update_time)
+            yield snapshot
+
+    def batch(self) -> MemoryWriteBatch:
+        return MemoryWriteBatch(self)
+
+    def transaction(self, **kwargs) -> MemoryTransaction:
+        return MemoryTransaction(self)
+
+    def write_option(self, **kwargs) -> WriteOption:
+        return WriteOption(**kwargs)
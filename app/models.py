@@ -1,5 +1,6 @@
+from datetime import datetime
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 class User(BaseModel):
     id: str
@@ -30,7 +31,13 @@ class Match(BaseModel):
     duration: int
     status: str = "open"
     bet: Optional[str] = None
-    players: List[Player] = []
+    players: List[Player] = []  # en Firestore es un mapa por user_id (ver roster.players_map)
+    # Denormalizados, los mantiene roster.summary()
+    player_ids: List[str] = []
+    confirmed_count: int = 0
+    open_slots: int = 0
+    team_counts: Dict[str, int] = {}
+    starts_at: Optional[datetime] = None
     # confirmed_players: List[Player] = []
     notas: Optional[str] = None
     creator_position: Optional[str] = None
@@ -0,0 +1,93 @@
+# app/periodic.py
+import asyncio
+import functools
+from typing import Optional
+
+from app import warmup
+from app.logger import log_info
+from app.repository import Repository
+
+
+def journaled(method):
+    """
+    Mutación del estado en memoria. Si llega mientras un rebuild lee de Firestore se vuelve a
+    aplicar después del load(): la consulta pudo leer el documento antes de esa escritura. Puede
+    estar ya en lo leído, así que tiene que ser idempotente.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self._journal is not None:
+            self._journal.append((method, args, kwargs))
+        return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+class PeriodicRebuild:
+    """
+    Estado en memoria armado desde Firestore (ranking, recomendaciones, grafo social). Cada proceso
+    solo ve sus propias escrituras: se reconstruye cada rebuild_seconds desde Firestore.
+
+    La primera carga corre en segundo plano y el proceso no está listo hasta que termina (ver
+    warmup.load). Las subclases definen name, fetch() y load(), marcan sus mutaciones con
+    @journaled y, si hacen algo más seguido que reconstruir, tick() cada tick_seconds.
+    """
+
+    name = ""
+    rebuild_seconds = 600.0
+    tick_seconds: Optional[float] = None
+
+    _task: Optional[asyncio.Task] = None
+    _journal: Optional[list] = None
+
+    async def fetch(self, repo: Repository) -> tuple:
+        """Lee de Firestore los argumentos de load()."""
+        raise NotImplementedError
+
+    def load(self, *args):
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        """Tamaños para el log de cada rebuild."""
+        return {}
+
+    async def rebuild(self, repo: Repository):
+        self._journal = []
+        try:
+            data = await self.fetch(repo)
+        finally:
+            journal, self._journal = self._journal, None
+        # Sin awaits entre el load y el replay: ninguna mutación queda entre los dos
+        self.load(*data)
+        for method, args, kwargs in journal:
+            method(self, *args, **kwargs)
+        log_info(f"{self.name}_rebuild", replayed=len(journal), **self.stats())
+
+    async def tick(self, repo: Repository):
+        pass
+
+    async def _run(self, repo: Repository):
+        await warmup.load(self.name, lambda: self.rebuild(repo))
+        interval = self.tick_seconds or self.rebuild_seconds
+        since_rebuild = 0.0
+        while True:
+            await asyncio.sleep(interval)
+            since_rebuild += interval
+            try:
+                if since_rebuild >= self.rebuild_seconds:
+                    since_rebuild = 0.0
+                    await self.rebuild(repo)
+                await self.tick(repo)
+            except Exception as e:
+                log_info(f"{self.name}_error", error=str(e))
+
+    async def start(self, repo: Repository):
+        # Antes de crear la tarea, así /readyz da 503 desde el primer request
+        warmup.state.expect(self.name)
+        self._task = asyncio.create_task(self._run(repo))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
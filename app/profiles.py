@@ -0,0 +1,35 @@
+# app/profiles.py
+import os
+from typing import Optional
+
+from app.cache import MemoryCache, ReadThroughCache
+from app.repository import Repository
+
+# Perfiles (colección Users) por uid. El TTL es corto: solo cubre las primeras pantallas de la sesión
+profiles = ReadThroughCache(
+    MemoryCache(maxsize=int(os.getenv("PROFILE_CACHE_MAX_ENTRIES", "4096"))),
+    ttl=float(os.getenv("PROFILE_CACHE_TTL_SECONDS", "60")),
+)
+
+PROFILE_FIELDS = ["id", "email", "name", "username", "photo_url"]
+
+
+async def get_profile(repo: Repository, uid: str) -> Optional[dict]:
+    async def load():
+        doc = await repo.users.document(uid).get()
+        return doc.to_dict() if doc.exists else None
+
+    return await profiles.get_or_load(uid, load)
+
+
+async def remember(uid: str, profile: dict):
+    await profiles.set(uid, profile)
+
+
+async def forget(uid: str):
+    await profiles.invalidate(uid)
+
+
+def public(profile: dict, uid: str) -> dict:
+    """Lo que devuelve el login: los campos de PROFILE_FIELDS."""
+    return {**{field: profile.get(field) for field in PROFILE_FIELDS}, "id": profile.get("id") or uid}
@@ -0,0 +1,207 @@
+# app/ranking.py
+import bisect
+import os
+from typing import Dict, List, Optional, Tuple
+
+from google.cloud.firestore_v1 import Increment
+
+from app import metrics
+from app.cache import cache, stats_key
+from app.logger import log_debug, log_info
+from app.periodic import PeriodicRebuild, journaled
+from app.repository import Repository
+
+POINTS_WIN = 3
+POINTS_DRAW = 1
+FLUSH_SECONDS = float(os.getenv("RANKING_FLUSH_SECONDS", "5"))
+REBUILD_SECONDS = float(os.getenv("RANKING_REBUILD_SECONDS", "600"))
+BATCH_MAX_WRITES = 500
+IN_QUERY_MAX = 30  # máximo de valores de un filtro "in"
+
+STATS_FIELDS = ["user_id", "username", "photo_url", "wins", "loses", "draws", "matches_played", "rank"]
+
+rank_writes = metrics.counter("ranking_rank_writes_total", "Ranks persistidos en UserStats")
+
+
+def points(stats: dict) -> int:
+    return stats.get("wins", 0) * POINTS_WIN + stats.get("draws", 0) * POINTS_DRAW
+
+
+def _sort_key(stats: dict) -> Tuple[int, int, str]:
+    # Más puntos primero; a igualdad, más victorias; luego por username para un orden total
+    return -points(stats), -stats.get("wins", 0), stats["username"]
+
+
+def outcome(team: str, score: Optional[dict]) -> Optional[str]:
+    """'wins', 'loses' o 'draws' para un jugador del equipo `team`; None si no hay marcador."""
+    if not score:
+        return None
+    own = score.get(team, 0)
+    other = score.get("away" if team == "home" else "home", 0)
+    if own > other:
+        return "wins"
+    if own < other:
+        return "loses"
+    return "draws"
+
+
+class RankingEngine(PeriodicRebuild):
+    """
+    Tabla de posiciones en memoria: una lista ordenada de claves de ranking, así que el rank de
+    un usuario y una página del leaderboard se resuelven con búsqueda binaria (O(log n)).
+
+    Los ranks cambiados se marcan como un rango de posiciones sucias y un flusher periódico los
+    escribe en UserStats en batches.
+    """
+
+    name = "ranking"
+    rebuild_seconds = REBUILD_SECONDS
+    tick_seconds = FLUSH_SECONDS
+
+    def __init__(self):
+        self._keys: List[Tuple[int, int, str]] = []
+        self._stats: Dict[str, dict] = {}
+        self._persisted: Dict[str, int] = {}
+        self._dirty: Optional[Tuple[int, int]] = None
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _mark_dirty(self, start: int, end: int):
+        if self._dirty is not None:
+            start, end = min(start, self._dirty[0]), max(end, self._dirty[1])
+        self._dirty = (start, end)
+
+    def load(self, rows: List[dict]):
+        self._stats = {row["username"]: row for row in rows}
+        self._persisted = {row["username"]: row.get("rank", 0) for row in rows}
+        self._keys = sorted(_sort_key(row) for row in rows)
+        self._dirty = (0, len(self._keys) - 1) if self._keys else None
+
+    @journaled
+    def upsert(self, stats: dict):
+        username = stats["username"]
+        old = self._stats.get(username)
+        if old is not None:
+            old_index = bisect.bisect_left(self._keys, _sort_key(old))
+            del self._keys[old_index]
+        else:
+            old_index = len(self._keys)
+        self._stats[username] = stats
+        new_index = bisect.bisect_left(self._keys, _sort_key(stats))
+        self._keys.insert(new_index, _sort_key(stats))
+        # Solo cambian de rank las posiciones entre la vieja y la nueva
+        self._mark_dirty(min(old_index, new_index), max(old_index, new_index))
+
+    @journaled
+    def update_profile(self, username: str, fields: dict):
+        """Campos que no afectan el orden (photo_url, pref_position...)."""
+        if username in self._stats:
+            self._stats[username] = {**self._stats[username], **fields}
+
+    def rank(self, username: str) -> Optional[int]:
+        stats = self._stats.get(username)
+        if stats is None:
+            return None
+        return bisect.bisect_left(self._keys, _sort_key(stats)) + 1
+
+    def entry(self, username: str) -> Optional[dict]:
+        rank = self.rank(username)
+        if rank is None:
+            return None
+        return {**self._stats[username], "rank": rank, "points": points(self._stats[username])}
+
+    def page(self, offset: int, limit: int) -> List[dict]:
+        return [
+            {**self._stats[key[2]], "rank": offset + i + 1, "points": -key[0]}
+            for i, key in enumerate(self._keys[offset:offset + limit])
+        ]
+
+    async def fetch(self, repo: Repository) -> tuple:
+        rows = [doc.to_dict() async for doc in repo.user_stats.select(STATS_FIELDS).stream()]
+        return ([row for row in rows if row.get("username")],)
+
+    def stats(self) -> dict:
+        return {"users": len(self._keys)}
+
+    async def flush(self, repo: Repository) -> int:
+        """Persiste los ranks que cambiaron desde el último flush."""
+        if self._dirty is None:
+            return 0
+        start, end = self._dirty
+        self._dirty = None
+        changes = []
+        for index in range(start, min(end, len(self._keys) - 1) + 1):
+            username = self._keys[index][2]
+            if self._persisted.get(username) != index + 1:
+                changes.append((username, index + 1))
+
+        for i in range(0, len(changes), BATCH_MAX_WRITES):
+            chunk = changes[i:i + BATCH_MAX_WRITES]
+            batch = repo.batch()
+            for username, rank in chunk:
+                batch.update(repo.user_stats.document(username), {"rank": rank})
+            try:
+                await batch.commit()
+            except Exception as e:
+                # Se reintenta en el próximo flush
+                self._mark_dirty(start, end)
+                log_info("ranking_flush_error", error=str(e))
+                return i
+            for username, rank in chunk:
+                self._persisted[username] = rank
+                self._stats[username]["rank"] = rank
+                await cache.invalidate(stats_key(username))
+            rank_writes.inc(len(chunk))
+        log_debug("ranking_flush", writes=len(changes))
+        return len(changes)
+
+    async def tick(self, repo: Repository):
+        await self.flush(repo)
+
+    async def stop(self, repo: Repository):
+        await super().stop()
+        await self.flush(repo)
+
+
+engine = RankingEngine()
+
+
+async def stats_by_user_id(repo: Repository, user_ids: List[str], transaction=None) -> Dict[str, dict]:
+    """UserStats (clave username) de cada user_id, con consultas 'in' de a IN_QUERY_MAX."""
+    found = {}
+    for i in range(0, len(user_ids), IN_QUERY_MAX):
+        query = repo.user_stats.where("user_id", "in", user_ids[i:i + IN_QUERY_MAX])
+        async for doc in query.stream(transaction=transaction):
+            row = doc.to_dict()
+            found[row["user_id"]] = {**row, "username": doc.id}
+    return found
+
+
+def result_updates(match: dict, stats: Dict[str, dict], count_played: bool = True) -> Dict[str, dict]:
+    """
+    Increments de UserStats por username para los jugadores de un reto finalizado. Con
+    count_played=False solo el resultado (el reto ya se había contado sin marcador).
+    """
+    updates = {}
+    for player in match.get("players", []):
+        row = stats.get(player["user_id"])
+        if row is None:
+            continue
+        fields = {"matches_played": Increment(1)} if count_played else {}
+        result = outcome(player.get("team", "home"), match.get("score"))
+        if result:
+            fields[result] = Increment(1)
+        if fields:
+            updates[row["username"]] = fields
+    return updates
+
+
+def apply_locally(stats: Dict[str, dict], updates: Dict[str, dict]):
+    """Refleja en el engine unos increments ya confirmados en Firestore."""
+    by_username = {row["username"]: row for row in stats.values()}
+    for username, fields in updates.items():
+        row = dict(by_username[username])
+        for field, increment in fields.items():
+            row[field] = row.get(field, 0) + increment.value
+        engine.upsert(row)
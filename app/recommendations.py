@@ -0,0 +1,271 @@
+# app/recommendations.py
+import heapq
+import math
+import os
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy es opcional: sin él se puntúa reto por reto
+    np = None
+
+from app import metrics
+from app import roster
+from app.periodic import PeriodicRebuild, journaled
+from app.repository import Repository
+
+REBUILD_SECONDS = float(os.getenv("RECOMMENDATIONS_REBUILD_SECONDS", "300"))
+# No se recomiendan retos que empiezan antes de este margen
+MIN_LEAD_SECONDS = float(os.getenv("RECOMMENDATIONS_MIN_LEAD_MINUTES", "30")) * 60
+# Escala del decaimiento por fecha: un reto a SOON_HOURS horas pesa 1/e de uno inminente
+SOON_HOURS = float(os.getenv("RECOMMENDATIONS_SOON_HOURS", "48"))
+
+WEIGHT_POSITION = 3.0
+WEIGHT_FRIENDS = 2.0
+WEIGHT_SOON = 1.0
+FRIENDS_CAP = 3  # más amigos que estos no suman
+
+# Cupos por posición en un reto completo. El arquero es uno, como exige confirm_player; el resto
+# sigue una formación de referencia por modo
+CUPOS_POR_POSICION = {
+    "5vs5": {"arquero": 1, "defensa": 4, "mediocampista": 2, "delantero": 2},
+    "6vs6": {"arquero": 1, "defensa": 4, "mediocampista": 4, "delantero": 2},
+    "7vs7": {"arquero": 1, "defensa": 6, "mediocampista": 4, "delantero": 2},
+}
+
+INDEX_FIELDS = ["status", "mode", "starts_at", "date", "time", "players"]
+
+open_matches = metrics.gauge("recommendations_open_matches", "Retos abiertos en el índice de recomendaciones")
+
+
+class Recommendation(NamedTuple):
+    match_id: str
+    score: float
+    friends: int
+    position_available: bool
+
+
+class OpenMatchIndex(PeriodicRebuild):
+    """
+    Retos abiertos en columnas (un arreglo por atributo, una fila por reto) para puntuarlos todos
+    con operaciones vectorizadas. Las filas de retos que se cierran quedan libres y se reutilizan.
+
+    Por fila: modo, inicio, cupos libres por equipo y por posición, y los jugadores, internados
+    como enteros con un índice inverso jugador -> filas para contar amigos sin recorrer plantillas.
+    """
+
+    name = "recommendations"
+    rebuild_seconds = REBUILD_SECONDS
+
+    def __init__(self, capacity: int = 1024):
+        self._capacity = 0
+        self._size = 0  # filas usadas alguna vez; las libres tienen alive=False
+        self._rows: Dict[str, int] = {}
+        self._match_ids: List[Optional[str]] = []
+        self._free: List[int] = []
+        self._modes: Dict[str, int] = {}
+        self._users: Dict[str, int] = {}
+        self._players: List[Set[int]] = []
+        self._user_rows: Dict[int, Set[int]] = {}
+        self._grow(capacity)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _grow(self, capacity: int):
+        columns = {
+            "alive": (bool, ()),
+            "mode": ("int16", ()),
+            "starts_at": ("float64", ()),
+            "open_slots": ("int16", ()),
+            "free_team": ("int16", (2,)),
+            "free_position": ("int16", (len(roster.POSICIONES),)),
+        }
+        for name, (dtype, shape) in columns.items():
+            if np is not None:
+                column = np.zeros((capacity, *shape), dtype=dtype)
+                if self._capacity:
+                    column[:self._capacity] = getattr(self, "_" + name)
+            else:
+                empty = (lambda: [0] * shape[0]) if shape else (lambda: 0)
+                column = (getattr(self, "_" + name) if self._capacity else []) + [empty() for _ in range(capacity - self._capacity)]
+            setattr(self, "_" + name, column)
+        self._match_ids.extend([None] * (capacity - self._capacity))
+        self._players.extend(set() for _ in range(capacity - self._capacity))
+        self._capacity = capacity
+
+    def _intern(self, table: Dict[str, int], key: str) -> int:
+        value = table.get(key)
+        if value is None:
+            value = table[key] = len(table)
+        return value
+
+    def _row(self, match_id: str) -> int:
+        row = self._rows.get(match_id)
+        if row is not None:
+            return row
+        if self._free:
+            row = self._free.pop()
+        else:
+            if self._size == self._capacity:
+                self._grow(self._capacity * 2)
+            row = self._size
+            self._size += 1
+        self._rows[match_id] = row
+        self._match_ids[row] = match_id
+        return row
+
+    def _set_players(self, row: int, players: Set[int]):
+        for user in self._players[row] - players:
+            rows = self._user_rows.get(user)
+            if rows is not None:
+                rows.discard(row)
+                if not rows:
+                    del self._user_rows[user]
+        for user in players - self._players[row]:
+            self._user_rows.setdefault(user, set()).add(row)
+        self._players[row] = players
+
+    @journaled
+    def upsert(self, match_id: str, data: dict):
+        """Agrega o actualiza un reto a partir de su documento; si ya no está abierto, lo quita."""
+        start = data.get("starts_at") or roster.starts_at(data)
+        if data.get("status") != "open" or start is None:
+            return self.discard(match_id)
+
+        players = roster.players_list(data)
+        mode = data.get("mode") or "5vs5"
+        per_team = roster.limite_total(data) // 2
+        teams = {"home": 0, "away": 0}
+        for p in players:
+            if p.get("team") in teams:
+                teams[p["team"]] += 1
+        confirmed = roster.position_counts(players)
+        cupos = CUPOS_POR_POSICION.get(mode, CUPOS_POR_POSICION["5vs5"])
+
+        row = self._row(match_id)
+        self._alive[row] = True
+        self._mode[row] = self._intern(self._modes, mode)
+        self._starts_at[row] = start.timestamp()
+        self._open_slots[row] = max(roster.limite_total(data) - roster.count_confirmed(players), 0)
+        free_team = [max(per_team - teams["home"], 0), max(per_team - teams["away"], 0)]
+        free_position = [max(cupos[pos] - confirmed[pos], 0) for pos in roster.POSICIONES]
+        if np is not None:
+            self._free_team[row] = free_team
+            self._free_position[row] = free_position
+        else:
+            self._free_team[row], self._free_position[row] = free_team, free_position
+        self._set_players(row, {self._intern(self._users, p["user_id"]) for p in players})
+        open_matches.set(len(self._rows))
+
+    @journaled
+    def discard(self, match_id: str):
+        row = self._rows.pop(match_id, None)
+        if row is None:
+            return
+        self._alive[row] = False
+        self._match_ids[row] = None
+        self._set_players(row, set())
+        self._free.append(row)
+        open_matches.set(len(self._rows))
+
+    def load(self, docs: Iterable[Tuple[str, dict]]):
+        for match_id in list(self._rows):
+            self.discard(match_id)
+        for match_id, data in docs:
+            self.upsert(match_id, data)
+
+    def recommend(
+        self,
+        user_id: str,
+        friend_ids: Iterable[str],
+        pref_position: Optional[str] = None,
+        mode: Optional[str] = None,
+        limit: int = 20,
+        now: Optional[datetime] = None,
+    ) -> List[Recommendation]:
+        """Los `limit` retos con mejor puntaje para el usuario, excluyendo aquellos en los que ya está."""
+        now = (now or datetime.now(timezone.utc)).timestamp()
+        position = roster.POSICIONES.index(pref_position) if pref_position in roster.POSICIONES else None
+        mode_code = self._modes.get(mode, -1) if mode else None
+        own = self._user_rows.get(self._users.get(user_id), set())
+        friend_rows = [self._user_rows[u] for u in (self._users.get(f) for f in friend_ids) if u in self._user_rows]
+        if np is None:
+            return self._recommend_python(now, position, mode_code, own, friend_rows, limit)
+
+        n = self._size
+        starts_at = self._starts_at[:n]
+        free_team = self._free_team[:n]
+        mask = self._alive[:n] & (starts_at >= now + MIN_LEAD_SECONDS) & (self._open_slots[:n] > 0)
+        mask &= (free_team[:, 0] > 0) | (free_team[:, 1] > 0)
+        if mode_code is not None:
+            mask &= self._mode[:n] == mode_code
+        if own:
+            mask[np.fromiter(own, dtype=np.int64, count=len(own))] = False
+        candidates = np.flatnonzero(mask)
+        if not len(candidates):
+            return []
+
+        friends = np.zeros(n, dtype=np.int16)
+        for rows in friend_rows:
+            friends[np.fromiter(rows, dtype=np.int64, count=len(rows))] += 1
+        friends = friends[candidates]
+        if position is not None:
+            position_fit = self._free_position[candidates, position] > 0
+        else:
+            position_fit = np.zeros(len(candidates), dtype=bool)
+        hours = (starts_at[candidates] - now) / 3600
+        scores = (
+            WEIGHT_POSITION * position_fit
+            + WEIGHT_FRIENDS * np.minimum(friends, FRIENDS_CAP) / FRIENDS_CAP
+            + WEIGHT_SOON * np.exp(-hours / SOON_HOURS)
+        )
+
+        k = min(limit, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(candidates) else np.arange(len(candidates))
+        # Mayor puntaje primero; a igualdad, el que empieza antes
+        top = top[np.lexsort((hours[top], -scores[top]))]
+        return [
+            Recommendation(self._match_ids[candidates[i]], round(float(scores[i]), 4), int(friends[i]), bool(position_fit[i]))
+            for i in top
+        ]
+
+    def _recommend_python(self, now, position, mode_code, own, friend_rows, limit) -> List[Recommendation]:
+        friends: Dict[int, int] = {}
+        for rows in friend_rows:
+            for row in rows:
+                friends[row] = friends.get(row, 0) + 1
+        scored = []
+        for row in range(self._size):
+            free_team = self._free_team[row]
+            if (
+                not self._alive[row] or row in own or self._open_slots[row] <= 0
+                or self._starts_at[row] < now + MIN_LEAD_SECONDS or not (free_team[0] > 0 or free_team[1] > 0)
+                or (mode_code is not None and self._mode[row] != mode_code)
+            ):
+                continue
+            count = friends.get(row, 0)
+            fit = position is not None and self._free_position[row][position] > 0
+            hours = (self._starts_at[row] - now) / 3600
+            score = WEIGHT_POSITION * fit + WEIGHT_FRIENDS * min(count, FRIENDS_CAP) / FRIENDS_CAP + WEIGHT_SOON * math.exp(-hours / SOON_HOURS)
+            scored.append((score, -hours, row, count, fit))
+        return [
+            Recommendation(self._match_ids[row], round(score, 4), count, fit)
+            for score, _, row, count, fit in heapq.nlargest(limit, scored)
+        ]
+
+    async def fetch(self, repo: Repository) -> tuple:
+        query = (
+            repo.matches
+            .where("status", "==", "open")
+            .where("starts_at", ">=", datetime.now(timezone.utc))
+            .select(INDEX_FIELDS)
+        )
+        return ([(doc.id, doc.to_dict()) async for doc in query.stream()],)
+
+    def stats(self) -> dict:
+        return {"matches": len(self._rows)}
+
+
+index = OpenMatchIndex()
@@ -0,0 +1,134 @@
+# app/repository.py
+import os
+from typing import Any, Awaitable, Callable, Optional
+
+from google.api_core.exceptions import Aborted
+
+from app.instrumentation import InstrumentedClient
+
+
+class Repository:
+    """
+    Punto único de acceso a las colecciones de la app.
+
+    Envuelve un cliente con la API de AsyncClient de Firestore (el real o MemoryClient),
+    así que las rutas siguen usando referencias, consultas y batches de Firestore.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def collection(self, name: str):
+        return self.client.collection(name)
+
+    @property
+    def matches(self):
+        return self.client.collection("Matches")
+
+    @property
+    def users(self):
+        return self.client.collection("Users")
+
+    @property
+    def user_stats(self):
+        return self.client.collection("UserStats")
+
+    @property
+    def usernames(self):
+        return self.client.collection("Usernames")
+
+    @property
+    def user_friends(self):
+        return self.client.collection("UserFriends")
+
+    @property
+    def user_invites(self):
+        return self.client.collection("UserInvites")
+
+    @property
+    def feeds(self):
+        return self.client.collection("Feeds")
+
+    @property
+    def activity(self):
+        return self.client.collection("Activity")
+
+    def batch(self):
+        return self.client.batch()
+
+    def get_all(self, references, field_paths=None):
+        return self.client.get_all(references, field_paths=field_paths)
+
+    def write_option(self, **kwargs):
+        return self.client.write_option(**kwargs)
+
+    async def run_transaction(self, fn: Callable[[Any], Awaitable[Any]], max_attempts: int = 5) -> Any:
+        raise NotImplementedError
+
+    def listener_client(self):
+        """Cliente cuyos documentos implementan on_snapshot."""
+        raise NotImplementedError
+
+
+class FirestoreRepository(Repository):
+    _listener_client = None
+
+    async def run_transaction(self, fn, max_attempts: int = 5):
+        from google.cloud.firestore_v1.async_transaction import async_transactional
+
+        @async_transactional
+        async def run(transaction):
+            return await fn(transaction)
+
+        return await run(self.client.transaction(max_attempts=max_attempts))
+
+    def listener_client(self):
+        # on_snapshot solo existe en el cliente síncrono; se crea al abrir el primer listener
+        if self._listener_client is None:
+            from google.cloud import firestore
+            self._listener_client = firestore.Client()
+        return self._listener_client
+
+
+class MemoryRepository(Repository):
+    async def run_transaction(self, fn, max_attempts: int = 5):
+        for attempt in range(max_attempts):
+            transaction = self.client.transaction()
+            result = await fn(transaction)
+            try:
+                await transaction.commit()
+                return result
+            except Aborted:
+                if attempt == max_attempts - 1:
+                    raise
+
+    def listener_client(self):
+        return self.client
+
+
+_repository: Optional[Repository] = None
+
+
+def create_repository() -> Repository:
+    """STORAGE_BACKEND=memory usa MemoryClient (latencia simulada con MEMORY_LATENCY_MS)."""
+    if os.getenv("STORAGE_BACKEND", "firestore") == "memory":
+        from app.memory_store import MemoryClient
+        return MemoryRepository(InstrumentedClient(MemoryClient(
+            latency=float(os.getenv("MEMORY_LATENCY_MS", "0")) / 1000,
+            jitter=float(os.getenv("MEMORY_JITTER_MS", "0")) / 1000,
+        )))
+    from app.firestore import get_db
+    return FirestoreRepository(InstrumentedClient(get_db()))
+
+
+def get_repository() -> Repository:
+    """Dependencia de FastAPI. Se puede sobreescribir con app.dependency_overrides."""
+    global _repository
+    if _repository is None:
+        _repository = create_repository()
+    return _repository
+
+
+def set_repository(repository: Optional[Repository]):
+    global _repository
+    _repository = repository
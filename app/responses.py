@@ -0,0 +1,120 @@
+# app/responses.py
+import hashlib
+import json
+import re
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, Iterable, List, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional: sin él se usa json de la librería estándar
+    orjson = None
+
+FIELD_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$")
+FIELDS_MAX = 30
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _default(value: Any):
+    # Los timestamps de Firestore son subclases de datetime que orjson no serializa directamente
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse serializada con orjson. Devolverla directamente desde una ruta evita además
+    el paso por jsonable_encoder de FastAPI, que en listas grandes es la mayor parte del costo.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def parse_fields(fields: Optional[str], required: Iterable[str] = ("id",)) -> Optional[List[str]]:
+    """
+    Convierte `fields=a,b,c.d` en la lista de campos para select()/get(field_paths=...).
+    Siempre incluye `required` (id y los campos del cursor). None significa el documento completo.
+    """
+    if not fields:
+        return None
+    paths = [field.strip() for field in fields.split(",") if field.strip()]
+    if len(paths) > FIELDS_MAX:
+        raise HTTPException(status_code=400, detail=f"Máximo {FIELDS_MAX} campos")
+    for path in paths:
+        if not FIELD_RE.match(path):
+            raise HTTPException(status_code=400, detail=f"Campo inválido: {path}")
+    return list(dict.fromkeys([*required, *paths]))
+
+
+def project(data: dict, field_paths: Optional[List[str]]) -> dict:
+    """La misma proyección que select(), aplicada a un documento ya leído (p. ej. de la caché)."""
+    if field_paths is None:
+        return data
+    projected = {}
+    for path in field_paths:
+        parts = path.split(".")
+        value = data
+        for part in parts:
+            if not isinstance(value, dict) or part not in value:
+                break
+            value = value[part]
+        else:
+            target = projected
+            for part in parts[:-1]:
+                target = target.setdefault(part, {})
+            target[parts[-1]] = value
+    return projected
+
+
+def _micros(update_time: datetime) -> int:
+    return (update_time - EPOCH) // timedelta(microseconds=1)
+
+
+def etag(update_time: datetime, *variant: Any) -> str:
+    """
+    ETag de un documento a partir de su update_time; `variant` distingue representaciones del
+    mismo documento (p. ej. los campos de `fields=`). Es débil porque la compresión cambia los bytes.
+    """
+    raw = ":".join([str(_micros(update_time)), *map(str, variant)])
+    return 'W/"%s"' % hashlib.blake2b(raw.encode(), digest_size=8).hexdigest()
+
+
+def page_etag(docs: Iterable, *variant: Any) -> str:
+    """ETag de una página: id y update_time de cada documento, sin serializar el cuerpo."""
+    digest = hashlib.blake2b(digest_size=8)
+    for doc in docs:
+        digest.update(f"{doc.id}:{_micros(doc.update_time)};".encode())
+    digest.update(":".join(map(str, variant)).encode())
+    return 'W/"%s"' % digest.hexdigest()
+
+
+def not_modified(if_none_match: Optional[str], tag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = tag[2:] if tag.startswith("W/") else tag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if (candidate[2:] if candidate.startswith("W/") else candidate) == opaque:
+            return True
+    return False
+
+
+def conditional(if_none_match: Optional[str], tag: str, render: Callable[[], Any], headers: Optional[dict] = None) -> Response:
+    """304 si el cliente ya tiene esta versión; si no, el cuerpo de `render()` con su ETag."""
+    headers = {**(headers or {}), "ETag": tag}
+    if not_modified(if_none_match, tag):
+        return Response(status_code=304, headers=headers)
+    return FastJSONResponse(render(), headers=headers)
@@ -0,0 +1,193 @@
+# app/results.py
+import asyncio
+import os
+from typing import Optional
+
+from fastapi import HTTPException
+from google.api_core.exceptions import Aborted, AlreadyExists, FailedPrecondition
+from google.cloud.firestore_v1 import SERVER_TIMESTAMP
+
+from app import metrics
+from app import ranking
+from app import recommendations
+from app import roster
+from app import social
+from app.cache import cache, match_key, stats_key
+from app.logger import log_debug, log_info
+from app.repository import Repository
+
+MAX_ATTEMPTS = int(os.getenv("RESULTS_MAX_ATTEMPTS", "5"))
+RETRY_SECONDS = 1.0
+
+applied_total = metrics.counter("match_results_applied_total", "Resultados aplicados a UserStats")
+failed_total = metrics.counter("match_results_failed_total", "Intentos fallidos de aplicar un resultado")
+queue_depth = metrics.gauge("match_results_queue_depth", "Resultados pendientes en la cola del proceso")
+
+
+def marker(repo: Repository, match_id: str):
+    # El documento de MatchResults es a la vez la cola durable y la marca de idempotencia
+    return repo.collection("MatchResults").document(match_id)
+
+
+def stage(repo: Repository, batch, doc, data: dict, score: Optional[dict] = None):
+    """
+    Agrega a `batch` las dos escrituras que completan un reto: el update del reto (con
+    precondición de update_time) y la creación de MatchResults/{match_id}, que falla si el
+    resultado ya se había registrado.
+    """
+    players = [{"user_id": p["user_id"], "team": p.get("team", "home")} for p in roster.players_list(data)]
+    match_update = {"status": "completed"}
+    if score is not None:
+        match_update["score"] = score
+
+    batch.update(doc.reference, match_update, option=repo.write_option(last_update_time=doc.update_time))
+    batch.create(marker(repo, doc.id), {
+        "match_id": doc.id,
+        "players": players,
+        "score": score if score is not None else data.get("score"),
+        "state": "pending",
+        "created_at": SERVER_TIMESTAMP,
+    })
+
+
+async def record(repo: Repository, doc, data: dict, score: Optional[dict] = None) -> dict:
+    """
+    Completa el reto y encola sus resultados. Si el marcador ya existe no se vuelve a contar, pero
+    el reto igual queda completado (pudo reabrirse después de completarse). Un reto completado sin
+    marcador (por /status o el scheduler) todavía puede recibir uno.
+    """
+    marker_ref = marker(repo, doc.id)
+    batch = repo.batch()
+    stage(repo, batch, doc, data, score)
+    try:
+        await batch.commit()
+    except (AlreadyExists, FailedPrecondition, Aborted):
+        # Otro request pudo registrar el mismo resultado en paralelo: es un reintento, no un conflicto
+        existing = await marker_ref.get()
+        if not existing.exists:
+            raise HTTPException(status_code=409, detail="El reto fue modificado, intenta de nuevo")
+        if score is not None and existing.get("score") is None and await _add_score(repo, doc.reference, marker_ref, score):
+            await cache.invalidate(match_key(doc.id))
+            recommendations.index.discard(doc.id)
+            pipeline.enqueue(repo, doc.id)
+            return {"state": "pending", "duplicate": False}
+        if score is not None and existing.get("score") != score:
+            raise HTTPException(status_code=409, detail="El reto ya tiene un resultado registrado")
+        if data.get("status") != "completed":
+            await doc.reference.update({"status": "completed"})
+            await cache.invalidate(match_key(doc.id))
+            recommendations.index.discard(doc.id)
+        return {"state": existing.get("state"), "duplicate": True}
+
+    await cache.invalidate(match_key(doc.id))
+    recommendations.index.discard(doc.id)
+    pipeline.enqueue(repo, doc.id)
+    return {"state": "pending", "duplicate": False}
+
+
+async def _add_score(repo: Repository, match_ref, marker_ref, score: dict) -> bool:
+    """
+    Agrega el marcador a un resultado registrado sin él y lo vuelve a dejar pendiente: apply()
+    suma entonces solo victorias/derrotas/empates. False si otro request ya puso un marcador.
+    """
+
+    async def run(transaction):
+        snapshot = await marker_ref.get(transaction=transaction)
+        if snapshot.get("score") is not None:
+            return False
+        transaction.update(marker_ref, {"score": score, "state": "pending"})
+        transaction.update(match_ref, {"status": "completed", "score": score})
+        return True
+
+    return await repo.run_transaction(run)
+
+
+async def apply(repo: Repository, match_id: str) -> bool:
+    """Aplica los Increment de un resultado pendiente. Devuelve False si ya estaba aplicado."""
+    marker_ref = marker(repo, match_id)
+    current = await marker_ref.get()
+    if not current.exists or current.get("state") == "applied":
+        return False
+    data = current.to_dict()
+
+    async def run(transaction):
+        # Releer el marcador dentro de la transacción es lo que hace al pipeline idempotente
+        snapshot = await marker_ref.get(transaction=transaction)
+        if not snapshot.exists or snapshot.get("state") == "applied":
+            return None
+        row = snapshot.to_dict()
+        # Las filas también se leen en la transacción: si alguna cambia antes del commit se reintenta,
+        # así lo que apply_locally refleja en el engine es exactamente lo que quedó escrito
+        stats = await ranking.stats_by_user_id(repo, [p["user_id"] for p in row["players"]], transaction=transaction)
+        # Ya aplicado antes sin marcador (ver _add_score): matches_played ya se contó
+        first = row.get("applied_at") is None
+        updates = ranking.result_updates(row, stats, count_played=first)
+        for username, fields in updates.items():
+            transaction.update(repo.user_stats.document(username), fields)
+        transaction.update(marker_ref, {"state": "applied", "applied_at": SERVER_TIMESTAMP})
+        return stats, updates, first
+
+    applied = await repo.run_transaction(run)
+    if applied is None:
+        return False
+    stats, updates, first = applied
+    ranking.apply_locally(stats, updates)
+    if first:
+        social.graph.add_match(match_id, [p["user_id"] for p in data["players"]])
+    for username in updates:
+        await cache.invalidate(stats_key(username))
+    applied_total.inc()
+    return True
+
+
+class ResultsPipeline:
+    """Cola en proceso de resultados por aplicar; lo pendiente sobrevive en MatchResults."""
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def enqueue(self, repo: Repository, match_id: str, attempt: int = 0):
+        if self._queue is None:
+            # Sin worker (scripts, tests): se aplica en segundo plano igual
+            asyncio.get_running_loop().create_task(self._process(repo, match_id, attempt))
+            return
+        self._queue.put_nowait((repo, match_id, attempt))
+        queue_depth.set(self._queue.qsize())
+
+    async def _process(self, repo: Repository, match_id: str, attempt: int):
+        try:
+            applied = await apply(repo, match_id)
+            log_debug("match_result", match_id=match_id, applied=applied)
+        except Exception as e:
+            failed_total.inc()
+            log_info("match_result_error", match_id=match_id, attempt=attempt, error=str(e))
+            if attempt + 1 < MAX_ATTEMPTS:
+                await asyncio.sleep(RETRY_SECONDS * (2 ** attempt))
+                self.enqueue(repo, match_id, attempt + 1)
+
+    async def _run(self):
+        while True:
+            repo, match_id, attempt = await self._queue.get()
+            queue_depth.set(self._queue.qsize())
+            await self._process(repo, match_id, attempt)
+
+    async def start(self, repo: Repository):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+        # Resultados que quedaron sin aplicar (caída del proceso, errores agotados)
+        async for doc in _pending(repo):
+            self.enqueue(repo, doc.id)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._queue = None
+
+
+def _pending(repo: Repository):
+    return repo.collection("MatchResults").where("state", "==", "pending").stream()
+
+
+pipeline = ResultsPipeline()
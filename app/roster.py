@@ -0,0 +1,298 @@
+# app/roster.py
+import asyncio
+import copy
+import os
+import random
+from datetime import date, datetime, time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from zoneinfo import ZoneInfo
+
+from fastapi import HTTPException
+from google.api_core.exceptions import Aborted, FailedPrecondition
+from google.cloud.firestore_v1 import DELETE_FIELD
+from google.cloud.firestore_v1.field_path import FieldPath
+
+from app import metrics
+from app.cache import Versioned, cache, match_key
+from app.repository import Repository
+from app.utils import player_ids
+
+MAX_ATTEMPTS = 5
+BACKOFF_SECONDS = 0.02
+
+LIMITE_POR_MODO = {
+    "5vs5": 10,
+    "6vs6": 12,
+    "7vs7": 14,
+}
+
+# Zona horaria en la que se interpretan los campos date/time de los retos
+MATCH_TIMEZONE = ZoneInfo(os.getenv("MATCH_TIMEZONE", "UTC"))
+
+retries = metrics.counter("roster_mutation_retries_total", "Reintentos por conflicto al modificar la plantilla de un reto")
+conflicts = metrics.counter("roster_mutation_conflicts_total", "Mutaciones que agotaron los reintentos")
+queue_depth = metrics.gauge("roster_coalescer_queue_depth", "Mutaciones de plantilla esperando escritura")
+commits = metrics.counter("roster_coalescer_commits_total", "Escrituras de plantilla (cada una junta una o más mutaciones)")
+# _sum / _count es la tasa de mezcla: mutaciones por escritura
+mutations_per_commit = metrics.histogram(
+    "roster_coalescer_mutations_per_commit", "Mutaciones aplicadas en cada escritura", buckets=metrics.COUNT_BUCKETS,
+)
+
+
+def limite_total(datos: dict) -> int:
+    return LIMITE_POR_MODO.get(datos.get("mode", "5vs5"), 10)  # fallback a 10
+
+
+def count_confirmed(players: Iterable[dict]) -> int:
+    return sum(1 for p in players if p.get("confirmed"))
+
+
+POSICIONES = ("arquero", "defensa", "mediocampista", "delantero")
+
+
+def position_counts(players: Iterable[dict]) -> Dict[str, int]:
+    """Jugadores confirmados por posición (las posiciones fuera de POSICIONES no cuentan)."""
+    counts = dict.fromkeys(POSICIONES, 0)
+    for p in players:
+        if p.get("confirmed") and p.get("position") in counts:
+            counts[p["position"]] += 1
+    return counts
+
+
+# La plantilla se guarda como mapa user_id -> jugador ("players.<uid>.team" se actualiza solo), con
+# `seq` para conservar el orden de llegada. La API sigue exponiendo la lista de siempre.
+
+def players_map(players: List[dict]) -> Dict[str, dict]:
+    return {p["user_id"]: {**p, "seq": i} for i, p in enumerate(players)}
+
+
+def players_list(datos: dict) -> List[dict]:
+    """Plantilla como lista en orden de llegada; acepta también documentos sin migrar."""
+    players = datos.get("players") or {}
+    if isinstance(players, list):
+        return players
+    ordered = sorted(players.values(), key=lambda p: (p.get("seq", 0), p["user_id"]))
+    return [{k: v for k, v in p.items() if k != "seq"} for p in ordered]
+
+
+def roster(datos: dict) -> Dict[str, dict]:
+    """El mapa de jugadores de `datos` para modificarlo en sitio (convierte la lista si hace falta)."""
+    players = datos.get("players")
+    if not isinstance(players, dict):
+        players = datos["players"] = players_map(players or [])
+    return players
+
+
+def add_player(players: Dict[str, dict], player: dict):
+    seq = max((p.get("seq", 0) for p in players.values()), default=-1) + 1
+    players[player["user_id"]] = {**player, "seq": seq}
+
+
+def to_api(datos: Optional[dict]) -> Optional[dict]:
+    """Compatibilidad: el reto con `players` como lista, el formato que esperan los clientes."""
+    if datos is None or not isinstance(datos.get("players"), dict):
+        return datos
+    return {**datos, "players": players_list(datos)}
+
+
+def starts_at(datos: dict) -> Optional[datetime]:
+    """Inicio del reto a partir de date (ISO, solo se usa el día) y time (HH:MM)."""
+    try:
+        day = date.fromisoformat((datos.get("date") or "")[:10])
+        hora = time.fromisoformat(datos.get("time") or "00:00")
+    except ValueError:
+        return None
+    return datetime.combine(day, hora, tzinfo=MATCH_TIMEZONE)
+
+
+def localize(value: datetime) -> datetime:
+    """Las fechas sin zona horaria se interpretan en MATCH_TIMEZONE."""
+    return value if value.tzinfo else value.replace(tzinfo=MATCH_TIMEZONE)
+
+
+def summary(datos: dict) -> dict:
+    """
+    Campos denormalizados que cada mutación mantiene al día para poder buscar retos con
+    consultas indexadas (ver firestore.indexes.json) en lugar de recorrer la plantilla.
+    """
+    players = players_list(datos)
+    confirmed = count_confirmed(players)
+    team_counts = {"home": 0, "away": 0}
+    for p in players:
+        team = p.get("team", "home")
+        team_counts[team] = team_counts.get(team, 0) + 1
+    return {
+        "player_ids": player_ids(players),
+        "confirmed_count": confirmed,
+        "open_slots": max(limite_total(datos) - confirmed, 0),
+        "team_counts": team_counts,
+        "starts_at": starts_at(datos),
+    }
+
+
+def summary_changes(datos: dict) -> dict:
+    """Campos de summary() cuyo valor difiere del guardado en datos."""
+    return {k: v for k, v in summary(datos).items() if datos.get(k) != v}
+
+
+def _path(*parts: str) -> str:
+    # FieldPath escapa los user_id que no son identificadores simples
+    return FieldPath("players", *parts).to_api_repr()
+
+
+def _player_updates(before: Any, after: Any) -> dict:
+    """Field paths de los jugadores que cambiaron, en lugar de reescribir toda la plantilla."""
+    if not isinstance(before, dict):
+        # Documento sin migrar: se guarda el mapa completo una sola vez
+        if players_list({"players": before}) == players_list({"players": after}):
+            return {}
+        return {"players": after}
+    after = after or {}
+    updates = {}
+    for uid, entry in after.items():
+        old = before.get(uid)
+        if old is None:
+            updates[_path(uid)] = entry
+            continue
+        for field, value in entry.items():
+            if old.get(field) != value:
+                updates[_path(uid, field)] = value
+        for field in old.keys() - entry.keys():
+            updates[_path(uid, field)] = DELETE_FIELD
+    for uid in before.keys() - after.keys():
+        updates[_path(uid)] = DELETE_FIELD
+    return updates
+
+
+def _updates(before: dict, datos: dict) -> dict:
+    """Escrituras para pasar de `before` a `datos`; también deja en `datos` los campos de summary()."""
+    updates = _player_updates(before["players"], datos.get("players"))
+    if datos.get("status") != before["status"]:
+        updates["status"] = datos.get("status")
+    if updates:
+        changes = summary_changes(datos)
+        datos.update(changes)
+        updates.update(changes)
+    return updates
+
+
+def _apply_all(datos: dict, pending: List[tuple]) -> List[tuple]:
+    """
+    Aplica las mutaciones en orden sobre `datos`. Una que falla (p. ej. HTTPException de
+    validación) se deshace y no afecta a las demás. Devuelve (ok, resultado o excepción) por cada una.
+    """
+    outcomes = []
+    for mutation, _ in pending:
+        saved = (copy.deepcopy(datos["players"]), datos.get("status"))
+        try:
+            outcomes.append((True, mutation(datos)))
+        except Exception as e:
+            datos["players"], datos["status"] = saved
+            outcomes.append((False, e))
+    return outcomes
+
+
+def _resolve(pending: List[tuple], outcomes: List[tuple]):
+    for (_, future), (ok, value) in zip(pending, outcomes):
+        if future.done():  # el cliente se desconectó
+            continue
+        if ok:
+            future.set_result(value)
+        else:
+            future.set_exception(value)
+
+
+class RosterCoalescer:
+    """
+    Junta las mutaciones de plantilla de un mismo reto en una sola escritura.
+
+    Firestore limita las escrituras sostenidas a ~1 por segundo por documento, y al llenarse un
+    reto llegan ráfagas de join/confirm/change_team. Cada reto con mutaciones pendientes tiene un
+    worker: la primera se escribe enseguida; las que llegan mientras tanto se acumulan y se
+    escriben juntas, con al menos `interval` segundos entre escrituras del mismo reto (por defecto
+    1 s, el límite de Firestore). Los reintentos por contención también esperan `interval`.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._queues: Dict[str, List[tuple]] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+
+    async def submit(self, repo: Repository, match_id: str, mutation: Callable[[dict], Any]) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(match_id, []).append((mutation, future))
+        queue_depth.inc()
+        if match_id not in self._workers:
+            self._workers[match_id] = asyncio.create_task(self._drain(repo, match_id))
+        return await future
+
+    async def _drain(self, repo: Repository, match_id: str):
+        try:
+            while True:
+                # Un ciclo del loop para juntar los requests que llegaron a la vez
+                await asyncio.sleep(0)
+                pending = self._queues.pop(match_id, [])
+                if not pending:
+                    return
+                queue_depth.dec(len(pending))
+                try:
+                    await self._commit(repo, match_id, pending)
+                except Exception as e:
+                    _resolve(pending, [(False, e)] * len(pending))
+                await asyncio.sleep(self.interval)
+        finally:
+            self._workers.pop(match_id, None)
+
+    async def _commit(self, repo: Repository, match_id: str, pending: List[tuple]):
+        """
+        Lee el reto, aplica todas las mutaciones y guarda el resultado en una sola escritura con
+        el update_time leído como precondición; si otro proceso escribió entremedio se vuelve a
+        leer y a aplicar todo en lugar de pisar sus cambios.
+        """
+        doc_ref = repo.matches.document(match_id)
+        for attempt in range(MAX_ATTEMPTS):
+            doc = await doc_ref.get()
+            if not doc.exists:
+                error = HTTPException(status_code=404, detail="Reto no encontrado")
+                return _resolve(pending, [(False, error)] * len(pending))
+
+            datos = doc.to_dict()
+            before = {"players": copy.deepcopy(datos.get("players", [])), "status": datos.get("status")}
+            roster(datos)
+            outcomes = _apply_all(datos, pending)
+            updates = _updates(before, datos)
+            if updates:
+                try:
+                    written = await doc_ref.update(updates, option=repo.write_option(last_update_time=doc.update_time))
+                except (FailedPrecondition, Aborted):
+                    retries.inc()
+                    # Otro proceso escribió el reto: reintentar enseguida solo sumaría escrituras
+                    await asyncio.sleep(max(self.interval, BACKOFF_SECONDS * (2 ** attempt)) * random.uniform(0.5, 1.5))
+                    continue
+                # datos ya refleja el documento escrito: se reutiliza en lugar de invalidar
+                await cache.set(match_key(match_id), Versioned(datos, written.update_time))
+                # Import local: recommendations usa este módulo
+                from app import recommendations
+                recommendations.index.upsert(match_id, datos)
+                commits.inc()
+                mutations_per_commit.observe(sum(1 for ok, _ in outcomes if ok))
+            return _resolve(pending, outcomes)
+
+        conflicts.inc(len(pending))
+        error = HTTPException(status_code=409, detail="El reto está siendo modificado, intenta de nuevo")
+        _resolve(pending, [(False, error)] * len(pending))
+
+
+coalescer = RosterCoalescer(interval=float(os.getenv("ROSTER_COALESCE_MS", "1000")) / 1000)
+
+
+async def mutate_match(repo: Repository, match_id: str, mutation: Callable[[dict], Any]) -> Any:
+    """
+    Aplica `mutation` sobre el documento del reto, junto con las demás mutaciones pendientes del
+    mismo reto (ver RosterCoalescer).
+
+    `mutation` recibe el dict del reto, con la plantilla como mapa (ver roster()), lo modifica en
+    sitio y devuelve la respuesta de la ruta; solo se escriben los jugadores que cambiaron. Puede
+    lanzar HTTPException para rechazar el cambio: esa excepción le llega solo a este request.
+    """
+    return await coalescer.submit(repo, match_id, mutation)
@@ -1,15 +1,18 @@
 
 # backend/routes/auth.py
-from fastapi import APIRouter, Request, HTTPException
-from firebase_admin import auth
-from app.firestore import db
+from fastapi import APIRouter, Depends, Request, HTTPException
+from app.firebase_admin import verify_token_async
+from app.logger import log_debug
+from app.profiles import profiles, public, remember
+from app.repository import Repository, get_repository
 from app.models import UserStats
+from google.api_core.exceptions import AlreadyExists
 from google.cloud.firestore_v1 import SERVER_TIMESTAMP
 
-router = APIRouter()
+router = APIRouter(prefix="/auth")
 
 @router.post("/login")
-async def login_con_token(request: Request):
+async def login_con_token(request: Request, repo: Repository = Depends(get_repository)):
     body = await request.json()
     id_token = body.get("idToken")
     
@@ -18,41 +21,41 @@ async def login_con_token(request: Request):
         raise HTTPException(status_code=400, detail="idToken es requerido")
 
     try:
-        decoded_token = auth.verify_id_token(id_token)
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Token inválido: {str(e)}")
+        decoded_token = await verify_token_async(id_token)
+    except ValueError as e:
+        raise HTTPException(status_code=401, detail=str(e))
     uid = decoded_token["uid"]
     email = decoded_token.get("email")
     name = decoded_token.get("name")
     picture = decoded_token.get("picture")
 
     try:
-        # Referencia al documento del usuario
-        user_ref = db.collection("Users").document(uid)
-        user_doc = await user_ref.get()
-
-        if not user_doc.exists:
-            user_dict = {
-                "id": uid,
-                "email": email,
-                "name": name,
-                "username": None,
-                "photo_url": picture,
-                "created_at": SERVER_TIMESTAMP,
-            }
-            await user_ref.set(user_dict)
-            print(f"🆕 Usuario {email} autenticado")
-        else:
-            print(f"✅ Usuario {email} ya existe")
-        user_dict = user_doc.to_dict()
-        print(f"{user_dict=}")
-        return {
-            "id": user_dict.get("id") or uid,
-            "email": user_dict["email"],
-            "name": user_dict["name"],
-            "username": user_dict.get("username"),
-            "photo_url": user_dict["photo_url"] 
+        # Sesiones seguidas del mismo usuario no vuelven a Firestore
+        profile = await profiles.peek(uid)
+        if profile is not None:
+            log_debug("login", uid=uid, email=email, nuevo=False, cache=True)
+            return public(profile, uid)
+
+        # Un solo round trip para usuarios nuevos: create() falla si ya existe y solo entonces se lee
+        user_ref = repo.users.document(uid)
+        user_dict = {
+            "id": uid,
+            "email": email,
+            "name": name,
+            "username": None,
+            "photo_url": picture,
         }
+        try:
+            await user_ref.create({**user_dict, "created_at": SERVER_TIMESTAMP})
+            profile = user_dict
+            log_debug("login", uid=uid, email=email, nuevo=True)
+        except AlreadyExists:
+            user_doc = await user_ref.get()
+            # Lo guardado manda; el token completa campos que falten (usuarios antiguos)
+            profile = {**user_dict, **{k: v for k, v in (user_doc.to_dict() or {}).items() if v is not None}}
+            log_debug("login", uid=uid, email=email, nuevo=False)
+        await remember(uid, profile)
+        return public(profile, uid)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error sincronizando usuario: {str(e)}")
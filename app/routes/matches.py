@@ -1,16 +1,31 @@
-from fastapi import APIRouter, HTTPException, Body
-from app.firestore import db
+from fastapi import APIRouter, HTTPException, Body, Depends, Header, Query, Response
+from fastapi.responses import StreamingResponse
+from google.api_core.exceptions import Aborted, AlreadyExists, FailedPrecondition, NotFound
+from app import feed
+from app import live
+from app import recommendations
+from app import results
+from app import roster
+from app.cache import Versioned, cache, match_key
+from app.logger import log_debug
 from app.models import Match
 from app.models import Player
+from app.repository import Repository, get_repository
+from app.responses import conditional, dumps, etag, page_etag, parse_fields, project
+from app.utils import decode_cursor, encode_cursor
+import asyncio
+import json
 import uuid
-from pydantic import BaseModel
+from datetime import datetime, timedelta
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional, Set
 
 
 
-router = APIRouter()
+router = APIRouter(prefix="/matches")
 
 @router.post("/")
-async def create_match(match: Match):
+async def create_match(match: Match, repo: Repository = Depends(get_repository)):
     match_id = str(uuid.uuid4())
     match.id = match_id
     
@@ -21,242 +36,539 @@ async def create_match(match: Match):
         team="home",
         confirmed=True
     ))
-    await db.collection("Matches").document(match_id).set(match.model_dump())
-    
+    match_dict = match.model_dump()
+    match_dict.update(roster.summary(match_dict))
+    match_dict["players"] = roster.players_map(match_dict["players"])
+    written = await repo.matches.document(match_id).set(match_dict)
+    await cache.set(match_key(match_id), Versioned(match_dict, written.update_time))
+    recommendations.index.upsert(match_id, match_dict)
+    feed.worker.publish(repo, "match_created", match.creator_id, match.creator_name, match_id)
+
     return {"message": "Reto creado", "id": match_id}
 
+LIST_PAGE_SIZE = 50
+LIST_PAGE_MAX = 200
+
+
+def _list_query(repo: Repository, status, mode, date_from, date_to, cursor):
+    query = repo.matches
+    if status:
+        query = query.where("status", "==", status)
+    if mode:
+        query = query.where("mode", "==", mode)
+    if date_from:
+        query = query.where("date", ">=", date_from)
+    if date_to:
+        query = query.where("date", "<=", date_to)
+    query = query.order_by("date").order_by("id")
+    if cursor:
+        try:
+            date, match_id = decode_cursor(cursor, 2)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = query.start_after({"date": date, "id": match_id})
+    return query
+
+
+async def _ndjson(query):
+    async for doc in query.stream():
+        yield dumps(roster.to_api(doc.to_dict())) + b"\n"
+
+
 @router.get("/")
-async def list_matches():
-    matches = db.collection("Matches").stream()
-    return [doc.to_dict() async for doc in matches]
+async def list_matches(
+    limit: Optional[int] = Query(None, ge=1, le=LIST_PAGE_MAX),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    mode: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    fields: Optional[str] = Query(None, description="Campos a devolver, separados por coma"),
+    if_none_match: Optional[str] = Header(None),
+    repo: Repository = Depends(get_repository),
+):
+    query = _list_query(repo, status, mode, date_from, date_to, cursor)
+    field_paths = parse_fields(fields, required=("id", "date"))
+    if field_paths:
+        query = query.select(field_paths)
+    if format == "ndjson":
+        # Exportación: sin límite por defecto, los documentos se emiten a medida que llegan
+        if limit:
+            query = query.limit(limit)
+        return StreamingResponse(_ndjson(query), media_type="application/x-ndjson")
+
+    limit = limit or LIST_PAGE_SIZE
+    docs = [doc async for doc in query.limit(limit).stream()]
+    headers = {}
+    if len(docs) == limit:
+        headers["X-Next-Cursor"] = encode_cursor(docs[-1].get("date"), docs[-1].get("id"))
+    tag = page_etag(docs, fields)
+    return conditional(if_none_match, tag, lambda: [roster.to_api(doc.to_dict()) for doc in docs], headers)
+
+SEARCH_PAGE_SIZE = 20
+
+
+@router.get("/search")
+async def search_matches(
+    response: Response,
+    date: Optional[str] = Query(None, description="Día (YYYY-MM-DD)"),
+    starts_from: Optional[datetime] = None,
+    starts_to: Optional[datetime] = None,
+    mode: Optional[str] = None,
+    min_slots: int = Query(1, ge=0),
+    status: str = "open",
+    limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=LIST_PAGE_MAX),
+    cursor: Optional[str] = None,
+    repo: Repository = Depends(get_repository),
+):
+    """Retos por día/rango de inicio, modo y cupos libres, usando los campos de roster.summary()."""
+    starts_from = roster.localize(starts_from) if starts_from else None
+    starts_to = roster.localize(starts_to) if starts_to else None
+    if date:
+        day_start = roster.starts_at({"date": date})
+        if day_start is None:
+            raise HTTPException(status_code=400, detail="Fecha inválida")
+        starts_from = max(starts_from, day_start) if starts_from else day_start
+        day_end = day_start + timedelta(days=1)
+        starts_to = min(starts_to, day_end) if starts_to else day_end
+
+    query = repo.matches.where("status", "==", status)
+    if mode:
+        query = query.where("mode", "==", mode)
+    if starts_from:
+        query = query.where("starts_at", ">=", starts_from)
+    if starts_to:
+        query = query.where("starts_at", "<", starts_to)
+    if min_slots:
+        query = query.where("open_slots", ">=", min_slots)
+    query = query.order_by("starts_at").order_by("id")
+    if cursor:
+        try:
+            cursor_starts_at, cursor_id = decode_cursor(cursor, 2)
+            cursor_starts_at = datetime.fromisoformat(cursor_starts_at)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Cursor inválido")
+        query = query.start_after({"starts_at": cursor_starts_at, "id": cursor_id})
+
+    matches = [roster.to_api(doc.to_dict()) async for doc in query.limit(limit).stream()]
+    if len(matches) == limit:
+        last = matches[-1]
+        # Los retos que el backfill todavía no alcanzó no tienen starts_at: se calcula como el scheduler
+        last_starts_at = last.get("starts_at") or roster.starts_at(last)
+        if last_starts_at is not None:
+            response.headers["X-Next-Cursor"] = encode_cursor(last_starts_at.isoformat(), last["id"])
+    return matches
+
+BATCH_MAX_WRITES = 500  # límite de operaciones por commit de Firestore
+BATCH_MAX_ITEMS = 500  # por request, para que un solo request no dispare trabajo sin límite
+
+class BatchGetRequest(BaseModel):
+    ids: List[str] = Field(..., max_length=BATCH_MAX_ITEMS)
+
+@router.post("/batch_get")
+async def batch_get_matches(data: BatchGetRequest, repo: Repository = Depends(get_repository)):
+    ids = list(dict.fromkeys(data.ids))
+    refs = [repo.matches.document(match_id) for match_id in ids]
+    found = {}
+    async for doc in repo.get_all(refs):
+        if doc.exists:
+            found[doc.id] = doc.to_dict()
+            await cache.set(match_key(doc.id), Versioned(found[doc.id], doc.update_time))
+    return {
+        "matches": [roster.to_api(found[match_id]) for match_id in ids if match_id in found],
+        "missing": [match_id for match_id in ids if match_id not in found],
+    }
+
+class BatchOperation(BaseModel):
+    match_id: str
+    action: Literal["status", "delete"]
+    status: Optional[str] = None
+
+class BatchMutationRequest(BaseModel):
+    user_id: str
+    operations: List[BatchOperation] = Field(..., max_length=BATCH_MAX_ITEMS)
+
+# Errores de un reto que cambió entre la lectura y el commit (o cuyo marcador creó otro request)
+RACE_ERRORS = (AlreadyExists, FailedPrecondition, NotFound, Aborted)
+
+
+def _stage_operation(repo: Repository, batch, op: BatchOperation, doc, staged: bool):
+    # Con el update_time leído como precondición: la validación se hizo sobre esa versión
+    option = repo.write_option(last_update_time=doc.update_time)
+    if op.action == "delete":
+        batch.delete(doc.reference, option=option)
+    elif staged:
+        results.stage(repo, batch, doc, doc.to_dict())
+    else:
+        batch.update(doc.reference, {"status": op.status}, option=option)
+
+
+async def _commit_chunk(repo: Repository, chunk: list) -> Set[int]:
+    """
+    Escribe el chunk en un batch. Si falla porque algún reto cambió, reintenta de a una operación
+    para que la que perdió la carrera no arrastre a las demás. Devuelve los índices escritos.
+    """
+    batch = repo.batch()
+    for _, op, doc, staged in chunk:
+        _stage_operation(repo, batch, op, doc, staged)
+    try:
+        await batch.commit()
+        return {i for i, _, _, _ in chunk}
+    except RACE_ERRORS:
+        pass
+    done = set()
+    for i, op, doc, staged in chunk:
+        batch = repo.batch()
+        _stage_operation(repo, batch, op, doc, staged)
+        try:
+            await batch.commit()
+        except RACE_ERRORS:
+            continue
+        done.add(i)
+    return done
+
+@router.post("/batch")
+async def batch_mutate_matches(data: BatchMutationRequest, repo: Repository = Depends(get_repository)):
+    """Cambia el estado o elimina varios retos del mismo creador y reporta el resultado de cada uno."""
+    ids = list(dict.fromkeys(op.match_id for op in data.operations))
+    docs = {}
+    async for doc in repo.get_all([repo.matches.document(match_id) for match_id in ids]):
+        docs[doc.id] = doc
+    # Completar crea el marcador de MatchResults, salvo que ya exista (reto reabierto)
+    completing = [op.match_id for op in data.operations if op.action == "status" and op.status == "completed"]
+    markers = set()
+    if completing:
+        async for marker in repo.get_all([results.marker(repo, match_id) for match_id in dict.fromkeys(completing)]):
+            if marker.exists:
+                markers.add(marker.id)
+
+    outcomes = [None] * len(data.operations)
+    chunks = [[]]
+    writes = 0
+    seen = set()
+    for i, op in enumerate(data.operations):
+        doc = docs.get(op.match_id)
+        try:
+            if op.match_id in seen:
+                raise HTTPException(status_code=400, detail="Operación duplicada para el reto")
+            seen.add(op.match_id)
+            if doc is None or not doc.exists:
+                raise HTTPException(status_code=404, detail="Reto no encontrado")
+            if op.action == "status":
+                _validate_status_change(doc.to_dict(), data.user_id, op.status)
+            elif doc.get("creator_id") != data.user_id:
+                raise HTTPException(status_code=403, detail="Solo el creador puede eliminar el reto")
+        except HTTPException as e:
+            outcomes[i] = {"match_id": op.match_id, "ok": False, "status_code": e.status_code, "detail": e.detail}
+            continue
+        staged = (
+            op.action == "status" and op.status == "completed"
+            and doc.get("status") != "completed" and op.match_id not in markers
+        )
+        cost = 2 if staged else 1  # results.stage escribe el reto y el marcador
+        if writes + cost > BATCH_MAX_WRITES:
+            chunks.append([])
+            writes = 0
+        chunks[-1].append((i, op, doc, staged))
+        writes += cost
+
+    for chunk in chunks:
+        if not chunk:
+            continue
+        committed = await _commit_chunk(repo, chunk)
+        for i, op, _, staged in chunk:
+            if i not in committed:
+                outcomes[i] = {"match_id": op.match_id, "ok": False, "status_code": 409, "detail": "El reto fue modificado, intenta de nuevo"}
+                continue
+            if staged:
+                results.pipeline.enqueue(repo, op.match_id)
+            await cache.invalidate(match_key(op.match_id))
+            if op.action == "delete":
+                recommendations.index.discard(op.match_id)
+            else:
+                match = docs[op.match_id].to_dict()
+                recommendations.index.upsert(op.match_id, {**match, "status": op.status})
+                feed.worker.publish(repo, "match_status", data.user_id, match.get("creator_name", ""), op.match_id, op.status)
+            outcomes[i] = {"match_id": op.match_id, "ok": True, "status_code": 200}
+
+    return {"results": outcomes}
 
 @router.get("/{match_id}")
-async def get_match(match_id: str):
-    doc = await db.collection("Matches").document(match_id).get()
-    if doc.exists:
-        return doc.to_dict()
+async def get_match(
+    match_id: str,
+    fields: Optional[str] = Query(None, description="Campos a devolver, separados por coma"),
+    if_none_match: Optional[str] = Header(None),
+    repo: Repository = Depends(get_repository),
+):
+    # El ETag sale del update_time guardado junto al reto en caché: el 304 no serializa nada
+    field_paths = parse_fields(fields)
+    if field_paths:
+        # Con el reto completo en caché se proyecta ahí; si no, se leen solo esos campos
+        match = await cache.peek(match_key(match_id))
+        if match is not None:
+            tag = etag(match.update_time, field_paths)
+            return conditional(if_none_match, tag, lambda: roster.to_api(project(match.data, field_paths)))
+        doc = await repo.matches.document(match_id).get(field_paths=field_paths)
+        if doc.exists:
+            return conditional(if_none_match, etag(doc.update_time, field_paths), lambda: roster.to_api(doc.to_dict()))
+        raise HTTPException(status_code=404, detail="Reto no encontrado")
+
+    async def load():
+        doc = await repo.matches.document(match_id).get()
+        return Versioned(doc.to_dict(), doc.update_time) if doc.exists else None
+
+    match = await cache.get_or_load(match_key(match_id), load)
+    if match is not None:
+        return conditional(if_none_match, etag(match.update_time), lambda: roster.to_api(match.data))
     raise HTTPException(status_code=404, detail="Reto no encontrado")
 
 
+LIVE_KEEPALIVE_SECONDS = 15
+
+
+@router.get("/{match_id}/live")
+async def live_match(match_id: str, repo: Repository = Depends(get_repository)):
+    """Server-Sent Events con los cambios de plantilla y estado del reto."""
+    try:
+        subscriber = await live.hub.subscribe(repo, match_id)
+    except live.TooManyListeners:
+        raise HTTPException(status_code=503, detail="Demasiados retos en vivo, intenta más tarde")
+
+    async def events():
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), timeout=LIVE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+                if event["type"] == "deleted":
+                    return
+        finally:
+            await live.hub.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.put("/{match_id}")
-async def update_match(match_id: str, data: dict = Body(...)):
-    ref = db.collection("Matches").document(match_id)
+async def update_match(match_id: str, data: dict = Body(...), repo: Repository = Depends(get_repository)):
+    ref = repo.matches.document(match_id)
     doc = await ref.get()
     if doc.exists:
+        current = doc.to_dict()
+        if isinstance(data.get("players"), list):
+            data["players"] = roster.players_map(data["players"])
+        merged = {**current, **data}
+        data.update({k: v for k, v in roster.summary(merged).items() if current.get(k) != v})
         await ref.update(data)
+        await cache.invalidate(match_key(match_id))
+        recommendations.index.upsert(match_id, {**current, **data})
         return {"message": "Reto actualizado"}
     raise HTTPException(status_code=404, detail="Reto no encontrado")
 
 @router.delete("/{match_id}")
-async def delete_match(match_id: str):
-    ref = db.collection("Matches").document(match_id)
+async def delete_match(match_id: str, repo: Repository = Depends(get_repository)):
+    ref = repo.matches.document(match_id)
     doc = await ref.get()
     if doc.exists:
         await ref.delete()
+        await cache.invalidate(match_key(match_id))
+        recommendations.index.discard(match_id)
         return {"message": "Reto eliminado"}
     raise HTTPException(status_code=404, detail="Reto no encontrado")
 
 @router.post("/{match_id}/join")
-async def join_match(match_id: str, player: Player):
-    doc_ref = db.collection("Matches").document(match_id)
-    doc = await doc_ref.get()
-    if not doc.exists:
-        raise HTTPException(status_code=404, detail="Reto no encontrado")
-
-    datos = doc.to_dict()
-    players = datos.get("players", [])
-    if any(j["user_id"] == player.user_id for j in players):
-        raise HTTPException(status_code=400, detail="Jugador ya unido")
-    modo = datos.get("mode", "5vs5")
-    limite_por_modo = {
-        "5vs5": 10,
-        "6vs6": 12,
-        "7vs7": 14,
-    }
-    limite_total = limite_por_modo.get(modo, 10)  # fallback a 10
-    current_confirmed_players = 0
-    for p in players:
-        if p.get("confirmed"):
-            current_confirmed_players += 1
-
-    if current_confirmed_players >= limite_total:
-        raise HTTPException(status_code=400, detail=f"El reto ya tiene {limite_total} jugadores confirmados")
-    # player.confirmed=True
-    players.append(player.model_dump())
-
-    await doc_ref.update({"players": players})
-    all_confirmed = len(players) == limite_total and all(p.get("confirmed") for p in players)
-    if all_confirmed:
-        await doc_ref.update({"status": "confirmed"})
-    # players.append(player.model_dump())
-    # await doc_ref.update({"players": players})
-    return {"message": "Jugador unido"}
+async def join_match(match_id: str, player: Player, repo: Repository = Depends(get_repository)):
+    def apply(datos: dict):
+        players = roster.roster(datos)
+        if player.user_id in players:
+            raise HTTPException(status_code=400, detail="Jugador ya unido")
+        limite = roster.limite_total(datos)
+        if roster.count_confirmed(players.values()) >= limite:
+            raise HTTPException(status_code=400, detail=f"El reto ya tiene {limite} jugadores confirmados")
+        # player.confirmed=True
+        roster.add_player(players, player.model_dump())
+
+        all_confirmed = len(players) == limite and all(p.get("confirmed") for p in players.values())
+        if all_confirmed:
+            datos["status"] = "confirmed"
+        return {"message": "Jugador unido"}
+
+    result = await roster.mutate_match(repo, match_id, apply)
+    feed.worker.publish(repo, "match_joined", player.user_id, player.name, match_id)
+    return result
 
 class QuitMatchRequest(BaseModel):
     user_id: str
 # class ConfirmMatchRequest(BaseModel):
 #     player: Player
 @router.post("/{match_id}/quit")
-async def quit_match(match_id: str, data: QuitMatchRequest):
+async def quit_match(match_id: str, data: QuitMatchRequest, repo: Repository = Depends(get_repository)):
     user_id = data.user_id
-    doc_ref = db.collection("Matches").document(match_id)
-    doc = await doc_ref.get()
-    if not doc.exists:
-        raise HTTPException(status_code=404, detail="Reto no encontrado")
 
-    data = doc.to_dict()
-    players = [j for j in data.get("players", []) if j["user_id"] != user_id]
-    await doc_ref.update({"players": players})
-    return {"message": "Jugador removido"}
+    def apply(datos: dict):
+        roster.roster(datos).pop(user_id, None)
+        return {"message": "Jugador removido"}
+
+    return await roster.mutate_match(repo, match_id, apply)
 
 @router.post("/{match_id}/confirm")
-async def confirm_player(match_id: str, player:Player):
-    user_id = player.user_id
-    doc_ref = db.collection("Matches").document(match_id)
-    doc = await doc_ref.get()
-    if not doc.exists:
-        raise HTTPException(status_code=404, detail="Reto no encontrado")
+async def confirm_player(match_id: str, player:Player, repo: Repository = Depends(get_repository)):
+    def apply(datos: dict):
+        players = roster.roster(datos)
 
-    datos = doc.to_dict()
-    players = datos.get("players", [])
+        posicion_confirmadas = roster.position_counts(players.values())
+        current_confirmed_players = roster.count_confirmed(players.values())
+        if player.position == "arquero" and posicion_confirmadas["arquero"] >= 1:
+            raise HTTPException(status_code=400, detail="Ya hay un arquero confirmado")
+        # Obtener el límite total permitido según el modo
+        limite = roster.limite_total(datos)
 
-    posicion_confirmadas = {
-        "arquero": 0,
-        "defensa": 0,
-        "mediocampista": 0,
-        "delantero": 0
-    }
-    current_confirmed_players = 0
-    for p in players:
-        if p.get("confirmed"):
-            current_confirmed_players += 1
-            pos = p.get("position", "")
-            if pos in posicion_confirmadas:
-                posicion_confirmadas[pos] += 1
-    if player.position == "arquero" and posicion_confirmadas["arquero"] >= 1:
-        raise HTTPException(status_code=400, detail="Ya hay un arquero confirmado")
-    # Obtener el límite total permitido según el modo
-    modo = datos.get("mode", "5vs5")
-    limite_por_modo = {
-        "5vs5": 10,
-        "6vs6": 12,
-        "7vs7": 14,
-    }
-    limite_total = limite_por_modo.get(modo, 10)  # fallback a 10
+        if current_confirmed_players >= limite:
+            raise HTTPException(status_code=400, detail=f"El reto ya tiene {limite} jugadores confirmados")
+        # player.confirmed=True
+        if player.user_id in players:
+            players[player.user_id].update(player.model_dump())
+        else:
+            roster.add_player(players, player.model_dump())
 
+        all_confirmed = len(players) == limite and all(p.get("confirmed") for p in players.values())
+        if all_confirmed:
+            datos["status"] = "confirmed"
+        return {"message": "Jugador confirmado"}
 
-    if current_confirmed_players >= limite_total:
-        raise HTTPException(status_code=400, detail=f"El reto ya tiene {limite_total} jugadores confirmados")
-    # player.confirmed=True
-    players.append(player.model_dump())
+    return await roster.mutate_match(repo, match_id, apply)
 
-    await doc_ref.update({"players": players})
-    all_confirmed = len(players) == limite_total and all(p.get("confirmed") for p in players)
-    if all_confirmed:
-        await doc_ref.update({"status": "confirmed"})
-    
-    return {"message": "Jugador confirmado"}
+ALLOWED_STATUS = ["open", "confirmed", "completed", "cancelled"]
+
+
+def _validate_status_change(data: dict, user_id: str, status: str):
+    if status not in ALLOWED_STATUS:
+        raise HTTPException(status_code=400, detail="Estado no permitido")
+
+    if data["creator_id"] != user_id:
+        raise HTTPException(status_code=403, detail="Solo el creador puede cambiar el estado")
 
 @router.post("/{match_id}/status")
 async def update_match_status(
     match_id: str,
     user_id: str = Body(...),
-    status: str = Body(...)
+    status: str = Body(...),
+    repo: Repository = Depends(get_repository),
 ):
-    doc_ref = db.collection("Matches").document(match_id)
+    doc_ref = repo.matches.document(match_id)
     doc = await doc_ref.get()
     if not doc.exists:
         raise HTTPException(status_code=404, detail="Reto no encontrado")
 
     data = doc.to_dict()
-    allowed_status = ["open", "confirmed", "completed", "cancelled"]
-
-    if status not in allowed_status:
-        raise HTTPException(status_code=400, detail="Estado no permitido")
-
-    if data["creator_id"] != user_id:
-        raise HTTPException(status_code=403, detail="Solo el creador puede cambiar el estado")
+    _validate_status_change(data, user_id, status)
+
+    queued = {}
+    if status == "completed" and data.get("status") != "completed":
+        # Completar encola el resultado (sin marcador solo suma matches_played)
+        queued = await results.record(repo, doc, data)
+    else:
+        await doc_ref.update({"status": status})
+    await cache.invalidate(match_key(match_id))
+    recommendations.index.upsert(match_id, {**data, "status": status})
+    feed.worker.publish(repo, "match_status", user_id, data.get("creator_name", ""), match_id, status)
+    return {"message": f"Estado cambiado a '{status}'", **queued}
+
+class MatchResultRequest(BaseModel):
+    user_id: str
+    home_score: int = Field(..., ge=0)
+    away_score: int = Field(..., ge=0)
+
+@router.post("/{match_id}/result", status_code=202)
+async def record_match_result(match_id: str, data: MatchResultRequest, repo: Repository = Depends(get_repository)):
+    """
+    Registra el marcador y completa el reto. Responde 202 cuando el resultado quedó guardado en
+    MatchResults; las estadísticas de los jugadores se actualizan en segundo plano. Reenviar el
+    mismo marcador no vuelve a contar el reto.
+    """
+    doc = await repo.matches.document(match_id).get()
+    if not doc.exists:
+        raise HTTPException(status_code=404, detail="Reto no encontrado")
 
-    await doc_ref.update({"status": status})
-    return {"message": f"Estado cambiado a '{status}'"}
+    datos = doc.to_dict()
+    _validate_status_change(datos, data.user_id, "completed")
+    queued = await results.record(repo, doc, datos, {"home": data.home_score, "away": data.away_score})
+    return {"message": "Resultado registrado", "match_id": match_id, **queued}
 
 
 @router.post("/{match_id}/change_position")
-async def change_position(match_id: str, data: dict = Body(...)):
+async def change_position(match_id: str, data: dict = Body(...), repo: Repository = Depends(get_repository)):
     user_id = data.get("user_id")
     nueva_posicion = data.get("position")
-    print(f"{user_id=}")
-    print(f"{nueva_posicion=}")
-    doc_ref = db.collection("Matches").document(match_id)
-    doc = await doc_ref.get()
-    if not doc.exists:
-        raise HTTPException(status_code=404, detail="Reto no encontrado")
 
-    datos = doc.to_dict()
-    players = datos.get("players", [])
-
-    # Validar si el usuario está
-    jugador = next((p for p in players if p["user_id"] == user_id), None)
-    print(f"{jugador=}")
-    if not jugador:
-        raise HTTPException(status_code=404, detail="Jugador no encontrado")
-
-    jugador["position"] = nueva_posicion
-    print(f"{jugador=}")
-    print(f"{players=}")
-    await doc_ref.update({"players": players})
-    return {"message": "Posición actualizada"}
+    def apply(datos: dict):
+        # Validar si el usuario está
+        jugador = roster.roster(datos).get(user_id)
+        log_debug("change_position", match_id=match_id, jugador=jugador, position=nueva_posicion)
+        if not jugador:
+            raise HTTPException(status_code=404, detail="Jugador no encontrado")
+
+        jugador["position"] = nueva_posicion
+        return {"message": "Posición actualizada"}
+
+    return await roster.mutate_match(repo, match_id, apply)
 class ChangeTeamRequest(BaseModel):
     user_id: str
     team: str
 
 @router.post("/{match_id}/change_team")
-async def change_team(match_id: str, data:ChangeTeamRequest):
+async def change_team(match_id: str, data:ChangeTeamRequest, repo: Repository = Depends(get_repository)):
     user_id = data.user_id
     new_team = data.team
-    
-    doc_ref = db.collection("Matches").document(match_id)
-    doc = await doc_ref.get()
-    
-    if not doc.exists:
-        raise HTTPException(status_code=404, detail="Reto no encontrado")
 
-    datos = doc.to_dict()
-    players = datos.get("players", [])
-    
-    # Find the player
-    jugador = next((p for p in players if p["user_id"] == user_id), None)
-    if not jugador:
-        raise HTTPException(status_code=404, detail="Jugador no encontrado")
-
-    team_counts = {"home": 0, "away": 0}
-    for player in players:
-        # if player["team"] in team_counts:
-        team_counts[player["team"]] += 1
-
-    players_limit = int(datos["mode"][0])
-    if team_counts[new_team] >= players_limit:
-        return {"message": "Equipo lleno"}
-    # If player is already in that team → no update needed
-    if jugador["team"] == new_team:
-        return {"message": "Ya estás en este equipo"}
-    
-    jugador["team"] = new_team
-    await doc_ref.update({"players": players})
-    return {"message": "Posición actualizada"}
+    def apply(datos: dict):
+        players = roster.roster(datos)
+
+        # Find the player
+        jugador = players.get(user_id)
+        if not jugador:
+            raise HTTPException(status_code=404, detail="Jugador no encontrado")
+
+        team_counts = {"home": 0, "away": 0}
+        for player in players.values():
+            # if player["team"] in team_counts:
+            team_counts[player["team"]] += 1
+
+        players_limit = int(datos["mode"][0])
+        if team_counts[new_team] >= players_limit:
+            return {"message": "Equipo lleno"}
+        # If player is already in that team → no update needed
+        if jugador["team"] == new_team:
+            return {"message": "Ya estás en este equipo"}
+
+        jugador["team"] = new_team
+        return {"message": "Posición actualizada"}
+
+    return await roster.mutate_match(repo, match_id, apply)
 
 @router.post("/{match_id}/start")
-async def start_match(match_id: str):
-    doc_ref = db.collection("Matches").document(match_id)
+async def start_match(match_id: str, repo: Repository = Depends(get_repository)):
+    doc_ref = repo.matches.document(match_id)
     doc = await doc_ref.get()
     if not doc.exists:
         raise HTTPException(status_code=404, detail="Reto no encontrado")
-    players = doc.to_dict().get("players", [])
+    data = doc.to_dict()
+    players = roster.players_list(data)
     is_all_confirmed = (players and all(player.get("confirmed", False) for player in players))
     if not is_all_confirmed:
         raise HTTPException(status_code=400, detail="No todos los jugadores están confirmados")
     
     await doc_ref.update({"status": "started"})
+    await cache.invalidate(match_key(match_id))
+    recommendations.index.discard(match_id)
+    feed.worker.publish(repo, "match_status", data["creator_id"], data.get("creator_name", ""), match_id, "started")
     return {"message": "Comenzó el reto"}
 
     
\ No newline at end of file
@@ -1,41 +1,141 @@
-from fastapi import APIRouter, Header, HTTPException, Depends
-from app.firebase_admin import verify_token
+import asyncio
+
+from fastapi import APIRouter, Header, HTTPException, Depends, Query
+from app.firebase_admin import verify_token_async
 from pydantic import BaseModel
 from typing import Optional
 from typing import List
-
-from app.firestore import db
+from datetime import datetime
+
+from app import feed
+from app import ranking
+from app import recommendations
+from app import roster
+from app import social
+from app.cache import Versioned, cache, match_key, stats_key
+from app.logger import log_debug
+from app.profiles import forget, get_profile
+from app.repository import Repository, get_repository
+from app.responses import FastJSONResponse, conditional, etag, parse_fields
+from app.usernames import index as usernames
 from app.models import UserStats
 from app.models import UserFriend
 from app.models import UserInvite
+from app.utils import decode_cursor, encode_cursor
+from google.api_core.exceptions import AlreadyExists, NotFound
 from google.cloud.firestore_v1 import SERVER_TIMESTAMP
 
 
-router = APIRouter()
+router = APIRouter(prefix="/users")
+
+
+MATCHES_PAGE_SIZE = 20
+MATCHES_PAGE_MAX = 100
+
+
+async def _matches_page(query, limit: int, cursor: Optional[str], field_paths: Optional[List[str]] = None):
+    if field_paths:
+        query = query.select(field_paths)
+    query = query.order_by("date", direction="DESCENDING").order_by("id", direction="DESCENDING")
+    if cursor:
+        try:
+            date, match_id = decode_cursor(cursor, 2)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = query.start_after({"date": date, "id": match_id})
+    matches = [roster.to_api(doc.to_dict()) async for doc in query.limit(limit).stream()]
+    next_cursor = None
+    if len(matches) == limit:
+        next_cursor = encode_cursor(matches[-1]["date"], matches[-1]["id"])
+    return matches, next_cursor
 
 
 @router.get("/{user_id}/matches")
-async def get_matches_by_user(user_id: str):
-    matches_docs = db.collection("Matches").stream()
-    matches = [match_doc.to_dict() async for match_doc in matches_docs]
-    created = [r for r in matches if r["creator_id"] == user_id]
-    match_players = {match["id"]:match.get("players",[]) for match in matches}
-    participating = [match for match in matches if user_id in [player["user_id"] for player in match_players[match["id"]]]]
-    return {"created": created, "participating": participating}
+async def get_matches_by_user(
+    user_id: str,
+    limit: int = Query(MATCHES_PAGE_SIZE, ge=1, le=MATCHES_PAGE_MAX),
+    created_cursor: Optional[str] = None,
+    participating_cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Campos a devolver, separados por coma"),
+    repo: Repository = Depends(get_repository),
+):
+    # Ambas consultas usan índices compuestos (ver firestore.indexes.json)
+    matches_ref = repo.matches
+    field_paths = parse_fields(fields, required=("id", "date"))
+    (created, created_next), (participating, participating_next) = await asyncio.gather(
+        _matches_page(matches_ref.where("creator_id", "==", user_id), limit, created_cursor, field_paths),
+        _matches_page(matches_ref.where("player_ids", "array_contains", user_id), limit, participating_cursor, field_paths),
+    )
+    return FastJSONResponse({
+        "created": created,
+        "participating": participating,
+        "created_cursor": created_next,
+        "participating_cursor": participating_next,
+    })
 
 
-def get_current_user(authorization: str = Header(...)):
+async def get_current_user(authorization: str = Header(...)):
     """Extrae y verifica el token Firebase del header Authorization"""
     if not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Token no proporcionado correctamente")
     
     token = authorization.split(" ")[1]
     try:
-        user = verify_token(token)
+        user = await verify_token_async(token)
         return user  # puedes devolver user["uid"], user["email"], etc.
     except ValueError as e:
         raise HTTPException(status_code=401, detail=str(e))
 
+RECOMMENDED_PAGE_MAX = 100
+
+
+async def _pref_position(repo: Repository, user_id: str) -> Optional[str]:
+    username = await usernames.username_for(repo, user_id)
+    stats = await _user_stats(repo, username) if username else None
+    return stats.data.get("pref_position") if stats else None
+
+
+@router.get("/{user_id}/recommended_matches")
+async def get_recommended_matches(
+    user_id: str,
+    limit: int = Query(20, ge=1, le=RECOMMENDED_PAGE_MAX),
+    mode: Optional[str] = None,
+    repo: Repository = Depends(get_repository),
+):
+    """
+    Retos abiertos recomendados: cupo en la posición preferida, amigos ya anotados y cercanía
+    del inicio. Se puntúan en memoria (ver app.recommendations); solo se leen los retos devueltos.
+    """
+    friends_query = repo.user_friends.where("user_id", "==", user_id).select(["friend_id"])
+    pref_position, friends = await asyncio.gather(_pref_position(repo, user_id), friends_query.get())
+    ranked = recommendations.index.recommend(
+        user_id, [doc.get("friend_id") for doc in friends], pref_position, mode, limit,
+    )
+
+    found = {}
+    missing = []
+    for item in ranked:
+        match = await cache.peek(match_key(item.match_id))
+        if match is not None:
+            found[item.match_id] = match.data
+        else:
+            missing.append(repo.matches.document(item.match_id))
+    if missing:
+        async for doc in repo.get_all(missing):
+            if doc.exists:
+                found[doc.id] = doc.to_dict()
+                await cache.set(match_key(doc.id), Versioned(found[doc.id], doc.update_time))
+
+    matches = []
+    for item in ranked:
+        match = found.get(item.match_id)
+        if match is None or match.get("status") != "open":
+            # El índice estaba desactualizado (escritura de otro proceso): se corrige de paso
+            recommendations.index.upsert(item.match_id, match or {})
+            continue
+        matches.append({**roster.to_api(match), "recommendation": {"score": item.score, "friends": item.friends, "position_available": item.position_available}})
+    return FastJSONResponse({"pref_position": pref_position, "matches": matches})
+
 @router.get("/protected")
 def ruta_protegida(user_data: dict = Depends(get_current_user)):
     return {
@@ -44,21 +144,44 @@ def ruta_protegida(user_data: dict = Depends(get_current_user)):
         "email": user_data.get("email", "no-email"),
     }
 
+LEADERBOARD_PAGE_MAX = 100
+
+
+@router.get("/leaderboard")
+async def get_leaderboard(
+    limit: int = Query(20, ge=1, le=LEADERBOARD_PAGE_MAX),
+    offset: int = Query(0, ge=0),
+):
+    return {"total": len(ranking.engine), "users": ranking.engine.page(offset, limit)}
+
+@router.get("/{username}/rank")
+async def get_user_rank(username: str):
+    entry = ranking.engine.entry(username)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    return entry
+
+async def _user_stats(repo: Repository, username: str) -> Optional[Versioned]:
+    async def load():
+        doc = await repo.user_stats.document(username).get()
+        return Versioned(doc.to_dict(), doc.update_time) if doc.exists else None
+
+    return await cache.get_or_load(stats_key(username), load)
+
 @router.get("/{username}/stats")
-async def get_user_stats(username:str):
-    doc_ref = db.collection("UserStats").document(username)
-    doc = await doc_ref.get()
-    if not doc.exists:
+async def get_user_stats(username:str, if_none_match: Optional[str] = Header(None), repo: Repository = Depends(get_repository)):
+    stats = await _user_stats(repo, username)
+    if stats is None:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
 
-    return doc.to_dict()
+    return conditional(if_none_match, etag(stats.update_time), lambda: stats.data)
 
 class UpdateUserStats(BaseModel):
     pref_position: Optional[str] = ""
     photo_url: Optional[str] = ""
 
 @router.post("/{username}/stats")
-async def update_user_stats(username:str,data:UpdateUserStats):
+async def update_user_stats(username:str,data:UpdateUserStats, repo: Repository = Depends(get_repository)):
     update_data = {}
     if data.pref_position:
         update_data["pref_position"] = data.pref_position
@@ -67,11 +190,13 @@ async def update_user_stats(username:str,data:UpdateUserStats):
     if not update_data:
         return {"successfull": True}
         
-    doc_ref = db.collection("UserStats").document(username)
+    doc_ref = repo.user_stats.document(username)
     doc = await doc_ref.get()
     if not doc.exists:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     await doc_ref.update(update_data)
+    await cache.invalidate(stats_key(username))
+    ranking.engine.update_profile(username, update_data)
 
     return {"successfull": True}
 
@@ -84,8 +209,8 @@ class FriendsResponseDTO(BaseModel):
     friends: List[FriendResponseDTO]
 
 @router.get("/{user_id}/friends")
-async def get_user_friends(user_id:str):
-    matches_docs = db.collection("UserFriends").where("user_id","==",user_id).stream()
+async def get_user_friends(user_id:str, repo: Repository = Depends(get_repository)):
+    matches_docs = repo.user_friends.where("user_id","==",user_id).stream()
     friends = [match_doc.to_dict() async for match_doc in matches_docs]
     friends_list:List[FriendResponseDTO] = [
         FriendResponseDTO.model_construct(
@@ -108,24 +233,28 @@ class InviteFriendRequest(BaseModel):
     username: str
 
 @router.post("/{user_id}/invites")
-async def invite_friend(user_id:str, data:InviteFriendRequest):
-    user_friends_docs = (
-        db.collection("UserFriends")
+async def invite_friend(user_id:str, data:InviteFriendRequest, repo: Repository = Depends(get_repository)):
+    user_friends_query = (
+        repo.user_friends
         .where("user_id","==",user_id)
         .where("username","==",data.username)
         .limit(1)
-        .stream()
     )
-    results = [doc async for doc in user_friends_docs]  
+    # Las tres lecturas son independientes
+    results, username, invited_uid = await asyncio.gather(
+        user_friends_query.get(),
+        usernames.username_for(repo, user_id),
+        usernames.uid_for(repo, data.username),
+    )
     if results:
         raise HTTPException(status_code=409, detail="Amigo ya existe")
-    user_doc_ref = db.collection("Users").document(user_id)
-    user_doc = await user_doc_ref.get()
-    user_friend_doc_ref = db.collection("UserInvites").document()
+    if username is None or invited_uid is None:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    user_friend_doc_ref = repo.user_invites.document()
     await user_friend_doc_ref.set(
         UserInvite.model_construct(
             user_id=user_id,
-            username=user_doc["username"],
+            username=username,
             invite_username=data.username,
             status="pending",
             created_at=SERVER_TIMESTAMP,
@@ -136,31 +265,36 @@ async def invite_friend(user_id:str, data:InviteFriendRequest):
     return {"successfull": True}
 
 @router.post("/{user_id}/invites/{invite_id}")
-async def accept_invite(user_id:str, invite_id:str, data:AcceptInviteRequest):
-    invite_doc_ref = db.collection("UserInvites").document(invite_id)
-    invite_doc = await invite_doc_ref.get()
+async def accept_invite(user_id:str, invite_id:str, data:AcceptInviteRequest, repo: Repository = Depends(get_repository)):
+    invite_doc_ref = repo.user_invites.document(invite_id)
+    invite_doc, user_stat_doc = await asyncio.gather(
+        invite_doc_ref.get(),
+        repo.user_stats.document(data.username).get(field_paths=["user_id", "username", "photo_url"]),
+    )
     if not invite_doc.exists:
         raise HTTPException(status_code=404, detail="Invitacion no encontrada")
-    user_stat_doc_ref = db.collection("UserStats").document(data.username)
-    user_stat_doc = await user_stat_doc_ref.get()
     if not user_stat_doc.exists:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
-        
-    # Create UserFriend
-    user_friend_doc_ref = db.collection("UserFriends").document()
-    await user_friend_doc_ref.set(
+    friend = user_stat_doc.to_dict()
+    usernames.remember(data.username, friend["user_id"])
+
+    # UserFriend y el estado de la invitación en un mismo batch
+    batch = repo.batch()
+    batch.set(
+        repo.user_friends.document(),
         UserFriend.model_construct(
             user_id=user_id,
-            friend_id=user_stat_doc["user_id"],
-            username=user_stat_doc["username"],
-            photo_url=user_stat_doc["photo_url"],
+            friend_id=friend["user_id"],
+            username=friend.get("username", data.username),
+            photo_url=friend.get("photo_url", ""),
         ).model_dump()
     )
-    # Update UserInvite
-    await invite_doc_ref.update({
+    batch.update(invite_doc_ref, {
         "status": "accepted",
         "updated_at": SERVER_TIMESTAMP
     })
+    await batch.commit()
+    social.graph.add_friend(user_id, friend["user_id"], friend.get("username", data.username), friend.get("photo_url", ""))
 
 
     return {"successfull": True}
@@ -169,18 +303,86 @@ class DeleteFriendRequest(BaseModel):
     username: str
 
 @router.delete("/{user_id}/friends")
-async def remove_friend(user_id:str, data:DeleteFriendRequest):
+async def remove_friend(user_id:str, data:DeleteFriendRequest, repo: Repository = Depends(get_repository)):
     user_friends_docs = (
-        db.collection("UserFriends")    
+        repo.user_friends    
         .where("user_id","==",user_id)
         .where("username","==",data.username)
         .stream())
     
     async for doc in user_friends_docs:
         await doc.reference.delete()
+        social.graph.remove_friend(user_id, doc.get("friend_id"))
 
     return {"successfull": True}
 
+SUGGESTIONS_PAGE_MAX = 50
+
+
+@router.get("/{user_id}/suggestions")
+async def get_friend_suggestions(
+    user_id: str,
+    limit: int = Query(20, ge=1, le=SUGGESTIONS_PAGE_MAX),
+    repo: Repository = Depends(get_repository),
+):
+    """
+    Personas que quizás conozcas: amigos de amigos y compañeros de partidos completados, por
+    amigos en común y partidos jugados juntos. Sale del grafo en memoria (ver app.social).
+    """
+    suggestions = social.graph.suggest(user_id, limit)
+    # Los compañeros de partido que nadie tiene de amigo no tienen username en el grafo
+    unknown = [s.user_id for s in suggestions if social.graph.profile(s.user_id) is None]
+    loaded = dict(zip(unknown, await asyncio.gather(*[get_profile(repo, uid) for uid in unknown])))
+
+    items = []
+    for suggestion in suggestions:
+        known = social.graph.profile(suggestion.user_id)
+        if known is None:
+            profile = loaded.get(suggestion.user_id)
+            if not profile or not profile.get("username"):
+                continue
+            known = (profile["username"], profile.get("photo_url") or "")
+        items.append({
+            "user_id": suggestion.user_id,
+            "username": known[0],
+            "photo_url": known[1],
+            "mutual_friends": suggestion.mutual_friends,
+            "matches_together": suggestion.matches_together,
+            "score": suggestion.score,
+        })
+    return FastJSONResponse({"suggestions": items})
+
+FEED_PAGE_SIZE = 20
+FEED_PAGE_MAX = 100
+
+
+@router.get("/{user_id}/feed")
+async def get_user_feed(
+    user_id: str,
+    limit: int = Query(FEED_PAGE_SIZE, ge=1, le=FEED_PAGE_MAX),
+    cursor: Optional[str] = None,
+    repo: Repository = Depends(get_repository),
+):
+    """Actividad reciente de los amigos (retos creados, uniones, cambios de estado), del más nuevo al más viejo."""
+    after = None
+    if cursor:
+        try:
+            created_at, event_id = decode_cursor(cursor, 2)
+            after = (datetime.fromisoformat(created_at), event_id)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Cursor inválido")
+    events = await feed.page(repo, user_id, limit, after)
+    next_cursor = None
+    if len(events) == limit:
+        next_cursor = encode_cursor(events[-1]["created_at"].isoformat(), events[-1]["id"])
+    return FastJSONResponse({
+        "events": [
+            {**{k: v for k, v in event.items() if k != "expires_at"}, "created_at": event["created_at"].isoformat()}
+            for event in events
+        ],
+        "cursor": next_cursor,
+    })
+
 class UserInviteResponseDTO(BaseModel):
     id: str
     username: str
@@ -191,11 +393,12 @@ class UserInvitesResponseDTO(BaseModel):
     invites: List[UserInviteResponseDTO]
 
 @router.get("/{user_id}/invites")
-async def get_user_invites(user_id:str):
-    use_doc_ref = db.collection("Users").document(user_id)
-    user_doc = await use_doc_ref.get()
-    
-    matches_docs = db.collection("UserInvites").where("invite_username","==",user_doc["username"]).where("status","==","pending").stream()
+async def get_user_invites(user_id:str, repo: Repository = Depends(get_repository)):
+    username = await usernames.username_for(repo, user_id)
+    if username is None:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+
+    matches_docs = repo.user_invites.where("invite_username","==",username).where("status","==","pending").stream()
     # invites = [match_doc.to_dict() ]
     invites_list:List[UserInviteResponseDTO] = []
     async for match_doc in matches_docs:
@@ -220,21 +423,34 @@ class InitUserStatsRequest(BaseModel):
 
 
 @router.post("/initstats")
-async def init_user_stats(data:InitUserStatsRequest):
-    user_stats_doc_ref = db.collection("UserStats").document(data.username)
-    user_stats_doc = await user_stats_doc_ref.get()
-    print(f"{user_stats_doc=}")
-    if user_stats_doc.exists:
-        raise HTTPException(status_code=409, detail=f"Username '{data.username}' ya existe")
+async def init_user_stats(data:InitUserStatsRequest, repo: Repository = Depends(get_repository)):
     user_stats = UserStats.model_construct(
         user_id=data.user_id,
         username=data.username,
         photo_url=data.photo_url
     )
-    
-    await user_stats_doc_ref.set(user_stats.model_dump())
-    user_ref = db.collection("Users").document(data.user_id)
-    await user_ref.update({
+
+    # Índice, estadísticas y username del usuario en un solo batch: los create() fallan si el
+    # username ya está tomado, así que no hace falta leer antes
+    batch = repo.batch()
+    batch.create(repo.usernames.document(data.username), {
+        "user_id": data.user_id,
+        "created_at": SERVER_TIMESTAMP,
+    })
+    batch.create(repo.user_stats.document(data.username), user_stats.model_dump())
+    batch.update(repo.users.document(data.user_id), {
         "username": data.username
     })
-    return user_stats_doc.to_dict()
\ No newline at end of file
+    try:
+        await batch.commit()
+    except AlreadyExists:
+        raise HTTPException(status_code=409, detail=f"Username '{data.username}' ya existe")
+    except NotFound:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    log_debug("init_user_stats", username=data.username, user_id=data.user_id)
+
+    await cache.invalidate(stats_key(data.username))
+    ranking.engine.upsert(user_stats.model_dump())
+    usernames.remember(data.username, data.user_id)
+    await forget(data.user_id)
+    return user_stats.model_dump()
\ No newline at end of file
@@ -0,0 +1,227 @@
+# app/scheduler.py
+import asyncio
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Set
+
+from google.api_core.exceptions import Aborted, AlreadyExists, FailedPrecondition, NotFound
+from google.cloud.firestore_v1 import SERVER_TIMESTAMP
+
+from app import metrics
+from app import recommendations
+from app import results
+from app import roster
+from app.cache import cache, match_key
+from app.logger import log_debug, log_info
+from app.repository import Repository
+
+INTERVAL_SECONDS = float(os.getenv("SCHEDULER_INTERVAL_SECONDS", "300"))
+LEASE_SECONDS = float(os.getenv("SCHEDULER_LEASE_SECONDS", str(INTERVAL_SECONDS * 2)))
+# Margen después del inicio para dar un reto por vencido (además de su duración)
+EXPIRE_AFTER = timedelta(hours=float(os.getenv("MATCH_EXPIRE_AFTER_HOURS", "6")))
+ARCHIVE_AFTER = timedelta(days=float(os.getenv("MATCH_ARCHIVE_AFTER_DAYS", "30")))
+PAGE_SIZE = 200  # cada reto son hasta 2 escrituras y un batch admite 500
+
+# Estado al que pasa un reto vencido según su estado actual
+EXPIRED_STATUS = {"open": "cancelled", "confirmed": "completed", "started": "completed"}
+FINISHED_STATUS = ["completed", "cancelled"]
+
+expired_total = metrics.counter("scheduler_matches_expired_total", "Retos vencidos cerrados", ("status",))
+archived_total = metrics.counter("scheduler_matches_archived_total", "Retos movidos a MatchesArchive")
+leader = metrics.gauge("scheduler_leader", "1 si este proceso tiene el lease del scheduler")
+
+
+class Lease:
+    """
+    Lease en Firestore (SchedulerLeases/{name}) para que un solo proceso corra el job. Se toma si
+    no existe, si venció o si ya es nuestro; en ese caso se renueva.
+    """
+
+    def __init__(self, name: str, seconds: float):
+        self.name = name
+        self.seconds = seconds
+        self.holder = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+    def _ref(self, repo: Repository):
+        return repo.collection("SchedulerLeases").document(self.name)
+
+    async def acquire(self, repo: Repository) -> bool:
+        ref = self._ref(repo)
+
+        async def run(transaction):
+            snapshot = await ref.get(transaction=transaction)
+            now = datetime.now(timezone.utc)
+            if snapshot.exists:
+                current = snapshot.to_dict()
+                if current.get("holder") != self.holder and current.get("expires_at") and current["expires_at"] > now:
+                    return False
+            transaction.set(ref, {"holder": self.holder, "expires_at": now + timedelta(seconds=self.seconds)})
+            return True
+
+        try:
+            acquired = await repo.run_transaction(run)
+        except Aborted:
+            # Otro proceso tomó el lease al mismo tiempo
+            acquired = False
+        leader.set(1 if acquired else 0)
+        return acquired
+
+    async def release(self, repo: Repository):
+        ref = self._ref(repo)
+
+        async def run(transaction):
+            snapshot = await ref.get(transaction=transaction)
+            if snapshot.exists and snapshot.get("holder") == self.holder:
+                transaction.delete(ref)
+
+        await repo.run_transaction(run)
+        leader.set(0)
+
+
+def _ended(data: dict, now: datetime) -> bool:
+    start = data.get("starts_at") or roster.starts_at(data)
+    if start is None:
+        return False
+    return start + timedelta(minutes=data.get("duration") or 0) + EXPIRE_AFTER <= now
+
+
+async def _pages(query):
+    """Páginas de PAGE_SIZE ordenadas por (starts_at, id); los retos ya procesados salen de la consulta."""
+    query = query.order_by("starts_at").order_by("id")
+    cursor = None
+    while True:
+        page = query.limit(PAGE_SIZE)
+        if cursor is not None:
+            page = page.start_after(cursor)
+        docs = [doc async for doc in page.stream()]
+        if not docs:
+            return
+        yield docs
+        if len(docs) < PAGE_SIZE:
+            return
+        last = docs[-1]
+        cursor = {"starts_at": last.get("starts_at"), "id": last.get("id")}
+
+
+async def _markers(repo: Repository, docs) -> Set[str]:
+    """Retos que ya tienen su MatchResults: se completaron antes y se reabrieron."""
+    found = set()
+    if not docs:
+        return found
+    async for marker in repo.get_all([results.marker(repo, doc.id) for doc in docs]):
+        if marker.exists:
+            found.add(marker.id)
+    return found
+
+
+def _stage_expire(repo: Repository, batch, doc, data: dict, markers: Set[str]):
+    status = EXPIRED_STATUS[data["status"]]
+    if status == "completed" and doc.id not in markers:
+        # Igual que completar a mano: se encola el resultado para sumar matches_played
+        results.stage(repo, batch, doc, data)
+    else:
+        batch.update(doc.reference, {"status": status}, option=repo.write_option(last_update_time=doc.update_time))
+    return status
+
+
+async def _commit_expired(repo: Repository, docs, markers: Set[str]) -> list:
+    """Cierra los retos en un batch; si falla (alguno cambió), reintenta de a uno y salta los que fallen."""
+    batch = repo.batch()
+    staged = [(doc, _stage_expire(repo, batch, doc, doc.to_dict(), markers)) for doc in docs]
+    try:
+        await batch.commit()
+        return staged
+    except (AlreadyExists, FailedPrecondition, Aborted, NotFound):
+        pass
+    done = []
+    for doc in docs:
+        batch = repo.batch()
+        status = _stage_expire(repo, batch, doc, doc.to_dict(), markers)
+        try:
+            await batch.commit()
+        except (AlreadyExists, FailedPrecondition, Aborted, NotFound):
+            continue
+        done.append((doc, status))
+    return done
+
+
+class MatchScheduler:
+    """Cierra retos vencidos y archiva los terminados hace más de ARCHIVE_AFTER."""
+
+    def __init__(self):
+        self.lease = Lease("matches", LEASE_SECONDS)
+        self._task: Optional[asyncio.Task] = None
+
+    async def expire(self, repo: Repository, now: datetime) -> int:
+        count = 0
+        for current in EXPIRED_STATUS:
+            query = repo.matches.where("status", "==", current).where("starts_at", "<", now - EXPIRE_AFTER)
+            async for docs in _pages(query):
+                if not await self.lease.acquire(repo):
+                    return count
+                docs = [doc for doc in docs if _ended(doc.to_dict(), now)]
+                markers = await _markers(repo, docs) if EXPIRED_STATUS[current] == "completed" else set()
+                for doc, status in await _commit_expired(repo, docs, markers):
+                    await cache.invalidate(match_key(doc.id))
+                    recommendations.index.discard(doc.id)
+                    if status == "completed" and doc.id not in markers:
+                        results.pipeline.enqueue(repo, doc.id)
+                    expired_total.inc(status=status)
+                    count += 1
+        return count
+
+    async def archive(self, repo: Repository, now: datetime) -> int:
+        count = 0
+        query = repo.matches.where("status", "in", FINISHED_STATUS).where("starts_at", "<", now - ARCHIVE_AFTER)
+        async for docs in _pages(query):
+            if not await self.lease.acquire(repo):
+                return count
+            batch = repo.batch()
+            for doc in docs:
+                batch.set(repo.collection("MatchesArchive").document(doc.id), {**doc.to_dict(), "archived_at": SERVER_TIMESTAMP})
+                # Si el reto cambió desde la lectura, falla el batch y se reintenta en la próxima pasada
+                batch.delete(doc.reference, option=repo.write_option(last_update_time=doc.update_time))
+            try:
+                await batch.commit()
+            except (FailedPrecondition, Aborted, NotFound) as e:
+                log_info("scheduler_archive_error", error=str(e))
+                continue
+            for doc in docs:
+                await cache.invalidate(match_key(doc.id))
+            archived_total.inc(len(docs))
+            count += len(docs)
+        return count
+
+    async def run_once(self, repo: Repository) -> Optional[dict]:
+        """Una pasada completa; None si otro proceso tiene el lease."""
+        if not await self.lease.acquire(repo):
+            return None
+        now = datetime.now(timezone.utc)
+        done = {"expired": await self.expire(repo, now), "archived": await self.archive(repo, now)}
+        log_debug("scheduler", **done)
+        return done
+
+    async def _run(self, repo: Repository):
+        while True:
+            try:
+                await self.run_once(repo)
+            except Exception as e:
+                log_info("scheduler_error", error=str(e))
+            await asyncio.sleep(INTERVAL_SECONDS)
+
+    def start(self, repo: Repository):
+        self._task = asyncio.create_task(self._run(repo))
+
+    async def stop(self, repo: Repository):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+            try:
+                await self.lease.release(repo)
+            except Exception as e:
+                log_info("scheduler_error", error=str(e))
+
+
+scheduler = MatchScheduler()
@@ -0,0 +1,48 @@
+"""
+Recalcula los campos denormalizados de los retos existentes.
+
+Uso: python -m app.scripts.backfill_matches [--dry-run]
+"""
+import argparse
+import asyncio
+
+from app.repository import get_repository
+from app.roster import summary_changes
+
+BATCH_SIZE = 500
+
+
+async def backfill(dry_run: bool = False) -> int:
+    repo = get_repository()
+    batch = repo.batch()
+    pending = 0
+    updated = 0
+    async for doc in repo.matches.stream():
+        datos = doc.to_dict()
+        changes = summary_changes(datos)
+        if not changes:
+            continue
+        updated += 1
+        if dry_run:
+            continue
+        batch.update(doc.reference, changes)
+        pending += 1
+        if pending == BATCH_SIZE:
+            await batch.commit()
+            batch = repo.batch()
+            pending = 0
+    if pending:
+        await batch.commit()
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dry-run", action="store_true", help="solo cuenta los retos a actualizar")
+    args = parser.parse_args()
+    updated = asyncio.run(backfill(dry_run=args.dry_run))
+    print(f"Retos actualizados: {updated}")
+
+
+if __name__ == "__main__":
+    main()
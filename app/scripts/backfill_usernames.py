@@ -0,0 +1,50 @@
+"""
+Crea la entrada de Usernames para los usuarios anteriores al índice.
+
+Uso: python -m app.scripts.backfill_usernames [--dry-run]
+"""
+import argparse
+import asyncio
+
+from google.cloud.firestore_v1 import SERVER_TIMESTAMP
+
+from app.repository import get_repository
+
+BATCH_SIZE = 500
+
+
+async def backfill(dry_run: bool = False) -> int:
+    repo = get_repository()
+    indexed = {doc.id async for doc in repo.usernames.select([]).stream()}
+    batch = repo.batch()
+    pending = 0
+    created = 0
+    async for doc in repo.user_stats.select(["user_id"]).stream():
+        user_id = doc.to_dict().get("user_id")
+        if doc.id in indexed or not user_id:
+            continue
+        created += 1
+        if dry_run:
+            continue
+        # set() y no create(): si init_user_stats lo creó mientras tanto, el contenido es el mismo
+        batch.set(repo.usernames.document(doc.id), {"user_id": user_id, "created_at": SERVER_TIMESTAMP})
+        pending += 1
+        if pending == BATCH_SIZE:
+            await batch.commit()
+            batch = repo.batch()
+            pending = 0
+    if pending:
+        await batch.commit()
+    return created
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dry-run", action="store_true", help="solo cuenta los usernames a indexar")
+    args = parser.parse_args()
+    created = asyncio.run(backfill(dry_run=args.dry_run))
+    print(f"Usernames indexados: {created}")
+
+
+if __name__ == "__main__":
+    main()
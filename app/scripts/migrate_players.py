@@ -0,0 +1,69 @@
+"""
+Convierte la plantilla de los retos de lista a mapa por user_id (ver roster.players_map).
+
+Los retos sin migrar se siguen leyendo y se migran solos en su próxima modificación; este
+script migra el resto. Uso: python -m app.scripts.migrate_players [--dry-run]
+"""
+import argparse
+import asyncio
+
+from google.api_core.exceptions import FailedPrecondition
+
+from app.repository import get_repository
+from app.roster import players_map
+
+BATCH_SIZE = 500
+
+
+async def migrate(dry_run: bool = False) -> int:
+    repo = get_repository()
+    batch = repo.batch()
+    pending = []
+    migrated = 0
+
+    async def commit():
+        nonlocal batch, migrated
+        try:
+            await batch.commit()
+            migrated += len(pending)
+        except FailedPrecondition:
+            # Algún reto cambió desde la lectura: se releen de a uno y se migran los que sigan como lista
+            for ref in pending:
+                doc = await ref.get()
+                players = doc.to_dict().get("players") if doc.exists else None
+                if not isinstance(players, list):
+                    continue
+                try:
+                    await ref.update({"players": players_map(players)}, option=repo.write_option(last_update_time=doc.update_time))
+                    migrated += 1
+                except FailedPrecondition:
+                    pass
+        batch = repo.batch()
+        pending.clear()
+
+    async for doc in repo.matches.select(["players"]).stream():
+        players = doc.to_dict().get("players")
+        if not isinstance(players, list):
+            continue
+        if dry_run:
+            migrated += 1
+            continue
+        batch.update(doc.reference, {"players": players_map(players)}, option=repo.write_option(last_update_time=doc.update_time))
+        pending.append(doc.reference)
+        if len(pending) == BATCH_SIZE:
+            await commit()
+    if pending:
+        await commit()
+    return migrated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dry-run", action="store_true", help="solo cuenta los retos a migrar")
+    args = parser.parse_args()
+    migrated = asyncio.run(migrate(dry_run=args.dry_run))
+    print(f"Retos migrados: {migrated}")
+
+
+if __name__ == "__main__":
+    main()
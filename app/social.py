@@ -0,0 +1,235 @@
+# app/social.py
+import heapq
+import os
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from itertools import chain, combinations
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy es opcional: sin él se cuenta con Counter
+    np = None
+
+from app import metrics
+from app.periodic import PeriodicRebuild, journaled
+from app.repository import Repository
+
+REBUILD_SECONDS = float(os.getenv("SOCIAL_REBUILD_SECONDS", "600"))
+# Solo cuentan los partidos jugados juntos en esta ventana
+TOGETHER_DAYS = int(os.getenv("SOCIAL_TOGETHER_DAYS", "180"))
+
+WEIGHT_MUTUAL = 1.0
+WEIGHT_TOGETHER = 2.0
+TOGETHER_CAP = 5  # más partidos juntos que estos no suman
+
+graph_users = metrics.gauge("social_graph_users", "Usuarios en el grafo de amistades")
+graph_edges = metrics.gauge("social_graph_edges", "Amistades en el grafo")
+
+
+class Suggestion(NamedTuple):
+    user_id: str
+    score: float
+    mutual_friends: int
+    matches_together: int
+
+
+class SocialGraph(PeriodicRebuild):
+    """
+    Grafo de amistades (UserFriends, dirigido como en Firestore: user_id -> friend_id) con los uids
+    internados como enteros. Los vecinos de cada usuario son un array('i') ordenado, así que altas y
+    bajas son búsqueda binaria, y con numpy los amigos en común de todos los candidatos salen de un
+    solo bincount sobre los vecinos de los amigos, vistos como int32 sin copiarlos.
+
+    Además cuenta, por par de usuarios, los partidos completados que jugaron juntos (MatchResults).
+    """
+
+    name = "social"
+    rebuild_seconds = REBUILD_SECONDS
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self._ids: Dict[str, int] = {}
+        self._uids: List[str] = []
+        self._friends: List[array] = []
+        self._followers: List[array] = []  # aristas invertidas: quién tiene a cada usuario de amigo
+        self._together: List[Dict[int, int]] = []
+        self._matches: Set[str] = set()  # ya sumados a _together
+        # username y photo_url de cada usuario al que apunta una amistad (vienen en UserFriends)
+        self._profiles: Dict[int, Tuple[str, str]] = {}
+        self._edges = 0
+
+    def __len__(self):
+        return len(self._uids)
+
+    def _intern(self, uid: str) -> int:
+        node = self._ids.get(uid)
+        if node is None:
+            node = self._ids[uid] = len(self._uids)
+            self._uids.append(uid)
+            self._friends.append(array("i"))
+            self._followers.append(array("i"))
+            self._together.append({})
+        return node
+
+    def _gauges(self):
+        graph_users.set(len(self._uids))
+        graph_edges.set(self._edges)
+
+    @staticmethod
+    def _insert(neighbors: array, node: int) -> bool:
+        i = bisect_left(neighbors, node)
+        if i < len(neighbors) and neighbors[i] == node:
+            return False
+        neighbors.insert(i, node)
+        return True
+
+    @staticmethod
+    def _remove(neighbors: array, node: int) -> bool:
+        i = bisect_left(neighbors, node)
+        if i == len(neighbors) or neighbors[i] != node:
+            return False
+        del neighbors[i]
+        return True
+
+    @journaled
+    def add_friend(self, user_id: str, friend_id: str, username: Optional[str] = None, photo_url: Optional[str] = None):
+        node, friend = self._intern(user_id), self._intern(friend_id)
+        if username:
+            self._profiles[friend] = (username, photo_url or "")
+        if self._insert(self._friends[node], friend):
+            self._insert(self._followers[friend], node)
+            self._edges += 1
+            self._gauges()
+
+    @journaled
+    def remove_friend(self, user_id: str, friend_id: str):
+        node, friend = self._ids.get(user_id), self._ids.get(friend_id)
+        if node is None or friend is None:
+            return
+        if self._remove(self._friends[node], friend):
+            self._remove(self._followers[friend], node)
+            self._edges -= 1
+            self._gauges()
+
+    @journaled
+    def add_match(self, match_id: str, user_ids: List[str]):
+        """Un partido completado: suma uno a cada par de jugadores (una sola vez por reto)."""
+        if match_id in self._matches:
+            return
+        self._matches.add(match_id)
+        nodes = sorted({self._intern(uid) for uid in user_ids})
+        for a, b in combinations(nodes, 2):
+            self._together[a][b] = self._together[a].get(b, 0) + 1
+            self._together[b][a] = self._together[b].get(a, 0) + 1
+
+    def friends(self, user_id: str) -> List[str]:
+        node = self._ids.get(user_id)
+        return [self._uids[f] for f in self._friends[node]] if node is not None else []
+
+    def followers(self, user_id: str) -> List[str]:
+        """Usuarios que tienen a `user_id` entre sus amigos."""
+        node = self._ids.get(user_id)
+        return [self._uids[f] for f in self._followers[node]] if node is not None else []
+
+    def follower_count(self, user_id: str) -> int:
+        node = self._ids.get(user_id)
+        return len(self._followers[node]) if node is not None else 0
+
+    def profile(self, user_id: str) -> Optional[Tuple[str, str]]:
+        node = self._ids.get(user_id)
+        return self._profiles.get(node) if node is not None else None
+
+    def suggest(self, user_id: str, limit: int = 20) -> List[Suggestion]:
+        """
+        Amigos de amigos y compañeros de partido que todavía no son amigos, por amigos en común
+        y partidos jugados juntos.
+        """
+        node = self._ids.get(user_id)
+        if node is None:
+            return []
+        if np is None:
+            return self._suggest_python(node, limit)
+
+        friends = self._friends[node]
+        known = np.append(np.frombuffer(friends, dtype=np.intc), node)
+        if friends:
+            neighbors = np.concatenate([np.frombuffer(self._friends[f], dtype=np.intc) for f in friends])
+            mutual = np.bincount(neighbors, minlength=len(self._uids))
+        else:
+            mutual = np.zeros(len(self._uids), dtype=np.intp)
+        mutual[known] = 0
+        together = dict(self._together[node])
+        for f in friends:
+            together.pop(f, None)
+
+        scores = WEIGHT_MUTUAL * mutual
+        if together:
+            nodes = np.fromiter(together.keys(), dtype=np.intp, count=len(together))
+            counts = np.fromiter(together.values(), dtype=np.intp, count=len(together))
+            scores[nodes] += WEIGHT_TOGETHER * np.minimum(counts, TOGETHER_CAP)
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        # Por puntaje y, a igualdad, por orden de alta en el grafo
+        top = candidates[np.lexsort((candidates, -scores[candidates]))]
+        return [
+            Suggestion(self._uids[c], float(scores[c]), int(mutual[c]), together.get(c, 0))
+            for c in top.tolist()
+        ]
+
+    def _suggest_python(self, node: int, limit: int) -> List[Suggestion]:
+        friends = self._friends[node]
+        mutual = Counter(chain.from_iterable(self._friends[f] for f in friends))
+        for known in chain(friends, (node,)):
+            mutual.pop(known, None)
+        together = dict(self._together[node])
+        for known in friends:
+            together.pop(known, None)
+
+        # Sin partidos juntos el puntaje es solo amigos en común: alcanza con los mejores de mutual
+        # (tantos más como compañeros de partido puedan desplazarlos) y los compañeros de partido
+        scores = {
+            c: WEIGHT_MUTUAL * mutual.get(c, 0) + WEIGHT_TOGETHER * min(n, TOGETHER_CAP)
+            for c, n in together.items()
+        }
+        for c, n in mutual.most_common(limit + len(together.keys() & mutual.keys())):
+            scores.setdefault(c, WEIGHT_MUTUAL * n)
+        top = heapq.nlargest(limit, scores, key=scores.get)
+        return [Suggestion(self._uids[c], scores[c], mutual.get(c, 0), together.get(c, 0)) for c in top]
+
+    def load(self, friendships: Iterable[dict], matches: Iterable[Tuple[str, List[str]]]):
+        self._reset()
+        for row in friendships:
+            if row.get("user_id") and row.get("friend_id"):
+                self.add_friend(row["user_id"], row["friend_id"], row.get("username"), row.get("photo_url"))
+        for match_id, user_ids in matches:
+            self.add_match(match_id, user_ids)
+        self._gauges()
+
+    def stats(self) -> dict:
+        return {"users": len(self._uids), "edges": self._edges}
+
+    async def fetch(self, repo: Repository) -> tuple:
+        friendships = [
+            doc.to_dict()
+            async for doc in repo.user_friends.select(["user_id", "friend_id", "username", "photo_url"]).stream()
+        ]
+        since = datetime.now(timezone.utc) - timedelta(days=TOGETHER_DAYS)
+        # Solo los aplicados: los pendientes se suman al aplicarse (results.apply)
+        query = (
+            repo.collection("MatchResults")
+            .where("state", "==", "applied")
+            .where("created_at", ">=", since)
+            .select(["players"])
+        )
+        matches = [(doc.id, [p["user_id"] for p in doc.get("players") or []]) async for doc in query.stream()]
+        return friendships, matches
+
+
+graph = SocialGraph()
@@ -0,0 +1,54 @@
+# app/usernames.py
+import os
+from collections import OrderedDict
+from typing import Optional
+
+from app.profiles import get_profile
+from app.repository import Repository
+
+
+class UsernameIndex:
+    """
+    Resolución username <-> uid. En Firestore es la colección Usernames (id = username), que
+    init_user_stats escribe en el mismo batch que UserStats; acá se cachea en ambos sentidos.
+    Un username no cambia una vez asignado, así que las entradas no expiran: solo se acota el tamaño.
+    """
+
+    def __init__(self, maxsize: int = 8192):
+        self.maxsize = maxsize
+        self._uids: "OrderedDict[str, str]" = OrderedDict()
+        self._usernames: "OrderedDict[str, str]" = OrderedDict()
+
+    def remember(self, username: str, uid: str):
+        for mapping, key, value in ((self._uids, username, uid), (self._usernames, uid, username)):
+            mapping[key] = value
+            mapping.move_to_end(key)
+            while len(mapping) > self.maxsize:
+                mapping.popitem(last=False)
+
+    async def uid_for(self, repo: Repository, username: str) -> Optional[str]:
+        uid = self._uids.get(username)
+        if uid is not None:
+            return uid
+        doc = await repo.usernames.document(username).get()
+        if not doc.exists:
+            # Usuarios anteriores al índice (ver app.scripts.backfill_usernames)
+            doc = await repo.user_stats.document(username).get(field_paths=["user_id"])
+        if not doc.exists:
+            return None
+        uid = doc.get("user_id")
+        self.remember(username, uid)
+        return uid
+
+    async def username_for(self, repo: Repository, uid: str) -> Optional[str]:
+        username = self._usernames.get(uid)
+        if username is not None:
+            return username
+        profile = await get_profile(repo, uid)
+        if profile is None or not profile.get("username"):
+            return None
+        self.remember(profile["username"], uid)
+        return profile["username"]
+
+
+index = UsernameIndex(maxsize=int(os.getenv("USERNAME_CACHE_SIZE", "8192")))
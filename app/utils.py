@@ -0,0 +1,27 @@
+import base64
+import binascii
+import json
+from typing import Any, List
+
+
+def encode_cursor(*values: Any) -> str:
+    """Serializa los valores del último documento de una página en un cursor opaco."""
+    raw = json.dumps(list(values), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """Inverso de encode_cursor. Lanza ValueError si el cursor no es válido."""
+    padding = "=" * (-len(cursor) % 4)
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + padding))
+    except (binascii.Error, ValueError):
+        raise ValueError("Cursor inválido")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Cursor inválido")
+    return values
+
+
+def player_ids(players: List[dict]) -> List[str]:
+    """IDs de los jugadores de un reto, denormalizados para consultas array_contains."""
+    return [p["user_id"] for p in players]
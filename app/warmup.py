@@ -0,0 +1,100 @@
+# app/warmup.py
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Optional, Set
+
+from app.firebase_admin import prefetch_certificates_async
+from app.logger import log_info
+from app.repository import Repository
+
+WARMUP_REQUESTS = int(os.getenv("WARMUP_REQUESTS", "4"))
+WARMUP_ATTEMPTS = int(os.getenv("WARMUP_ATTEMPTS", "5"))
+RETRY_SECONDS = 1.0
+LOAD_MAX_RETRY_SECONDS = 60.0
+
+
+class WarmupState:
+    """Resultado del warm-up, para /healthz y /readyz."""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.ready = False
+        self.seconds: Optional[float] = None
+        self.steps = {}
+        # Estados en memoria cuya primera carga no terminó (ver load())
+        self.loading: Set[str] = set()
+
+    def expect(self, name: str):
+        """Marca una carga pendiente antes de crear su tarea: /readyz no debe verla lista ni un instante."""
+        self.loading.add(name)
+
+    def report(self) -> dict:
+        return {
+            "ready": self.ready and not self.loading,
+            "loading": sorted(self.loading),
+            "warmup_seconds": self.seconds,
+            "uptime_seconds": round(time.time() - self.started_at, 3),
+            "steps": self.steps,
+        }
+
+
+state = WarmupState()
+
+
+async def _step(name: str, fn, attempts: int = 1) -> bool:
+    start = time.perf_counter()
+    for attempt in range(attempts):
+        try:
+            await fn()
+            state.steps[name] = {"ok": True, "ms": round((time.perf_counter() - start) * 1000, 2)}
+            return True
+        except Exception as e:
+            state.steps[name] = {"ok": False, "ms": round((time.perf_counter() - start) * 1000, 2), "error": str(e)}
+            if attempt + 1 < attempts:
+                await asyncio.sleep(RETRY_SECONDS * (2 ** attempt))
+    log_info("warmup_error", step=name, error=state.steps[name]["error"])
+    return False
+
+
+async def load(name: str, fn: Callable[[], Awaitable[None]]):
+    """
+    Primera carga de un estado en memoria (ranking, índices) en segundo plano: el proceso no está
+    listo hasta que termina. Se reintenta sin límite, así un error de Firestore no tira el arranque.
+    """
+    state.expect(name)
+    start = time.perf_counter()
+    attempt = 0
+    while True:
+        try:
+            await fn()
+            break
+        except Exception as e:
+            state.steps[name] = {"ok": False, "ms": round((time.perf_counter() - start) * 1000, 2), "error": str(e)}
+            log_info("warmup_error", step=name, attempt=attempt, error=str(e))
+            await asyncio.sleep(min(RETRY_SECONDS * (2 ** attempt), LOAD_MAX_RETRY_SECONDS))
+            attempt += 1
+    state.steps[name] = {"ok": True, "ms": round((time.perf_counter() - start) * 1000, 2)}
+    state.loading.discard(name)
+
+
+async def _ping_firestore(repo: Repository):
+    # Lecturas concurrentes de un documento inexistente: abren el canal gRPC y obtienen el token
+    # OAuth, lo que si no pagaría el primer request real
+    ref = repo.collection("_warmup").document("ping")
+    await asyncio.gather(*[ref.get() for _ in range(WARMUP_REQUESTS)])
+
+
+async def run(repo: Repository):
+    """
+    Prepara las conexiones antes de reportar ready. Sin Firestore el proceso no está listo; si
+    fallan los certificados sigue listo y el primer login los descarga.
+    """
+    start = time.perf_counter()
+    firestore_ok, _ = await asyncio.gather(
+        _step("firestore", lambda: _ping_firestore(repo), attempts=WARMUP_ATTEMPTS),
+        _step("certificates", prefetch_certificates_async),
+    )
+    state.seconds = round(time.perf_counter() - start, 3)
+    state.ready = firestore_ok
+    log_info("warmup", ready=state.ready, seconds=state.seconds)
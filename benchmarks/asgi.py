@@ -0,0 +1,84 @@
+# benchmarks/asgi.py
+"""
+Cliente ASGI en proceso: llama a la app directamente, sin sockets ni httpx, para que lo medido
+sea la app y no el transporte. Con `first_chunk=True` se desconecta después del primer fragmento
+del cuerpo (para medir el tiempo al primer evento de /live, que nunca termina).
+"""
+import asyncio
+import json
+from typing import Any, Dict, NamedTuple, Optional
+from urllib.parse import urlsplit
+
+
+class Request(NamedTuple):
+    method: str
+    path: str
+    body: Any = None
+    headers: Dict[str, str] = {}
+    first_chunk: bool = False
+
+
+class Response(NamedTuple):
+    status: int
+    headers: Dict[str, str]
+    body: bytes
+
+    def json(self) -> Any:
+        return json.loads(self.body)
+
+
+DEFAULT_HEADERS = {"accept-encoding": "br, gzip", "user-agent": "tereto-bench"}
+
+
+async def call(app, request: Request) -> Response:
+    url = urlsplit(request.path)
+    body = b"" if request.body is None else json.dumps(request.body).encode()
+    headers = {**DEFAULT_HEADERS, **{k.lower(): v for k, v in request.headers.items()}}
+    if request.body is not None:
+        headers["content-type"] = "application/json"
+    headers["content-length"] = str(len(body))
+    scope = {
+        "type": "http",
+        # 2.3: Starlette escucha http.disconnect mientras transmite, así /live se cierra limpio
+        "asgi": {"version": "3.0", "spec_version": "2.3"},
+        "http_version": "1.1",
+        "method": request.method,
+        "scheme": "http",
+        "path": url.path,
+        "raw_path": url.path.encode(),
+        "query_string": url.query.encode(),
+        "root_path": "",
+        "headers": [(k.encode(), v.encode()) for k, v in headers.items()],
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+
+    sent_body = False
+    disconnected = asyncio.Event()
+    status: Optional[int] = None
+    response_headers: Dict[str, str] = {}
+    chunks = []
+
+    async def receive():
+        nonlocal sent_body
+        if not sent_body:
+            sent_body = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            response_headers.update((k.decode().lower(), v.decode()) for k, v in message.get("headers", []))
+        elif message["type"] == "http.response.body":
+            chunk = message.get("body", b"")
+            if chunk:
+                chunks.append(chunk)
+            if not message.get("more_body") or (request.first_chunk and chunks):
+                disconnected.set()
+
+    # Con first_chunk, Starlette ve el http.disconnect y corta el stream: la app termina sola
+    await app(scope, receive, send)
+    return Response(status or 500, response_headers, b"".join(chunks))
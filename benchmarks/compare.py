@@ -0,0 +1,69 @@
+# benchmarks/compare.py
+"""
+Compara dos reportes de benchmarks.run y marca regresiones: p95 o p99 más lentos que `--threshold`
+(relativo) o más operaciones de Firestore por request.
+
+Uso: python -m benchmarks.compare base.json head.json [--threshold 0.25]
+Sale con código 1 si hay regresiones.
+"""
+import argparse
+import json
+import sys
+from typing import List
+
+LATENCIES = ("p50", "p95", "p99")
+OPS_TOLERANCE = 0.05  # operaciones por request; el trabajo en segundo plano agrega algo de ruido
+
+
+def _delta(base: float, head: float) -> str:
+    if not base:
+        return "   n/a"
+    return f"{(head - base) / base * 100:+6.1f}%"
+
+
+def compare(base: dict, head: dict, threshold: float) -> List[str]:
+    regressions = []
+    for name, after in head["scenarios"].items():
+        before = base["scenarios"].get(name)
+        if before is None:
+            print(f"{name:<24} (nuevo)")
+            continue
+        cells = [f"rps {after['throughput_rps']:>9.1f} {_delta(before['throughput_rps'], after['throughput_rps'])}"]
+        for key in LATENCIES:
+            old, new = before["latency_ms"][key], after["latency_ms"][key]
+            cells.append(f"{key} {new:>8.2f} {_delta(old, new)}")
+            if key != "p50" and old and (new - old) / old > threshold:
+                regressions.append(f"{name}: {key} {old:.2f} -> {new:.2f} ms")
+        for op, new in after["firestore_per_request"].items():
+            old = before["firestore_per_request"].get(op, 0)
+            if new - old > OPS_TOLERANCE:
+                regressions.append(f"{name}: {op}/request {old:.2f} -> {new:.2f}")
+        cells.append(f"rpcs/req {after['firestore_per_request']['rpcs']:>6.2f}")
+        print(f"{name:<24} " + "  ".join(cells))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--threshold", type=float, default=0.25, help="aumento relativo de p95/p99 tolerado")
+    args = parser.parse_args()
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+    for key in ("latency_ms", "dataset"):
+        if base["meta"].get(key) != head["meta"].get(key):
+            print(f"aviso: {key} distinto ({base['meta'].get(key)} vs {head['meta'].get(key)})", file=sys.stderr)
+
+    regressions = compare(base, head, args.threshold)
+    if regressions:
+        print("\nRegresiones:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
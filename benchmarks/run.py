@@ -0,0 +1,212 @@
+# benchmarks/run.py
+"""
+Benchmarks de carga de la API: corren app.main:app en proceso sobre MemoryClient con latencia
+simulada por RPC, con datos sembrados, y reportan por ruta throughput, latencias p50/p95/p99 y
+operaciones de Firestore por request. Firebase Auth se reemplaza por un verificador falso
+(el token es el uid) y no se descargan certificados.
+
+Uso: python -m benchmarks.run [--latency-ms 5] [--only match_get,match_join_hot] [--out bench.json]
+Comparar dos corridas: python -m benchmarks.compare base.json head.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import warnings
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List
+
+from app import feed
+from app import main
+from app import results
+from app import roster
+from app import warmup
+from app.cache import MemoryCache, cache
+from app.instrumentation import InstrumentedClient, firestore_ops
+from app.memory_store import MemoryClient
+from app.profiles import profiles
+from app.repository import MemoryRepository, set_repository
+from app.routes import auth, users
+from benchmarks import asgi, seed
+from benchmarks.scenarios import SCENARIOS, Context, Scenario
+
+OPS = ("reads", "writes", "streamed")
+
+
+async def fake_verify_token(id_token: str) -> dict:
+    return {"uid": id_token, "email": f"{id_token}@tereto.test", "name": id_token, "picture": None, "exp": time.time() + 3600}
+
+
+async def _noop():
+    return None
+
+
+def install_fakes():
+    auth.verify_token_async = fake_verify_token
+    users.verify_token_async = fake_verify_token
+    main.init_firebase = lambda: None
+    warmup.prefetch_certificates_async = _noop
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Percentil por rango más cercano sobre valores ordenados."""
+    if not values:
+        return 0.0
+    rank = max(int(round(q / 100 * len(values) + 0.5)) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+class Bench:
+    def __init__(self, client: MemoryClient, latency: float):
+        self.client = client
+        self.latency = latency
+
+    def counters(self) -> Dict[str, float]:
+        return {"rpcs": self.client.rpcs, **{op: firestore_ops.values.get((op,), 0) for op in OPS}}
+
+    async def settle(self):
+        """Espera el trabajo en segundo plano (escrituras de plantilla, resultados, feed) para contarlo."""
+        while roster.coalescer._workers or results.queue_depth.value > 0 or feed.queue_depth.value > 0:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(self.latency * 4 + 0.01)
+
+    async def run(self, ctx: Context, scenario: Scenario, requests: int, concurrency: int) -> dict:
+        # Cada escenario empieza con las cachés vacías: el resultado no depende de cuáles corrieron antes
+        for read_through in (cache, profiles):
+            read_through.backend = MemoryCache(maxsize=read_through.backend.maxsize)
+        self.client.latency = 0
+        state = await scenario.setup(ctx, requests) if scenario.setup else None
+        self.client.latency = self.latency
+        await self.settle()
+
+        latencies: List[float] = []
+        statuses: Counter = Counter()
+        indexes = iter(range(requests))
+
+        async def worker():
+            for i in indexes:
+                request = scenario.build(ctx, state, i)
+                start = time.perf_counter()
+                response = await asgi.call(ctx.app, request)
+                latencies.append(time.perf_counter() - start)
+                statuses[str(response.status)] += 1
+
+        before = self.counters()
+        start = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(min(concurrency, requests))])
+        elapsed = time.perf_counter() - start
+        await self.settle()
+        after = self.counters()
+
+        latencies.sort()
+        ms = lambda seconds: round(seconds * 1000, 3)
+        return {
+            "route": scenario.route,
+            "requests": requests,
+            "concurrency": concurrency,
+            "seconds": round(elapsed, 4),
+            "throughput_rps": round(requests / elapsed, 2),
+            "latency_ms": {
+                "mean": ms(sum(latencies) / len(latencies)),
+                "p50": ms(percentile(latencies, 50)),
+                "p95": ms(percentile(latencies, 95)),
+                "p99": ms(percentile(latencies, 99)),
+                "max": ms(latencies[-1]),
+            },
+            "status": dict(sorted(statuses.items())),
+            # Incluye el trabajo en segundo plano que dispararon los requests
+            "firestore_per_request": {key: round((after[key] - before[key]) / requests, 3) for key in after},
+        }
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+async def run(args) -> dict:
+    # Los modelos con defaults de otro tipo (UserStats.stars, UserInvite.created_at) avisan en cada request
+    warnings.filterwarnings("ignore", category=UserWarning, module="pydantic")
+    random.seed(args.seed)  # ids automáticos de MemoryClient
+    install_fakes()
+    client = MemoryClient(jitter=args.jitter_ms / 1000)
+    repo = MemoryRepository(InstrumentedClient(client))
+    set_repository(repo)
+    rng = random.Random(args.seed)
+
+    start = time.perf_counter()
+    data = await seed.seed(repo, rng, users=args.users, matches=args.matches, friends=args.friends, days=args.days)
+    print(f"seed: {args.users} usuarios, {args.matches} retos en {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    selected = [s for s in SCENARIOS if not args.only or s.name in args.only]
+    bench = Bench(client, args.latency_ms / 1000)
+    report = {}
+    async with main.app.router.lifespan_context(main.app):
+        ctx = Context(main.app, repo, data, rng)
+        for scenario in selected:
+            result = await bench.run(ctx, scenario, args.requests or scenario.requests, args.concurrency or scenario.concurrency)
+            report[scenario.name] = result
+            print(
+                f"{scenario.name:<24} {result['throughput_rps']:>9.1f} rps  p50 {result['latency_ms']['p50']:>8.2f}  "
+                f"p95 {result['latency_ms']['p95']:>8.2f}  p99 {result['latency_ms']['p99']:>8.2f} ms  "
+                f"rpcs/req {result['firestore_per_request']['rpcs']:>6.2f}  {result['status']}",
+                file=sys.stderr,
+            )
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git": _git_revision(),
+            "python": platform.python_version(),
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "seed": args.seed,
+            "dataset": {"users": args.users, "matches": args.matches, "friends": args.friends, "days": args.days},
+            "env": {k: v for k, v in os.environ.items() if k in ("ROSTER_COALESCE_MS", "CACHE_TTL_SECONDS", "COMPRESSION_MIN_BYTES")},
+        },
+        "scenarios": report,
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="latencia simulada por RPC de Firestore")
+    parser.add_argument("--jitter-ms", type=float, default=1.0)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--matches", type=int, default=5000)
+    parser.add_argument("--friends", type=int, default=10, help="amigos por usuario")
+    parser.add_argument("--days", type=int, default=30, help="días hacia adelante en los que caen los retos")
+    parser.add_argument("--requests", type=int, default=None, help="requests por escenario (por defecto, los de cada uno)")
+    parser.add_argument("--concurrency", type=int, default=None)
+    parser.add_argument("--only", type=lambda value: set(value.split(",")), default=None, help="escenarios separados por coma")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", default=None, help="archivo JSON (por defecto, stdout)")
+    parser.add_argument("--list", action="store_true", help="lista los escenarios y sale")
+    args = parser.parse_args()
+
+    if args.list:
+        for scenario in SCENARIOS:
+            print(f"{scenario.name:<24} {scenario.route}")
+        return
+    unknown = (args.only or set()) - {s.name for s in SCENARIOS}
+    if unknown:
+        parser.error(f"escenarios desconocidos: {', '.join(sorted(unknown))}")
+
+    report = json.dumps(asyncio.run(run(args)), indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main_cli()
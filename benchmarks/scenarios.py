@@ -0,0 +1,233 @@
+# benchmarks/scenarios.py
+"""
+Un escenario por ruta de app/routes. Cada uno arma el request i-ésimo y, si necesita datos
+propios (retos para borrar, invitaciones para aceptar...), los crea en `setup` antes de medir.
+"""
+import random
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+from benchmarks import asgi, seed
+from benchmarks.asgi import Request
+from app.repository import Repository
+
+
+class Context:
+    def __init__(self, app, repo: Repository, data: seed.Dataset, rng: random.Random):
+        self.app = app
+        self.repo = repo
+        self.data = data
+        self.rng = rng
+
+    async def call(self, request: Request) -> asgi.Response:
+        return await asgi.call(self.app, request)
+
+
+class Scenario:
+    def __init__(
+        self,
+        name: str,
+        route: str,
+        build: Callable[[Context, Any, int], Request],
+        setup: Optional[Callable[[Context, int], Awaitable[Any]]] = None,
+        requests: int = 500,
+        concurrency: int = 50,
+    ):
+        self.name = name
+        self.route = route
+        self.build = build
+        self.setup = setup
+        self.requests = requests
+        self.concurrency = concurrency
+
+
+def pick(items: List[Any], i: int, k: int = 0) -> Any:
+    """Elemento pseudoaleatorio pero fijo para el request i (el orden de los workers no lo cambia)."""
+    return items[(i * 7919 + k * 104729) % len(items)]
+
+
+def player(uid: str, **extra) -> dict:
+    return {"user_id": uid, "name": f"Jugador {uid}", "position": "defensa", **extra}
+
+
+async def roster_fixture(ctx: Context, count: int, per_match: int = 9, **kwargs) -> List[Tuple[str, str]]:
+    """(reto, jugador) para `count` requests, repartidos en retos de `per_match` jugadores más el creador."""
+    pairs = []
+    offset = 0
+    while len(pairs) < count:
+        creator, players = ctx.data.user_id(offset), [ctx.data.user_id(offset + k) for k in range(1, per_match + 1)]
+        offset += per_match + 1
+        match_id = await seed.create_match(ctx.repo, ctx.rng, ctx.data, players, creator=creator, **kwargs)
+        pairs.extend((match_id, uid) for uid in players)
+    return pairs[:count]
+
+
+async def creator_fixture(ctx: Context, count: int, per_creator: int = 1, **kwargs) -> List[Tuple[str, List[str]]]:
+    """(creador, retos) para `count` requests de rutas que solo acepta el creador."""
+    fixtures = []
+    for i in range(count):
+        creator = ctx.data.user_id(i)
+        players = [ctx.data.user_id(i + k) for k in range(1, 10)]
+        ids = [await seed.create_match(ctx.repo, ctx.rng, ctx.data, players, creator=creator, **kwargs) for _ in range(per_creator)]
+        fixtures.append((creator, ids))
+    return fixtures
+
+
+async def etags_fixture(ctx: Context, count: int) -> List[Tuple[str, str]]:
+    hot = ctx.data.match_ids[:100]
+    tags = []
+    for match_id in hot:
+        response = await ctx.call(Request("GET", f"/matches/{match_id}"))
+        tags.append((match_id, response.headers.get("etag", "")))
+    return tags
+
+
+async def invites_fixture(ctx: Context, count: int) -> List[Tuple[str, str, str]]:
+    """(invitado, id de la invitación, username de quien invita)."""
+    invites = []
+    half = len(ctx.data.user_ids) // 2
+    for i in range(count):
+        ref = ctx.repo.user_invites.document()
+        await ref.set({
+            "user_id": ctx.data.user_id(i + half), "username": ctx.data.username(i + half),
+            "invite_username": ctx.data.username(i), "status": "pending", "created_at": "2025-01-01T00:00:00+00:00",
+        })
+        invites.append((ctx.data.user_id(i), ref.id, ctx.data.username(i + half)))
+    return invites
+
+
+async def new_users_fixture(ctx: Context, count: int) -> List[str]:
+    uids = [f"nuevo{i:06d}" for i in range(count)]
+    for uid in uids:
+        await ctx.repo.users.document(uid).set({"id": uid, "email": f"{uid}@tereto.test", "name": uid, "username": None, "photo_url": None})
+    return uids
+
+
+async def hot_match_fixture(ctx: Context, count: int) -> str:
+    return await seed.create_match(ctx.repo, ctx.rng, ctx.data, [], mode="5vs5")
+
+
+async def delete_fixture(ctx: Context, count: int) -> List[str]:
+    return [await seed.create_match(ctx.repo, ctx.rng, ctx.data, []) for _ in range(count)]
+
+
+def _new_match(ctx: Context, state, i: int) -> Request:
+    uid = ctx.data.user_id(i)
+    return Request("POST", "/matches/", {
+        "creator_id": uid, "creator_name": f"Jugador {uid}", "mode": "5vs5", "place": "Cancha 1",
+        "date": pick(ctx.data.days, i), "time": "20:00", "duration": 60, "creator_position": "delantero",
+    })
+
+
+def _batch_get(ctx: Context, state, i: int) -> Request:
+    return Request("POST", "/matches/batch_get", {"ids": [pick(ctx.data.match_ids, i, k) for k in range(20)]})
+
+
+def _batch(ctx: Context, state, i: int) -> Request:
+    creator, ids = state[i]
+    return Request("POST", "/matches/batch", {
+        "user_id": creator, "operations": [{"match_id": match_id, "action": "status", "status": "cancelled"} for match_id in ids],
+    })
+
+
+def _result(ctx: Context, state, i: int) -> Request:
+    creator, (match_id,) = state[i]
+    return Request("POST", f"/matches/{match_id}/result", {"user_id": creator, "home_score": i % 5, "away_score": i % 3})
+
+
+SCENARIOS = [
+    # Lecturas
+    Scenario("auth_login", "POST /auth/login",
+             lambda ctx, s, i: Request("POST", "/auth/login", {"idToken": ctx.data.user_id(i)}), requests=1000),
+    Scenario("users_protected", "GET /users/protected",
+             lambda ctx, s, i: Request("GET", "/users/protected", headers={"Authorization": f"Bearer {ctx.data.user_id(i)}"})),
+    Scenario("matches_list", "GET /matches/",
+             lambda ctx, s, i: Request("GET", "/matches/?status=open&limit=50")),
+    Scenario("matches_list_fields", "GET /matches/?fields=",
+             lambda ctx, s, i: Request("GET", "/matches/?status=open&limit=50&fields=status,mode,open_slots,starts_at")),
+    Scenario("matches_list_ndjson", "GET /matches/?format=ndjson",
+             lambda ctx, s, i: Request("GET", "/matches/?format=ndjson&limit=200"), requests=100, concurrency=10),
+    Scenario("matches_search", "GET /matches/search",
+             lambda ctx, s, i: Request("GET", f"/matches/search?date={pick(ctx.data.days, i)}&mode=5vs5")),
+    Scenario("matches_batch_get", "POST /matches/batch_get", _batch_get),
+    Scenario("match_get", "GET /matches/{match_id}",
+             lambda ctx, s, i: Request("GET", f"/matches/{ctx.data.match_ids[i % 100]}"), requests=2000, concurrency=100),
+    Scenario("match_get_cold", "GET /matches/{match_id} (sin caché)",
+             lambda ctx, s, i: Request("GET", f"/matches/{pick(ctx.data.match_ids, i)}")),
+    Scenario("match_get_fields", "GET /matches/{match_id}?fields=",
+             lambda ctx, s, i: Request("GET", f"/matches/{pick(ctx.data.match_ids, i)}?fields=status,open_slots")),
+    Scenario("match_get_not_modified", "GET /matches/{match_id} (If-None-Match)",
+             lambda ctx, s, i: Request("GET", f"/matches/{s[i % len(s)][0]}", headers={"If-None-Match": s[i % len(s)][1]}),
+             setup=etags_fixture, requests=2000, concurrency=100),
+    Scenario("match_live", "GET /matches/{match_id}/live (primer evento)",
+             lambda ctx, s, i: Request("GET", f"/matches/{ctx.data.match_ids[i % 50]}/live", first_chunk=True),
+             requests=200, concurrency=20),
+    Scenario("users_matches", "GET /users/{user_id}/matches",
+             lambda ctx, s, i: Request("GET", f"/users/{ctx.data.user_id(i)}/matches"), requests=1000, concurrency=100),
+    Scenario("users_recommended", "GET /users/{user_id}/recommended_matches",
+             lambda ctx, s, i: Request("GET", f"/users/{pick(ctx.data.user_ids, i)}/recommended_matches?limit=20")),
+    Scenario("users_leaderboard", "GET /users/leaderboard",
+             lambda ctx, s, i: Request("GET", f"/users/leaderboard?limit=20&offset={(i * 20) % 1000}")),
+    Scenario("users_rank", "GET /users/{username}/rank",
+             lambda ctx, s, i: Request("GET", f"/users/{pick(ctx.data.usernames, i)}/rank")),
+    Scenario("users_stats", "GET /users/{username}/stats",
+             lambda ctx, s, i: Request("GET", f"/users/{pick(ctx.data.usernames, i)}/stats")),
+    Scenario("users_friends", "GET /users/{user_id}/friends",
+             lambda ctx, s, i: Request("GET", f"/users/{pick(ctx.data.user_ids, i)}/friends")),
+    Scenario("users_suggestions", "GET /users/{user_id}/suggestions",
+             lambda ctx, s, i: Request("GET", f"/users/{pick(ctx.data.user_ids, i)}/suggestions?limit=20")),
+    Scenario("users_feed", "GET /users/{user_id}/feed",
+             lambda ctx, s, i: Request("GET", f"/users/{pick(ctx.data.user_ids, i)}/feed?limit=20")),
+    Scenario("users_invites", "GET /users/{user_id}/invites",
+             lambda ctx, s, i: Request("GET", f"/users/{pick(ctx.data.user_ids, i)}/invites")),
+
+    # Escrituras
+    Scenario("matches_create", "POST /matches/", _new_match),
+    Scenario("matches_batch", "POST /matches/batch", _batch,
+             setup=lambda ctx, n: creator_fixture(ctx, n, per_creator=5), requests=100, concurrency=10),
+    Scenario("match_update", "PUT /matches/{match_id}",
+             lambda ctx, s, i: Request("PUT", f"/matches/{pick(ctx.data.match_ids, i)}", {"notas": f"Nota {i}"})),
+    # Muchos jugadores uniéndose a la vez al mismo reto
+    Scenario("match_join_hot", "POST /matches/{match_id}/join",
+             lambda ctx, s, i: Request("POST", f"/matches/{s}/join", player(ctx.data.user_id(i))),
+             setup=hot_match_fixture, requests=500, concurrency=500),
+    # Cada join llega dos veces con el mismo Idempotency-Key (reintento de un cliente)
+    Scenario("match_join_retry", "POST /matches/{match_id}/join (Idempotency-Key)",
+             lambda ctx, s, i: Request("POST", f"/matches/{s}/join", player(ctx.data.user_id(i // 2)),
+                                       headers={"Idempotency-Key": f"join-{i // 2}"}),
+             setup=hot_match_fixture, requests=500, concurrency=50),
+    Scenario("match_confirm", "POST /matches/{match_id}/confirm",
+             lambda ctx, s, i: Request("POST", f"/matches/{s[i][0]}/confirm", player(s[i][1], confirmed=True)),
+             setup=lambda ctx, n: roster_fixture(ctx, n, confirmed=False)),
+    Scenario("match_change_position", "POST /matches/{match_id}/change_position",
+             lambda ctx, s, i: Request("POST", f"/matches/{s[i][0]}/change_position", {"user_id": s[i][1], "position": "delantero"}),
+             setup=roster_fixture),
+    Scenario("match_change_team", "POST /matches/{match_id}/change_team",
+             lambda ctx, s, i: Request("POST", f"/matches/{s[i][0]}/change_team", {"user_id": s[i][1], "team": "away"}),
+             setup=lambda ctx, n: roster_fixture(ctx, n, team="home")),
+    Scenario("match_quit", "POST /matches/{match_id}/quit",
+             lambda ctx, s, i: Request("POST", f"/matches/{s[i][0]}/quit", {"user_id": s[i][1]}),
+             setup=roster_fixture),
+    Scenario("match_start", "POST /matches/{match_id}/start",
+             lambda ctx, s, i: Request("POST", f"/matches/{s[i][1][0]}/start"),
+             setup=lambda ctx, n: creator_fixture(ctx, n, confirmed=True, status="confirmed"), requests=200),
+    Scenario("match_status", "POST /matches/{match_id}/status",
+             lambda ctx, s, i: Request("POST", f"/matches/{s[i][1][0]}/status", {"user_id": s[i][0], "status": "cancelled"}),
+             setup=creator_fixture, requests=200),
+    Scenario("match_result", "POST /matches/{match_id}/result", _result,
+             setup=lambda ctx, n: creator_fixture(ctx, n, confirmed=True, status="confirmed"), requests=200),
+    Scenario("users_stats_update", "POST /users/{username}/stats",
+             lambda ctx, s, i: Request("POST", f"/users/{pick(ctx.data.usernames, i)}/stats", {"pref_position": seed.POSITIONS[i % 4]})),
+    Scenario("users_invite", "POST /users/{user_id}/invites",
+             lambda ctx, s, i: Request("POST", f"/users/{ctx.data.user_id(i)}/invites",
+                                       {"username": ctx.data.username(i + len(ctx.data.usernames) // 3)})),
+    Scenario("users_accept_invite", "POST /users/{user_id}/invites/{invite_id}",
+             lambda ctx, s, i: Request("POST", f"/users/{s[i][0]}/invites/{s[i][1]}", {"invite_id": s[i][1], "username": s[i][2]}),
+             setup=invites_fixture),
+    Scenario("users_initstats", "POST /users/initstats",
+             lambda ctx, s, i: Request("POST", "/users/initstats", {"username": s[i], "user_id": s[i], "photo_url": ""}),
+             setup=new_users_fixture, requests=200),
+    Scenario("users_remove_friend", "DELETE /users/{user_id}/friends",
+             lambda ctx, s, i: Request("DELETE", f"/users/{ctx.data.user_id(i)}/friends", {"username": ctx.data.username(i + 1)})),
+    Scenario("match_delete", "DELETE /matches/{match_id}",
+             lambda ctx, s, i: Request("DELETE", f"/matches/{s[i]}"), setup=delete_fixture),
+]
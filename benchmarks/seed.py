@@ -0,0 +1,168 @@
+# benchmarks/seed.py
+"""Datos de prueba con volúmenes realistas: usuarios, estadísticas, amistades, invitaciones y retos."""
+import random
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from app import roster
+from app.models import Match, Player, UserStats
+from app.repository import Repository
+
+MODES = ["5vs5", "6vs6", "7vs7"]
+POSITIONS = ["arquero", "defensa", "mediocampista", "delantero"]
+BATCH_SIZE = 500
+
+
+class Dataset:
+    """Lo que sembró seed(); los escenarios eligen ids de acá."""
+
+    def __init__(self):
+        self.user_ids: List[str] = []
+        self.usernames: List[str] = []
+        self.match_ids: List[str] = []
+        self.creators: Dict[str, str] = {}
+        self.days: List[str] = []
+
+    def username(self, i: int) -> str:
+        return self.usernames[i % len(self.usernames)]
+
+    def user_id(self, i: int) -> str:
+        return self.user_ids[i % len(self.user_ids)]
+
+
+class Writer:
+    """Agrupa escrituras en batches de BATCH_SIZE."""
+
+    def __init__(self, repo: Repository):
+        self.repo = repo
+        self.batch = repo.batch()
+        self.pending = 0
+
+    async def set(self, ref, data: dict):
+        self.batch.set(ref, data)
+        self.pending += 1
+        if self.pending == BATCH_SIZE:
+            await self.flush()
+
+    async def flush(self):
+        if self.pending:
+            await self.batch.commit()
+        self.batch = self.repo.batch()
+        self.pending = 0
+
+
+def user_id(i: int) -> str:
+    return f"u{i:06d}"
+
+
+def username(i: int) -> str:
+    return f"jugador{i:06d}"
+
+
+def user_doc(i: int) -> dict:
+    return {
+        "id": user_id(i),
+        "email": f"{username(i)}@tereto.test",
+        "name": f"Jugador {i}",
+        "username": username(i),
+        "photo_url": f"https://tereto.test/{i}.png",
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def match_doc(
+    rng: random.Random,
+    creator: str,
+    day: str,
+    players: List[str],
+    mode: str = "5vs5",
+    status: str = "open",
+    confirmed: Optional[bool] = None,
+    team: Optional[str] = None,
+) -> dict:
+    """El documento tal como lo guarda create_match (plantilla como mapa y campos de summary())."""
+    match = Match(
+        id=None,
+        creator_id=creator,
+        creator_name=f"Creador {creator}",
+        mode=mode,
+        place=f"Cancha {rng.randint(1, 50)}",
+        date=day,
+        time=f"{rng.randint(8, 22):02d}:00",
+        duration=rng.choice([60, 90, 120]),
+        status=status,
+        players=[
+            Player(
+                user_id=uid,
+                name=f"Jugador {uid}",
+                position=rng.choice(POSITIONS),
+                confirmed=rng.random() < 0.6 if confirmed is None else confirmed,
+                team=team or ("home" if i % 2 == 0 else "away"),
+            )
+            for i, uid in enumerate([creator, *players])
+        ],
+    )
+    data = match.model_dump()
+    data.update(roster.summary(data))
+    data["players"] = roster.players_map(data["players"])
+    return data
+
+
+async def create_match(
+    repo: Repository, rng: random.Random, data: Dataset, players: List[str], creator: Optional[str] = None, **kwargs,
+) -> str:
+    """Un reto suelto para un escenario (fuera de seed())."""
+    ref = repo.matches.document()
+    doc = match_doc(rng, creator or rng.choice(data.user_ids), rng.choice(data.days), players, **kwargs)
+    doc["id"] = ref.id
+    await ref.set(doc)
+    return ref.id
+
+
+async def seed(repo: Repository, rng: random.Random, users: int, matches: int, friends: int, days: int) -> Dataset:
+    data = Dataset()
+    writer = Writer(repo)
+    today = date.today()
+    data.days = [(today + timedelta(days=d)).isoformat() for d in range(1, days + 1)]
+
+    for i in range(users):
+        uid, name = user_id(i), username(i)
+        data.user_ids.append(uid)
+        data.usernames.append(name)
+        await writer.set(repo.users.document(uid), user_doc(i))
+        stats = UserStats.model_construct(
+            user_id=uid, username=name, photo_url=f"https://tereto.test/{i}.png",
+            pref_position=rng.choice(POSITIONS), matches_played=rng.randint(0, 200),
+            rank=0, wins=rng.randint(0, 80), loses=rng.randint(0, 80), draws=rng.randint(0, 30), stars=0,
+        )
+        await writer.set(repo.user_stats.document(name), stats.model_dump())
+        await writer.set(repo.usernames.document(name), {"user_id": uid})
+
+    # Cada usuario es amigo de los `friends` siguientes y tiene una invitación pendiente
+    for i in range(users):
+        for k in range(1, friends + 1):
+            j = (i + k) % users
+            await writer.set(repo.user_friends.document(), {
+                "user_id": user_id(i), "friend_id": user_id(j),
+                "username": username(j), "photo_url": f"https://tereto.test/{j}.png",
+            })
+        j = (i + friends + 1) % users
+        await writer.set(repo.user_invites.document(), {
+            "user_id": user_id(j), "username": username(j), "invite_username": username(i),
+            "status": "pending", "created_at": datetime.now(timezone.utc).isoformat(),
+        })
+
+    for _ in range(matches):
+        mode = rng.choice(MODES)
+        creator = rng.choice(data.user_ids)
+        others = rng.sample(data.user_ids, rng.randint(1, roster.LIMITE_POR_MODO[mode] - 1))
+        others = [uid for uid in others if uid != creator]
+        ref = repo.matches.document()
+        doc = match_doc(rng, creator, rng.choice(data.days), others, mode=mode, status=rng.choice(["open"] * 8 + ["confirmed", "cancelled"]))
+        doc["id"] = ref.id
+        await writer.set(ref, doc)
+        data.match_ids.append(ref.id)
+        data.creators[ref.id] = creator
+
+    await writer.flush()
+    return data
@@ -0,0 +1,73 @@
+# tests/conftest.py
+import asyncio
+import os
+
+# Antes de importar la app: get_repository() crea el backend según esta variable
+os.environ["STORAGE_BACKEND"] = "memory"
+
+import httpx
+import pytest
+
+from app import cache as cache_module
+from app.cache import MemoryCache
+from app.instrumentation import InstrumentedClient
+from app.main import app
+from app.memory_store import MemoryClient
+from app.repository import MemoryRepository, set_repository
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def repo(monkeypatch):
+    """Un MemoryClient vacío por test, el mismo que reciben las rutas."""
+    repository = MemoryRepository(InstrumentedClient(MemoryClient()))
+    set_repository(repository)
+    monkeypatch.setattr(cache_module.cache, "backend", MemoryCache())
+    yield repository
+    set_repository(None)
+
+
+@pytest.fixture
+async def client(repo):
+    # Sin lifespan: los índices en memoria arrancan vacíos y el pipeline aplica en segundo plano
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as c:
+        yield c
+
+
+async def _wait_for(predicate, timeout: float = 2.0):
+    """Espera a que `predicate()` (sync o async) sea verdadero, para el trabajo en segundo plano."""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        value = predicate()
+        if asyncio.iscoroutine(value):
+            value = await value
+        if value:
+            return value
+        if asyncio.get_running_loop().time() >= deadline:
+            raise AssertionError("La condición no se cumplió a tiempo")
+        await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+def wait_for():
+    return _wait_for
+
+
+@pytest.fixture
+def new_match(client):
+    """Crea un reto por la API y devuelve su id."""
+
+    async def create(creator_id: str = "u1", **fields) -> str:
+        body = {
+            "creator_id": creator_id, "creator_name": "Caro", "mode": "5vs5", "place": "Cancha",
+            "date": "2030-01-01", "time": "18:00", "duration": 60, **fields,
+        }
+        response = await client.post("/matches/", json=body)
+        assert response.status_code == 200, response.text
+        return response.json()["id"]
+
+    return create
@@ -0,0 +1,89 @@
+# tests/test_cache.py
+import asyncio
+
+import pytest
+
+from app.cache import MemoryCache, ReadThroughCache
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def cache():
+    return ReadThroughCache(MemoryCache(maxsize=16), ttl=60)
+
+
+async def test_concurrent_misses_share_one_load(cache):
+    calls = 0
+    release = asyncio.Event()
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return {"status": "open"}
+
+    waiting = [asyncio.create_task(cache.get_or_load("match:m1", loader)) for _ in range(10)]
+    await asyncio.sleep(0)
+    release.set()
+    assert await asyncio.gather(*waiting) == [{"status": "open"}] * 10
+    assert calls == 1
+    assert await cache.peek("match:m1") == {"status": "open"}
+
+
+async def test_invalidate_during_load_does_not_store_result(cache):
+    release = asyncio.Event()
+
+    async def loader():
+        await release.wait()
+        return {"status": "open"}
+
+    load = asyncio.create_task(cache.get_or_load("match:m1", loader))
+    await asyncio.sleep(0)
+    await cache.invalidate("match:m1")
+    release.set()
+    # Quien ya esperaba recibe lo leído, pero no queda en caché: pudo leerse antes de la escritura
+    assert await load == {"status": "open"}
+    assert await cache.peek("match:m1") is None
+
+
+async def test_loader_error_reaches_every_waiter(cache):
+    release = asyncio.Event()
+
+    async def loader():
+        await release.wait()
+        raise RuntimeError("firestore caído")
+
+    waiting = [asyncio.create_task(cache.get_or_load("match:m1", loader)) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+    outcomes = await asyncio.gather(*waiting, return_exceptions=True)
+    assert all(isinstance(e, RuntimeError) for e in outcomes)
+
+    async def ok():
+        return {"status": "open"}
+
+    assert await cache.get_or_load("match:m1", ok) == {"status": "open"}
+
+
+async def test_missing_documents_are_not_cached(cache):
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        return None
+
+    assert await cache.get_or_load("match:m1", loader) is None
+    assert await cache.get_or_load("match:m1", loader) is None
+    assert calls == 2
+
+
+async def test_lru_evicts_oldest():
+    backend = MemoryCache(maxsize=2)
+    await backend.set("a", 1, 60)
+    await backend.set("b", 2, 60)
+    await backend.get("a")
+    await backend.set("c", 3, 60)
+    assert await backend.get("b") is None
+    assert await backend.get("a") == 1
@@ -0,0 +1,33 @@
+# tests/test_firestore.py
+import google.auth
+import pytest
+from google.auth.credentials import AnonymousCredentials
+
+from app import firestore
+
+
+@pytest.fixture(autouse=True)
+def credentials(monkeypatch):
+    monkeypatch.setattr(google.auth, "default", lambda *args, **kwargs: (AnonymousCredentials(), "test"))
+
+
+@pytest.mark.anyio
+async def test_channel_uses_configured_options(monkeypatch):
+    seen = {}
+    create_channel = firestore.firestore_grpc_transport.FirestoreGrpcAsyncIOTransport.create_channel.__func__
+
+    def spy(cls, *args, **kwargs):
+        seen.update(kwargs)
+        return create_channel(cls, *args, **kwargs)
+
+    monkeypatch.setattr(firestore.firestore_grpc_transport.FirestoreGrpcAsyncIOTransport, "create_channel", classmethod(spy))
+    client = firestore.create_client([("grpc.keepalive_time_ms", 12345)])
+
+    assert seen["options"] == [("grpc.keepalive_time_ms", 12345)]
+    assert client._firestore_api is not None
+
+
+def test_untested_library_fails_at_startup(monkeypatch):
+    monkeypatch.setattr(firestore.firestore_v1, "__version__", "3.0.0")
+    with pytest.raises(RuntimeError):
+        firestore.create_client()
@@ -0,0 +1,81 @@
+# tests/test_idempotency.py
+import asyncio
+import uuid
+
+import pytest
+
+from app import idempotency
+from app.idempotency import FirestoreIdempotencyStore, InProgress, Record
+
+pytestmark = pytest.mark.anyio
+
+MATCH = {"creator_id": "u1", "creator_name": "Caro", "mode": "5vs5", "place": "Cancha", "date": "2030-01-01", "time": "18:00", "duration": 60}
+
+
+def _key() -> dict:
+    # El middleware vive lo que vive la app: cada test usa sus propias claves
+    return {"Idempotency-Key": uuid.uuid4().hex}
+
+
+async def _match_count(repo) -> int:
+    return len(await repo.matches.get())
+
+
+async def test_retry_replays_first_response(client, repo):
+    headers = _key()
+    first = await client.post("/matches/", json=MATCH, headers=headers)
+    again = await client.post("/matches/", json=MATCH, headers=headers)
+
+    assert first.status_code == again.status_code == 200
+    assert again.json()["id"] == first.json()["id"]
+    assert again.headers["idempotent-replayed"] == "true"
+    assert "idempotent-replayed" not in first.headers
+    assert await _match_count(repo) == 1
+
+
+async def test_concurrent_requests_wait_for_the_first(client, repo):
+    headers = _key()
+    responses = await asyncio.gather(*[client.post("/matches/", json=MATCH, headers=headers) for _ in range(5)])
+
+    assert len({r.json()["id"] for r in responses}) == 1
+    assert await _match_count(repo) == 1
+
+
+async def test_key_reused_with_other_body(client, repo):
+    headers = _key()
+    await client.post("/matches/", json=MATCH, headers=headers)
+    other = await client.post("/matches/", json={**MATCH, "place": "Otra"}, headers=headers)
+
+    assert other.status_code == 422
+    assert await _match_count(repo) == 1
+
+
+async def test_without_key_every_request_runs(client, repo):
+    await client.post("/matches/", json=MATCH)
+    await client.post("/matches/", json=MATCH)
+    assert await _match_count(repo) == 2
+
+
+async def test_invalid_key(client):
+    response = await client.post("/matches/", json=MATCH, headers={"Idempotency-Key": "x" * 300})
+    assert response.status_code == 400
+
+
+async def test_firestore_store_lets_one_process_run_the_key(repo, monkeypatch):
+    monkeypatch.setattr(idempotency, "WAIT_SECONDS", 0.05)
+    store, other = FirestoreIdempotencyStore(), FirestoreIdempotencyStore()
+
+    assert await store.begin("k", "hash") is None
+    with pytest.raises(InProgress):
+        await other.begin("k", "hash")
+
+    record = Record("hash", 200, [("content-type", "application/json")], b"{}")
+    await store.complete("k", record)
+    assert await other.begin("k", "hash") == record
+
+
+async def test_firestore_store_released_key_runs_again(repo):
+    store = FirestoreIdempotencyStore()
+    assert await store.begin("k", "hash") is None
+    await store.release("k")
+    assert await store.begin("k", "hash") is None
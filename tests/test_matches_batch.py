@@ -0,0 +1,50 @@
+# tests/test_matches_batch.py
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_batch_changes_status_and_deletes(client, repo, new_match):
+    confirmed, deleted = await new_match(), await new_match()
+    response = await client.post("/matches/batch", json={"user_id": "u1", "operations": [
+        {"match_id": confirmed, "action": "status", "status": "confirmed"},
+        {"match_id": deleted, "action": "delete"},
+        {"match_id": "nope", "action": "delete"},
+    ]})
+
+    assert [r["status_code"] for r in response.json()["results"]] == [200, 200, 404]
+    assert (await repo.matches.document(confirmed).get()).get("status") == "confirmed"
+    assert not (await repo.matches.document(deleted).get()).exists
+
+
+async def test_batch_race_fails_only_that_operation(client, repo, new_match, monkeypatch):
+    ids = [await new_match() for _ in range(3)]
+    raced = ids[1]
+    get_all = repo.get_all
+
+    async def racing_get_all(references, field_paths=None):
+        # Otro request modifica un reto entre la lectura de la ruta y su commit
+        monkeypatch.setattr(repo, "get_all", get_all)
+        async for snapshot in get_all(references, field_paths):
+            yield snapshot
+        await repo.matches.document(raced).update({"notas": "cambiado"})
+
+    monkeypatch.setattr(repo, "get_all", racing_get_all)
+    response = await client.post("/matches/batch", json={"user_id": "u1", "operations": [
+        {"match_id": match_id, "action": "status", "status": "completed"} for match_id in ids
+    ]})
+
+    outcomes = {r["match_id"]: r for r in response.json()["results"]}
+    assert outcomes[raced]["status_code"] == 409
+    assert (await repo.matches.document(raced).get()).get("status") == "open"
+    for match_id in (ids[0], ids[2]):
+        assert outcomes[match_id]["status_code"] == 200
+        assert (await repo.matches.document(match_id).get()).get("status") == "completed"
+
+
+async def test_batch_size_is_limited(client):
+    ids = [f"m{i}" for i in range(501)]
+    assert (await client.post("/matches/batch_get", json={"ids": ids})).status_code == 422
+    operations = [{"match_id": match_id, "action": "delete"} for match_id in ids]
+    assert (await client.post("/matches/batch", json={"user_id": "u1", "operations": operations})).status_code == 422
+    assert (await client.post("/matches/batch_get", json={"ids": ids[:500]})).status_code == 200
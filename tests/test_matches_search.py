@@ -0,0 +1,25 @@
+# tests/test_matches_search.py
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_search_pages_with_cursor(client, new_match):
+    ids = [await new_match(date="2030-01-01", time=f"1{i}:00") for i in range(3)]
+
+    first = await client.get("/matches/search", params={"limit": 2})
+    assert [m["id"] for m in first.json()] == ids[:2]
+    second = await client.get("/matches/search", params={"limit": 2, "cursor": first.headers["x-next-cursor"]})
+    assert [m["id"] for m in second.json()] == ids[2:]
+
+
+async def test_search_legacy_match_without_starts_at(client, repo, new_match):
+    match_id = await new_match(date="2030-01-01")
+    await repo.matches.document(match_id).update({"starts_at": None})
+
+    response = await client.get("/matches/search", params={"limit": 1, "min_slots": 0})
+
+    assert response.status_code == 200
+    assert [m["id"] for m in response.json()] == [match_id]
+    # El cursor sale de date/time, como calcula starts_at el backfill
+    assert response.headers["x-next-cursor"]
@@ -0,0 +1,98 @@
+# tests/test_memory_store.py
+import asyncio
+
+import pytest
+from google.api_core.exceptions import Aborted, AlreadyExists, FailedPrecondition, NotFound
+from google.cloud.firestore_v1 import Increment
+
+from app.memory_store import MemoryClient
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def db():
+    return MemoryClient()
+
+
+async def test_create_fails_if_document_exists(db):
+    ref = db.collection("Matches").document("m1")
+    await ref.create({"status": "open"})
+    with pytest.raises(AlreadyExists):
+        await ref.create({"status": "open"})
+
+
+async def test_update_precondition_rejects_stale_read(db):
+    ref = db.collection("Matches").document("m1")
+    await ref.set({"status": "open"})
+    stale = await ref.get()
+    await ref.update({"status": "confirmed"})
+
+    with pytest.raises(FailedPrecondition):
+        await ref.update({"status": "cancelled"}, option=db.write_option(last_update_time=stale.update_time))
+    assert (await ref.get()).get("status") == "confirmed"
+
+
+async def test_update_missing_document(db):
+    with pytest.raises(NotFound):
+        await db.collection("Matches").document("nope").update({"status": "open"})
+
+
+async def test_failed_batch_writes_nothing(db):
+    existing = db.collection("MatchResults").document("m1")
+    await existing.create({"state": "pending"})
+    batch = db.batch()
+    batch.set(db.collection("Matches").document("m1"), {"status": "completed"})
+    batch.create(existing, {"state": "pending"})
+    with pytest.raises(AlreadyExists):
+        await batch.commit()
+    assert not (await db.collection("Matches").document("m1").get()).exists
+
+
+async def test_transaction_aborts_when_a_read_document_changed(db):
+    ref = db.collection("UserStats").document("caro")
+    await ref.set({"wins": 0})
+    transaction = db.transaction()
+    snapshot = await transaction.get(ref)
+    await ref.update({"wins": Increment(1)})
+    transaction.update(ref, {"wins": snapshot.get("wins") + 1})
+    with pytest.raises(Aborted):
+        await transaction.commit()
+    assert (await ref.get()).get("wins") == 1
+
+
+async def test_query_inside_transaction_registers_reads(db):
+    stats = db.collection("UserStats")
+    await stats.document("caro").set({"user_id": "u1", "wins": 0})
+    transaction = db.transaction()
+    rows = [doc async for doc in stats.where("user_id", "==", "u1").stream(transaction=transaction)]
+    assert [doc.id for doc in rows] == ["caro"]
+    await stats.document("caro").update({"wins": 1})
+    transaction.update(stats.document("caro"), {"wins": 5})
+    with pytest.raises(Aborted):
+        await transaction.commit()
+
+
+async def test_run_transaction_retries_after_conflict(repo):
+    ref = repo.user_stats.document("caro")
+    await ref.set({"wins": 0})
+    attempts = []
+
+    async def run(transaction):
+        snapshot = await ref.get(transaction=transaction)
+        attempts.append(snapshot.get("wins"))
+        if len(attempts) == 1:
+            # Otro proceso escribe entre la lectura y el commit
+            await ref.update({"wins": Increment(1)})
+        transaction.update(ref, {"wins": snapshot.get("wins") + 1})
+
+    await repo.run_transaction(run)
+    assert attempts == [0, 1]
+    assert (await ref.get()).get("wins") == 2
+
+
+async def test_concurrent_increments_are_not_lost(db):
+    ref = db.collection("UserStats").document("caro")
+    await ref.set({"matches_played": 0})
+    await asyncio.gather(*[ref.update({"matches_played": Increment(1)}) for _ in range(20)])
+    assert (await ref.get()).get("matches_played") == 20
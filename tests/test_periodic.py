@@ -0,0 +1,78 @@
+# tests/test_periodic.py
+import asyncio
+
+import pytest
+from google.cloud.firestore_v1 import SERVER_TIMESTAMP
+
+from app.ranking import RankingEngine
+from app.recommendations import OpenMatchIndex
+from app.social import SocialGraph
+
+pytestmark = pytest.mark.anyio
+
+
+def _pause_fetch(state):
+    """Detiene el fetch del rebuild después de leer, hasta que el test lo suelte."""
+    fetch = state.fetch
+    read, release = asyncio.Event(), asyncio.Event()
+
+    async def paused(repo):
+        data = await fetch(repo)
+        read.set()
+        await release.wait()
+        return data
+
+    state.fetch = paused
+    return read, release
+
+
+async def _rebuild_with(state, repo, mutate):
+    read, release = _pause_fetch(state)
+    rebuild = asyncio.create_task(state.rebuild(repo))
+    await read.wait()
+    mutate()
+    release.set()
+    await rebuild
+
+
+async def test_index_keeps_changes_made_during_rebuild(client, repo, new_match):
+    closed, created = await new_match(), await new_match()
+    index = OpenMatchIndex()
+    # El rebuild no ve el reto nuevo: lo escribió otro request después de la consulta
+    new_data = (await repo.matches.document(created).get()).to_dict()
+    await repo.matches.document(created).delete()
+
+    def mutate():
+        # Un reto se cierra y otro se crea mientras la consulta ya leyó
+        index.discard(closed)
+        index.upsert(created, new_data)
+
+    await _rebuild_with(index, repo, mutate)
+
+    assert closed not in index._rows
+    assert created in index._rows
+
+
+async def test_ranking_keeps_upserts_made_during_rebuild(repo):
+    await repo.user_stats.document("caro").set({"user_id": "u1", "username": "caro", "wins": 0})
+    engine = RankingEngine()
+
+    await _rebuild_with(engine, repo, lambda: engine.upsert({"user_id": "u1", "username": "caro", "wins": 3}))
+
+    assert engine.entry("caro")["wins"] == 3
+
+
+async def test_graph_replays_each_match_once(repo):
+    players = [{"user_id": "u1"}, {"user_id": "u2"}]
+    await repo.collection("MatchResults").document("m1").set({"players": players, "state": "applied", "created_at": SERVER_TIMESTAMP})
+    graph = SocialGraph()
+
+    def mutate():
+        # Ya aplicado y leído por el rebuild: el replay no lo vuelve a contar
+        graph.add_match("m1", ["u1", "u2"])
+        graph.add_friend("u1", "u3")
+
+    await _rebuild_with(graph, repo, mutate)
+
+    assert graph.friends("u1") == ["u3"]
+    assert [s.matches_together for s in graph.suggest("u1") if s.user_id == "u2"] == [1]
@@ -0,0 +1,87 @@
+# tests/test_results.py
+import asyncio
+
+import pytest
+
+from app import results
+
+pytestmark = pytest.mark.anyio
+
+
+async def _stats(repo, username: str) -> dict:
+    return (await repo.user_stats.document(username).get()).to_dict()
+
+
+@pytest.fixture
+async def players(repo):
+    await repo.user_stats.document("caro").set({"user_id": "u1", "username": "caro", "wins": 0, "loses": 0, "draws": 0, "matches_played": 0})
+    await repo.user_stats.document("beto").set({"user_id": "u2", "username": "beto", "wins": 0, "loses": 0, "draws": 0, "matches_played": 0})
+
+
+async def _applied(repo, match_id: str) -> bool:
+    return (await results.marker(repo, match_id).get()).get("state") == "applied"
+
+
+async def _match_with_rival(client, new_match) -> str:
+    match_id = await new_match("u1")
+    response = await client.post(f"/matches/{match_id}/join", json={"user_id": "u2", "name": "Beto", "team": "away"})
+    assert response.status_code == 200, response.text
+    return match_id
+
+
+async def test_result_is_counted_once(client, repo, players, new_match, wait_for):
+    match_id = await _match_with_rival(client, new_match)
+    body = {"user_id": "u1", "home_score": 3, "away_score": 1}
+
+    first = await client.post(f"/matches/{match_id}/result", json=body)
+    assert first.status_code == 202
+    assert first.json()["duplicate"] is False
+    await wait_for(lambda: _applied(repo, match_id))
+
+    again = await client.post(f"/matches/{match_id}/result", json=body)
+    assert again.status_code == 202
+    assert again.json()["duplicate"] is True
+    assert again.json()["state"] == "applied"
+    caro = await _stats(repo, "caro")
+    assert (caro["wins"], caro["matches_played"]) == (1, 1)
+    assert (await _stats(repo, "beto"))["loses"] == 1
+
+
+async def test_concurrent_results_count_once(client, repo, players, new_match, wait_for):
+    match_id = await _match_with_rival(client, new_match)
+    body = {"user_id": "u1", "home_score": 2, "away_score": 2}
+    responses = await asyncio.gather(*[client.post(f"/matches/{match_id}/result", json=body) for _ in range(5)])
+
+    assert [r.status_code for r in responses] == [202] * 5
+    assert sum(not r.json()["duplicate"] for r in responses) == 1
+    await wait_for(lambda: _applied(repo, match_id))
+    await asyncio.sleep(0.05)
+    assert (await _stats(repo, "caro"))["draws"] == 1
+    assert (await _stats(repo, "caro"))["matches_played"] == 1
+
+
+async def test_apply_is_idempotent(client, repo, players, new_match, wait_for):
+    match_id = await _match_with_rival(client, new_match)
+    await client.post(f"/matches/{match_id}/result", json={"user_id": "u1", "home_score": 1, "away_score": 0})
+    await wait_for(lambda: _applied(repo, match_id))
+
+    assert await results.apply(repo, match_id) is False
+    assert (await _stats(repo, "caro"))["matches_played"] == 1
+
+
+async def test_score_after_completion_without_one(client, repo, players, new_match, wait_for):
+    match_id = await _match_with_rival(client, new_match)
+    completed = await client.post(f"/matches/{match_id}/status", json={"user_id": "u1", "status": "completed"})
+    assert completed.status_code == 200
+    await wait_for(lambda: _applied(repo, match_id))
+
+    scored = await client.post(f"/matches/{match_id}/result", json={"user_id": "u1", "home_score": 0, "away_score": 1})
+    assert scored.status_code == 202
+    assert scored.json()["duplicate"] is False
+    await wait_for(lambda: _applied(repo, match_id))
+    # El reto ya se había contado: el marcador solo suma la derrota
+    assert (await _stats(repo, "caro"))["matches_played"] == 1
+    assert (await _stats(repo, "caro"))["loses"] == 1
+
+    other = await client.post(f"/matches/{match_id}/result", json={"user_id": "u1", "home_score": 5, "away_score": 1})
+    assert other.status_code == 409
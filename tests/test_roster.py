@@ -0,0 +1,91 @@
+# tests/test_roster.py
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app import roster
+from app.roster import RosterCoalescer
+
+pytestmark = pytest.mark.anyio
+
+
+def _join(user_id: str):
+    def apply(datos: dict):
+        players = roster.roster(datos)
+        limite = roster.limite_total(datos)
+        if roster.count_confirmed(players.values()) >= limite:
+            raise HTTPException(status_code=400, detail=f"El reto ya tiene {limite} jugadores confirmados")
+        roster.add_player(players, {"user_id": user_id, "name": user_id, "confirmed": True})
+        return user_id
+
+    return apply
+
+
+async def _players(repo, match_id: str) -> dict:
+    return (await repo.matches.document(match_id).get()).get("players")
+
+
+async def test_default_interval_keeps_one_write_per_second():
+    assert roster.coalescer.interval >= 1.0
+
+
+async def test_concurrent_mutations_share_one_write(repo, new_match):
+    match_id = await new_match()
+    coalescer = RosterCoalescer(interval=0)
+    commits = roster.commits.value
+
+    joined = await asyncio.gather(*[coalescer.submit(repo, match_id, _join(f"p{i}")) for i in range(8)])
+
+    assert joined == [f"p{i}" for i in range(8)]
+    assert roster.commits.value == commits + 1
+    assert len(await _players(repo, match_id)) == 9
+
+
+async def test_each_caller_gets_its_own_error(repo, new_match):
+    match_id = await new_match()  # el creador ya ocupa un lugar de 10
+    coalescer = RosterCoalescer(interval=0)
+
+    outcomes = await asyncio.gather(
+        *[coalescer.submit(repo, match_id, _join(f"p{i}")) for i in range(11)], return_exceptions=True,
+    )
+
+    assert outcomes[:9] == [f"p{i}" for i in range(9)]
+    for error in outcomes[9:]:
+        assert isinstance(error, HTTPException)
+        assert error.detail == "El reto ya tiene 10 jugadores confirmados"
+    players = await _players(repo, match_id)
+    assert len(players) == 10
+    assert "p9" not in players
+
+
+async def test_later_mutations_wait_for_the_interval(repo, new_match):
+    match_id = await new_match()
+    coalescer = RosterCoalescer(interval=0.2)
+    commits = roster.commits.value
+
+    start = time.monotonic()
+    await coalescer.submit(repo, match_id, _join("p0"))
+    # Llegan mientras el reto está en su ventana: se escriben juntas al terminar
+    await asyncio.gather(coalescer.submit(repo, match_id, _join("p1")), coalescer.submit(repo, match_id, _join("p2")))
+
+    assert time.monotonic() - start >= 0.2
+    assert roster.commits.value == commits + 2
+    assert len(await _players(repo, match_id)) == 4
+
+
+async def test_join_route_reports_full_match(client, repo, new_match, monkeypatch):
+    monkeypatch.setattr(roster, "coalescer", RosterCoalescer(interval=0))
+    match_id = await new_match()
+
+    responses = await asyncio.gather(*[
+        client.post(f"/matches/{match_id}/join", json={"user_id": f"p{i}", "name": f"P{i}", "confirmed": True})
+        for i in range(11)
+    ])
+
+    statuses = sorted(r.status_code for r in responses)
+    assert statuses == [200] * 9 + [400] * 2
+    rejected = [r.json()["detail"] for r in responses if r.status_code == 400]
+    assert rejected == ["El reto ya tiene 10 jugadores confirmados"] * 2
+    assert len(await _players(repo, match_id)) == 10
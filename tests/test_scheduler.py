@@ -0,0 +1,88 @@
+# tests/test_scheduler.py
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import results
+from app.scheduler import Lease, MatchScheduler
+
+pytestmark = pytest.mark.anyio
+
+
+def _days_ago(days: int) -> str:
+    # Vencido (más de EXPIRE_AFTER) pero todavía no para archivar (ARCHIVE_AFTER)
+    return (datetime.now(timezone.utc) - timedelta(days=days)).date().isoformat()
+
+
+async def test_lease_is_exclusive(repo):
+    first, second = Lease("matches", 60), Lease("matches", 60)
+    assert await first.acquire(repo)
+    assert not await second.acquire(repo)
+    # El dueño lo renueva
+    assert await first.acquire(repo)
+
+    await first.release(repo)
+    assert await second.acquire(repo)
+
+
+async def test_expired_lease_can_be_taken(repo):
+    stale = Lease("matches", 60)
+    await repo.collection("SchedulerLeases").document("matches").set({
+        "holder": "otro-proceso", "expires_at": datetime.now(timezone.utc) - timedelta(seconds=1),
+    })
+    assert await stale.acquire(repo)
+
+
+async def test_only_the_leader_runs(repo):
+    leader, follower = MatchScheduler(), MatchScheduler()
+    assert await leader.run_once(repo) == {"expired": 0, "archived": 0}
+    assert await follower.run_once(repo) is None
+
+
+async def test_expires_past_matches(client, repo, new_match):
+    open_id = await new_match(date=_days_ago(2))
+    confirmed_id = await new_match(date=_days_ago(3))
+    future_id = await new_match(date="2030-01-01")
+    await repo.matches.document(confirmed_id).update({"status": "confirmed"})
+
+    done = await MatchScheduler().run_once(repo)
+
+    assert done["expired"] == 2
+    assert (await repo.matches.document(open_id).get()).get("status") == "cancelled"
+    assert (await repo.matches.document(confirmed_id).get()).get("status") == "completed"
+    assert (await repo.matches.document(future_id).get()).get("status") == "open"
+    # Completar por vencimiento encola el resultado igual que a mano
+    assert (await results.marker(repo, confirmed_id).get()).exists
+    assert not (await results.marker(repo, open_id).get()).exists
+
+
+async def test_archives_old_finished_matches(client, repo, new_match):
+    match_id = await new_match(date="2020-01-01", status="cancelled")
+
+    done = await MatchScheduler().run_once(repo)
+
+    assert done["archived"] == 1
+    assert not (await repo.matches.document(match_id).get()).exists
+    assert (await repo.collection("MatchesArchive").document(match_id).get()).get("status") == "cancelled"
+
+
+async def _applied(repo, match_id: str) -> bool:
+    return (await results.marker(repo, match_id).get()).get("state") == "applied"
+
+
+async def test_expires_reopened_match(client, repo, new_match, wait_for):
+    # Completado y vuelto a confirmar: su MatchResults ya existe y no se vuelve a crear
+    match_id = await new_match(date=_days_ago(2))
+    for status in ("completed", "confirmed"):
+        response = await client.post(f"/matches/{match_id}/status", json={"user_id": "u1", "status": status})
+        assert response.status_code == 200
+    await wait_for(lambda: _applied(repo, match_id))
+    applied_at = (await results.marker(repo, match_id).get()).get("applied_at")
+
+    done = await MatchScheduler().run_once(repo)
+
+    assert done["expired"] == 1
+    assert (await repo.matches.document(match_id).get()).get("status") == "completed"
+    marker = await results.marker(repo, match_id).get()
+    assert marker.get("state") == "applied"
+    assert marker.get("applied_at") == applied_at